@@ -1,6 +1,8 @@
 from backend import create_app
 
+# Development server. In production run it under gunicorn, configured from
+# ROSEMARY_* environment variables (backend/settings.py):
+#   gunicorn -c gunicorn.conf.py app:app
 app = create_app()
 if __name__ == "__main__":
     app.run(debug=True)
-
@@ -0,0 +1,318 @@
+import threading
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, update, insert, case
+from sqlalchemy.exc import IntegrityError
+from . import db, jobs
+from .models import (
+    Product, Orders, OrderItem, WarehouseItem,
+    CustomerSales, EmployeeSales, ProductSales, WarehouseValue,
+)
+
+# Materialized sales / inventory aggregates.
+#
+# The record_* hooks run inside the caller's transaction (product routes,
+# import) or in a background job queued by it (checkout, order accept /
+# reject, see jobs.py), so the summary rows commit together with the data
+# they describe or with the job's done mark. Until queued jobs have run the
+# totals lag behind the orders. `flask aggregates rebuild|verify`
+# recomputes everything from the raw tables; a rebuild already counts the
+# orders whose jobs are still queued, so it retires those jobs (JOBS) in the
+# same transaction, and verify waits until none is left.
+
+WAREHOUSE_ROW = 1
+
+# tasks that apply the write hooks (checkout.py, employee_orders.py)
+JOBS = ("order-placed", "orders-accepted", "orders-rejected")
+TOLERANCE = 0.01
+
+# value of a column when its row does not exist
+_EMPTY = {"Min_Accepted_Discount": None}
+
+
+def _bump(model, key_col, key, **deltas):
+    # UPDATE ... SET col = col + delta; insert the row the first time
+    values = {name: getattr(model, name) + delta for name, delta in deltas.items()}
+    result = db.session.execute(update(model).where(key_col == key).values(**values))
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values({key_col.key: key, **deltas}))
+    except IntegrityError:
+        # someone else inserted it first
+        db.session.execute(update(model).where(key_col == key).values(**values))
+
+
+def _bump_warehouse_value(delta):
+    # no row yet = aggregates never built; ensure_built() will compute it
+    if delta:
+        db.session.execute(
+            update(WarehouseValue)
+            .where(WarehouseValue.ID == WAREHOUSE_ROW)
+            .values(Total_Value=WarehouseValue.Total_Value + delta)
+        )
+
+
+# ---------- write hooks ----------
+
+# stock_value: Price * qty of the lines taken out of the warehouse, at the
+# prices of the moment the order was placed
+def record_order_placed(cust_id, price, stock_value):
+    if cust_id is not None:
+        _bump(CustomerSales, CustomerSales.Cust_ID, cust_id,
+              Total_Spent=float(price or 0), Order_Count=1)
+    _bump_warehouse_value(-stock_value)
+
+
+def record_order_accepted(order, items=None):
+    if items is None:
+        items = OrderItem.query.filter_by(Order_ID=order.Order_ID).all()
+    record_orders_accepted([order], items)
+
+
+# orders: freshly accepted Orders rows, items: all their OrderItems.
+# One UPDATE per distinct customer / employee / product, not per line.
+def record_orders_accepted(orders, items):
+    by_order = {o.Order_ID: o for o in orders}
+
+    customers = {}
+    for o in orders:
+        if o.Cust_ID is None:
+            continue
+        count, min_discount = customers.get(o.Cust_ID, (0, None))
+        if o.Discount is not None:
+            d = float(o.Discount)
+            min_discount = d if min_discount is None else min(min_discount, d)
+        customers[o.Cust_ID] = (count + 1, min_discount)
+
+    employees, products = {}, {}
+    for it in items:
+        qty = it.Quantity or 0
+        if not qty:
+            continue
+        emp_id = by_order[it.Order_ID].Emp_ID
+        if emp_id is not None:
+            employees[emp_id] = employees.get(emp_id, 0) + qty
+        products[it.Product_ID] = products.get(it.Product_ID, 0) + qty
+
+    for cust_id, (count, min_discount) in customers.items():
+        _bump(CustomerSales, CustomerSales.Cust_ID, cust_id, Accepted_Count=count)
+        if min_discount is not None:
+            db.session.execute(
+                update(CustomerSales)
+                .where(CustomerSales.Cust_ID == cust_id)
+                .values(Min_Accepted_Discount=case(
+                    (CustomerSales.Min_Accepted_Discount.is_(None), min_discount),
+                    (CustomerSales.Min_Accepted_Discount > min_discount, min_discount),
+                    else_=CustomerSales.Min_Accepted_Discount,
+                ))
+            )
+    for emp_id, units in employees.items():
+        _bump(EmployeeSales, EmployeeSales.Emp_ID, emp_id, Units_Sold=units)
+    for pid, units in products.items():
+        _bump(ProductSales, ProductSales.Product_ID, pid, Units_Sold=units)
+
+
+# restocked: [(price, qty)] put back into the warehouse (order rejection)
+def record_restock(restocked):
+    _bump_warehouse_value(sum(float(price or 0) * (qty or 0) for price, qty in restocked))
+
+
+# a product's price and/or warehouse quantity changed
+def record_stock_change(old_price, old_qty, new_price, new_qty):
+    record_stock_changes([(old_price, old_qty, new_price, new_qty)])
+
+
+# many products at once (bulk import): one UPDATE for the whole batch
+def record_stock_changes(changes):
+    delta = 0.0
+    for old_price, old_qty, new_price, new_qty in changes:
+        delta += float(new_price or 0) * (new_qty or 0) - float(old_price or 0) * (old_qty or 0)
+    _bump_warehouse_value(delta)
+
+
+# call BEFORE the product's order items are deleted
+def record_product_deleted(product):
+    # column query, not product.warehouse_item: a loaded relationship would
+    # make the ORM try to update the already-deleted warehouse row
+    qty = (
+        db.session.query(WarehouseItem.Quantity)
+        .filter(WarehouseItem.Product_ID == product.Product_ID)
+        .scalar()
+    )
+    _bump_warehouse_value(-float(product.Price or 0) * (qty or 0))
+
+    # its accepted order lines no longer count for the employees who sold them
+    sold = (
+        db.session.query(Orders.Emp_ID, func.sum(OrderItem.Quantity))
+        .join(OrderItem, OrderItem.Order_ID == Orders.Order_ID)
+        .filter(OrderItem.Product_ID == product.Product_ID)
+        .filter(func.lower(Orders.Status) == "accepted")
+        .filter(Orders.Emp_ID.isnot(None))
+        .group_by(Orders.Emp_ID)
+        .all()
+    )
+    for emp_id, units in sold:
+        _bump(EmployeeSales, EmployeeSales.Emp_ID, emp_id, Units_Sold=-(units or 0))
+    ProductSales.query.filter_by(Product_ID=product.Product_ID).delete(synchronize_session=False)
+
+
+# ---------- rebuild / verify ----------
+
+def compute():
+    """Recompute every aggregate from the raw tables."""
+    accepted = func.lower(Orders.Status) == "accepted"
+
+    customers = {}
+    rows = (
+        db.session.query(
+            Orders.Cust_ID,
+            func.coalesce(func.sum(Orders.Price), 0),
+            func.count(Orders.Order_ID),
+            func.sum(case((accepted, 1), else_=0)),
+            func.min(case((accepted, Orders.Discount))),
+        )
+        .filter(Orders.Cust_ID.isnot(None))
+        .group_by(Orders.Cust_ID)
+        .all()
+    )
+    for cust_id, spent, count, accepted_count, min_discount in rows:
+        customers[cust_id] = {
+            "Total_Spent": float(spent or 0),
+            "Order_Count": int(count or 0),
+            "Accepted_Count": int(accepted_count or 0),
+            "Min_Accepted_Discount": float(min_discount) if min_discount is not None else None,
+        }
+
+    employees = {
+        emp_id: {"Units_Sold": int(units or 0)}
+        for emp_id, units in (
+            db.session.query(Orders.Emp_ID, func.sum(OrderItem.Quantity))
+            .join(OrderItem, OrderItem.Order_ID == Orders.Order_ID)
+            .filter(accepted, Orders.Emp_ID.isnot(None))
+            .group_by(Orders.Emp_ID)
+            .all()
+        )
+    }
+
+    products = {
+        pid: {"Units_Sold": int(units or 0)}
+        for pid, units in (
+            db.session.query(OrderItem.Product_ID, func.sum(OrderItem.Quantity))
+            .join(Orders, Orders.Order_ID == OrderItem.Order_ID)
+            .filter(accepted)
+            .group_by(OrderItem.Product_ID)
+            .all()
+        )
+    }
+
+    warehouse_value = (
+        db.session.query(func.sum(Product.Price * WarehouseItem.Quantity))
+        .join(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .scalar()
+    ) or 0
+
+    return customers, employees, products, float(warehouse_value)
+
+
+def rebuild():
+    jobs.supersede(JOBS, "superseded by aggregates rebuild")
+    customers, employees, products, warehouse_value = compute()
+
+    CustomerSales.query.delete(synchronize_session=False)
+    EmployeeSales.query.delete(synchronize_session=False)
+    ProductSales.query.delete(synchronize_session=False)
+    WarehouseValue.query.delete(synchronize_session=False)
+
+    if customers:
+        db.session.execute(insert(CustomerSales), [{"Cust_ID": k, **v} for k, v in customers.items()])
+    if employees:
+        db.session.execute(insert(EmployeeSales), [{"Emp_ID": k, **v} for k, v in employees.items()])
+    if products:
+        db.session.execute(insert(ProductSales), [{"Product_ID": k, **v} for k, v in products.items()])
+    db.session.add(WarehouseValue(ID=WAREHOUSE_ROW, Total_Value=warehouse_value))
+    db.session.commit()
+
+
+_build_lock = threading.Lock()
+
+
+def ensure_built():
+    # First analytics read on a fresh database. rebuild() deletes and
+    # re-inserts every summary row, and the dashboard runs sections in
+    # parallel, so one thread builds while the others wait and re-check.
+    if db.session.get(WarehouseValue, WAREHOUSE_ROW) is not None:
+        return
+    with _build_lock:
+        db.session.rollback()   # new transaction: see what the builder committed
+        if db.session.get(WarehouseValue, WAREHOUSE_ROW) is not None:
+            return
+        try:
+            rebuild()
+        except IntegrityError:
+            # another process built them at the same time
+            db.session.rollback()
+
+
+def _differs(a, b):
+    if a is None or b is None:
+        return a != b
+    return abs(float(a) - float(b)) > TOLERANCE
+
+
+def verify():
+    """Compare the stored aggregates with a fresh computation; returns drift
+    lines, or None while jobs that update them are still queued."""
+    if jobs.pending(JOBS):
+        return None
+    customers, employees, products, warehouse_value = compute()
+    drift = []
+
+    def check(label, model, key_col, expected):
+        stored = {getattr(row, key_col): row for row in model.query.all()}
+        cols = [c.key for c in model.__table__.columns if c.key != key_col]
+        for key in set(stored) | set(expected):
+            row, want = stored.get(key), expected.get(key)
+            for col in cols:
+                have = getattr(row, col) if row is not None else _EMPTY.get(col, 0)
+                exp = want[col] if want is not None else _EMPTY.get(col, 0)
+                if _differs(have, exp):
+                    drift.append(f"{label} {key} {col}: stored={have} expected={exp}")
+
+    check("customer", CustomerSales, "Cust_ID", customers)
+    check("employee", EmployeeSales, "Emp_ID", employees)
+    check("product", ProductSales, "Product_ID", products)
+
+    row = db.session.get(WarehouseValue, WAREHOUSE_ROW)
+    stored_value = row.Total_Value if row else None
+    if _differs(stored_value, warehouse_value):
+        drift.append(f"warehouse value: stored={stored_value} expected={warehouse_value}")
+    return drift
+
+
+# ---------- CLI ----------
+
+aggregates_cli = AppGroup("aggregates", help="Materialized sales/inventory aggregates.")
+
+
+@aggregates_cli.command("rebuild")
+def rebuild_command():
+    """Recompute all summary tables from scratch."""
+    rebuild()
+    click.echo("Aggregates rebuilt.")
+
+
+@aggregates_cli.command("verify")
+def verify_command():
+    """Report drift between summary tables and the raw data."""
+    drift = verify()
+    if drift is None:
+        click.echo(f"{jobs.pending(JOBS)} order job(s) still queued; run them "
+                   "(flask jobs work --once) and verify again.")
+        raise SystemExit(2)
+    for line in drift:
+        click.echo(line)
+    click.echo(f"{len(drift)} drifted value(s).")
+    if drift:
+        raise SystemExit(1)
@@ -0,0 +1,567 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, desc
+from . import db, aggregates, exports, instrumentation, inventory, snapshot
+from .models import (
+    Product, Customer, Employee, Orders, OrderItem, Manufacturer, WarehouseItem,
+    CustomerSales, EmployeeSales, WarehouseValue, ProductForecast,
+)
+
+log = logging.getLogger(__name__)
+
+# Analytics engine for /analytics.
+#
+# The 20 dashboard queries are answered from a handful of shared passes:
+#   catalog         Product + WarehouseItem + Manufacturer   -> 1, 8, 9, 11, 19
+#   manufacturers   Manufacturer                             -> 13
+#   people          Customer, Employee                       -> 2, 3
+#   customer_orders Customer_Sales summary table             -> 6, 10, 14, 15, 20
+#   latest          most recent order, Employee_Sales,
+#                   Warehouse_Value                          -> 16, 18, 7
+# plus the parameterised order lookups (4, 5, 17). Low stock (12) comes from
+# the live stock index in inventory.py, with days of cover and reorder
+# suggestions from the stored demand forecast (forecast.py), or the
+# sales_velocity pass until one has been computed.
+#
+# The long lists (1, 2, 3, 17, 19) are shown as the first
+# ANALYTICS_PREVIEW_ROWS rows plus a total; the full sets are streamed by
+# backend/exports.py.
+#
+# Every pass is cached per parameter set for ANALYTICS_CACHE_TTL seconds and
+# dropped early by invalidate() when checkout / accept / reject / product
+# routes write. Changing customer_id or the date range only runs the one
+# parameterised query; the static passes stay cached.
+#
+# With ANALYTICS_SNAPSHOT on, the order passes (4-6, 10, 14, 15, 17, 18, 20)
+# are answered from the in-memory columnar snapshot in snapshot.py instead.
+
+SECTIONS = {}
+
+
+def section(name, *tags):
+    def register(fn):
+        SECTIONS[name] = (tags, fn)
+        return fn
+    return register
+
+
+class TTLCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}   # key -> (expires_at, tags, value)
+        self.loading = {}   # key -> lock held while the value is computed
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            return entry
+
+    def set(self, key, value, tags, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, tags, value)
+
+    def loader(self, key):
+        # one computation per missing key: concurrent callers wait for it
+        with self.lock:
+            return self.loading.setdefault(key, threading.Lock())
+
+    def loaded(self, key):
+        with self.lock:
+            self.loading.pop(key, None)
+
+    def invalidate(self, tags=None):
+        with self.lock:
+            if not tags:
+                self.entries.clear()
+                return
+            for key in [k for k, e in self.entries.items() if set(e[1]) & set(tags)]:
+                del self.entries[key]
+
+
+def _cache():
+    cache = current_app.extensions.get("analytics_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault("analytics_cache", TTLCache())
+    return cache
+
+
+# Drop cached sections. Tags: "catalog", "orders", "people"; none = everything.
+def invalidate(*tags):
+    _cache().invalidate(tags)
+    if not tags or "orders" in tags:
+        snapshot.mark_stale()
+
+
+def get_section(name, *params, default=None):
+    tags, fn = SECTIONS[name]
+    key = (name,) + params
+    cache = _cache()
+
+    hit = cache.get(key)
+    if hit is not None:
+        return hit[2]
+
+    with cache.loader(key):
+        hit = cache.get(key)
+        if hit is not None:
+            return hit[2]
+        try:
+            value = fn(*params)
+            cache.set(key, value, tags, current_app.config.get("ANALYTICS_CACHE_TTL", 60))
+        except Exception:
+            db.session.rollback()
+            log.exception("Error in analytics section %s", name)
+            return default
+        finally:
+            cache.loaded(key)
+    return value
+
+
+# ---------- shared passes ----------
+
+@section("catalog", "catalog")
+def _catalog():
+    return (
+        db.session.query(
+            Product.Product_ID,
+            Product.Name,
+            Product.Price,
+            Product.Barcode,
+            Product.Man_ID,
+            func.coalesce(WarehouseItem.Quantity, 0).label("Quantity"),
+            WarehouseItem.WI_ID.isnot(None).label("in_warehouse"),
+            Manufacturer.Name.label("manufacturer_name"),
+        )
+        .outerjoin(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .outerjoin(Manufacturer, Manufacturer.Man_ID == Product.Man_ID)
+        .order_by(Product.Product_ID.asc())
+        .all()
+    )
+
+
+@section("catalog_by_id", "catalog")
+def _catalog_by_id():
+    return {p.Product_ID: p for p in get_section("catalog", default=[])}
+
+
+@section("manufacturers", "catalog")
+def _manufacturers():
+    rows = db.session.query(
+        Manufacturer.Man_ID, Manufacturer.Name, Manufacturer.Address, Manufacturer.Email
+    ).all()
+    return {m.Man_ID: m for m in rows}
+
+
+# (preview rows, total) for customers and employees
+@section("people", "people")
+def _people(limit):
+    customers = db.session.execute(exports.customers_statement().limit(limit)).all()
+    employees = db.session.execute(exports.employees_statement().limit(limit)).all()
+    return (
+        (customers, db.session.query(func.count(Customer.Cust_ID)).scalar()),
+        (employees, db.session.query(func.count(Employee.Emp_ID)).scalar()),
+    )
+
+
+# per-customer totals come from the materialized Customer_Sales table, so
+# this costs one read no matter how much order history there is
+@section("customer_orders", "orders", "people")
+def _customer_orders():
+    snap = snapshot.current()
+    if snap is not None:
+        return snap.customer_totals()
+    aggregates.ensure_built()
+    return (
+        db.session.query(
+            Customer.Cust_ID,
+            Customer.Name,
+            Customer.Email,
+            CustomerSales.Order_Count.label("total_orders"),
+            CustomerSales.Total_Spent.label("total_spent"),
+            CustomerSales.Accepted_Count.label("accepted_orders"),
+            CustomerSales.Min_Accepted_Discount.label("min_accepted_discount"),
+        )
+        .join(CustomerSales, CustomerSales.Cust_ID == Customer.Cust_ID)
+        .filter(CustomerSales.Order_Count > 0)
+        .all()
+    )
+
+
+@section("latest", "orders", "people", "catalog")
+def _latest():
+    most_recent_order = (
+        db.session.query(Orders.Order_ID, Orders.Date, Orders.Price, Customer.Name)
+        .join(Customer, Customer.Cust_ID == Orders.Cust_ID)
+        .order_by(desc(Orders.Date))
+        .first()
+    )
+
+    aggregates.ensure_built()
+    snap = snapshot.current()
+    if snap is not None:
+        top_selling_employee = snap.top_selling_employee()
+    else:
+        top_selling_employee = _top_selling_employee()
+    total_warehouse_value = (
+        db.session.query(WarehouseValue.Total_Value)
+        .filter(WarehouseValue.ID == aggregates.WAREHOUSE_ROW)
+        .scalar()
+    ) or 0
+    return most_recent_order, top_selling_employee, total_warehouse_value
+
+
+def _top_selling_employee():
+    return (
+        db.session.query(
+            Employee.Name.label("Name"),
+            Employee.Email.label("Email"),
+            EmployeeSales.Units_Sold.label("total_sold")
+        )
+        .join(EmployeeSales, EmployeeSales.Emp_ID == Employee.Emp_ID)
+        .filter(EmployeeSales.Units_Sold > 0)
+        .order_by(EmployeeSales.Units_Sold.desc())
+        .first()
+    )
+
+
+# ---------- parameterised lookups ----------
+
+def _orders_with_quantity():
+    # order rows + their total quantity in one grouped query (no per-row SUM)
+    return (
+        db.session.query(
+            Orders.Order_ID,
+            Orders.Date,
+            Orders.Price,
+            Orders.Discount,
+            Orders.Status,
+            func.coalesce(func.sum(OrderItem.Quantity), 0).label("total_quantity"),
+        )
+        .outerjoin(OrderItem, OrderItem.Order_ID == Orders.Order_ID)
+        .group_by(Orders.Order_ID, Orders.Date, Orders.Price, Orders.Discount, Orders.Status)
+    )
+
+
+@section("orders_by_customer", "orders")
+def _orders_by_customer(customer_id):
+    snap = snapshot.current()
+    if snap is not None:
+        return snap.orders_for("cust", customer_id)
+    return (
+        _orders_with_quantity()
+        .filter(Orders.Cust_ID == customer_id)
+        .order_by(Orders.Order_ID.desc())
+        .all()
+    )
+
+
+@section("orders_by_employee", "orders")
+def _orders_by_employee(employee_id):
+    snap = snapshot.current()
+    if snap is not None:
+        return snap.orders_for("emp", employee_id)
+    return (
+        _orders_with_quantity()
+        .filter(Orders.Emp_ID == employee_id)
+        .order_by(Orders.Order_ID.desc())
+        .all()
+    )
+
+
+# start_date / end_date are the YYYY-MM-DD values of the date inputs; the end
+# day is included, so the range is [start 00:00, end + 1 day) on the Date index.
+# Returns (preview rows, total).
+@section("orders_in_range", "orders", "people")
+def _orders_in_range(start_date, end_date, limit):
+    snap = snapshot.current()
+    if snap is not None:
+        return snap.orders_in_range(start_date, end_date, limit)
+    try:
+        statement = exports.orders_in_range_statement(start_date, end_date)
+    except exports.ExportError:
+        return [], 0
+    return db.session.execute(statement.limit(limit)).all(), exports.count_rows(statement)
+
+
+# units per day per product over the last `days` days (rejected orders excluded)
+@section("sales_velocity", "orders")
+def _sales_velocity(days):
+    since = datetime.now() - timedelta(days=days)
+    rows = (
+        db.session.query(OrderItem.Product_ID, func.sum(OrderItem.Quantity))
+        .join(Orders, Orders.Order_ID == OrderItem.Order_ID)
+        .filter(Orders.Date >= since, Orders.Status != "rejected")
+        .group_by(OrderItem.Product_ID)
+        .all()
+    )
+    return {pid: (units or 0) / days for pid, units in rows}
+
+
+# forecast units per day per product, from the last `flask forecast refresh`
+@section("forecast", "forecast")
+def _forecast():
+    rows = (
+        db.session.query(ProductForecast.Product_ID, ProductForecast.Daily_Units)
+        .filter(ProductForecast.Daily_Units > 0)
+        .all()
+    )
+    return dict(rows)
+
+
+def demand_per_day():
+    """{product id: units per day}: the stored forecast, else recent sales velocity."""
+    forecast = get_section("forecast", default={})
+    if forecast:
+        return forecast
+    days = current_app.config.get("REORDER_VELOCITY_DAYS", inventory.REORDER_VELOCITY_DAYS)
+    return get_section("sales_velocity", days, default={})
+
+
+# ---------- dashboard ----------
+#
+# Each numbered block of /analytics is built on its own from the passes it
+# needs, so the page can load the 20 blocks as separate fragments
+# (/analytics/section/<n>) in parallel and show each as it arrives. Blocks
+# sharing a pass share its cache entry, and concurrent misses on one entry
+# wait for a single computation (TTLCache.loader).
+#
+# build_blocks() runs several blocks on a bounded thread pool
+# (ANALYTICS_WORKERS threads per process), each in its own app context, so
+# with its own session and pooled connection.
+
+ANALYTICS_WORKERS = 4
+
+Params = namedtuple(
+    "Params",
+    "customer_id employee_id manufacturer_id low_stock_threshold product_id start_date end_date",
+    defaults=(None, None, None, 10, None, None, None),
+)
+
+LowStock = namedtuple("LowStock", "Product_ID Name Price Quantity Days_Of_Cover")
+
+BLOCKS = {}     # number -> (title, builder(params, preview) -> template context)
+
+
+def block(number, title):
+    def register(fn):
+        BLOCKS[number] = (title, fn)
+        return fn
+    return register
+
+
+def _per_customer():
+    return get_section("customer_orders", default=[])
+
+
+@block(1, "1. All Products")
+def _all_products(p, preview):
+    catalog = get_section("catalog", default=[])
+    return dict(all_products=catalog[:preview], all_products_total=len(catalog))
+
+
+@block(2, "2. All Customers")
+def _all_customers(p, preview):
+    customers, _ = get_section("people", preview, default=(([], 0), ([], 0)))
+    return dict(all_customers=customers[0], all_customers_total=customers[1])
+
+
+@block(3, "3. All Employees")
+def _all_employees(p, preview):
+    _, employees = get_section("people", preview, default=(([], 0), ([], 0)))
+    return dict(all_employees=employees[0], all_employees_total=employees[1])
+
+
+@block(4, "4. Orders by Customer")
+def _customer_orders_block(p, preview):
+    return dict(customer_orders=get_section("orders_by_customer", p.customer_id, default=[])
+                if p.customer_id else [])
+
+
+@block(5, "5. Orders Handled by Employee")
+def _employee_orders_block(p, preview):
+    return dict(employee_orders=get_section("orders_by_employee", p.employee_id, default=[])
+                if p.employee_id else [])
+
+
+@block(6, "6. Total Orders Per Customer")
+def _orders_per_customer(p, preview):
+    return dict(orders_per_customer=sorted(_per_customer(), key=lambda c: -c.total_orders))
+
+
+@block(7, "7. Total Warehouse Value")
+def _warehouse_value(p, preview):
+    return dict(total_warehouse_value=get_section("latest", default=(None, None, 0))[2])
+
+
+@block(8, "8. Products by Manufacturer")
+def _products_by_manufacturer(p, preview):
+    catalog = get_section("catalog", default=[]) if p.manufacturer_id else []
+    return dict(products_by_manufacturer=[c for c in catalog if c.Man_ID == p.manufacturer_id])
+
+
+@block(9, "9. Average Product Price")
+def _average_price(p, preview):
+    prices = [c.Price for c in get_section("catalog", default=[]) if c.Price is not None]
+    return dict(average_price=sum(prices) / len(prices) if prices else 0)
+
+
+@block(10, "10. Customers Who Only Buy Discounted Orders")
+def _discount_only(p, preview):
+    rows = sorted(
+        (c for c in _per_customer() if c.accepted_orders and (c.min_accepted_discount or 0) > 0),
+        key=lambda c: -c.accepted_orders,
+    )
+    return dict(discount_only_customers=[_DiscountOnly(c) for c in rows])
+
+
+@block(11, "11. Available Products in Warehouse")
+def _available_products(p, preview):
+    stocked = (c for c in get_section("catalog", default=[]) if c.in_warehouse and c.Quantity > 0)
+    return dict(available_products=sorted(stocked, key=lambda c: -c.Quantity))
+
+
+# from the live stock index: a new threshold costs no query
+@block(12, "12. Low Stock Products")
+def _low_stock(p, preview):
+    by_id = get_section("catalog_by_id", default={})
+    demand = demand_per_day()
+    low_stock_products = []
+    for pid, qty in inventory.low_stock(p.low_stock_threshold):
+        c = by_id.get(pid)
+        if c is not None:
+            cover = round(max(qty, 0) / demand[pid], 1) if demand.get(pid) else None
+            low_stock_products.append(LowStock(pid, c.Name, c.Price, qty, cover))
+
+    reorder_suggestions = inventory.reorder_suggestions(demand)[:preview]
+    for s in reorder_suggestions:
+        s["name"] = by_id[s["product_id"]].Name if s["product_id"] in by_id else None
+    return dict(low_stock_products=low_stock_products, reorder_suggestions=reorder_suggestions)
+
+
+@block(13, "13. Manufacturer of a Product")
+def _product_manufacturer(p, preview):
+    product_manufacturer = None
+    if p.product_id:
+        product = get_section("catalog_by_id", default={}).get(p.product_id)
+        if product is not None and product.Man_ID is not None:
+            product_manufacturer = get_section("manufacturers", default={}).get(product.Man_ID)
+    return dict(product_manufacturer=product_manufacturer)
+
+
+@block(14, "14. Top Spending Customer")
+def _top_spending(p, preview):
+    return dict(top_spending_customer=max(_per_customer(), key=lambda c: c.total_spent, default=None))
+
+
+@block(15, "15. Customer with Most Orders")
+def _most_orders(p, preview):
+    row = max(_per_customer(), key=lambda c: c.total_orders, default=None)
+    return dict(most_orders_customer=_MostOrders(row) if row else None)
+
+
+@block(16, "16. Most Recent Order")
+def _most_recent(p, preview):
+    return dict(most_recent_order=get_section("latest", default=(None, None, 0))[0])
+
+
+@block(17, "17. Orders in Date Range")
+def _orders_in_range_block(p, preview):
+    rows, total = (
+        get_section("orders_in_range", p.start_date, p.end_date, preview, default=([], 0))
+        if p.start_date and p.end_date else ([], 0)
+    )
+    return dict(orders_in_date_range=rows, orders_in_date_range_total=total)
+
+
+@block(18, "18. Top Selling Employee")
+def _top_employee(p, preview):
+    return dict(top_selling_employee=get_section("latest", default=(None, None, 0))[1])
+
+
+@block(19, "19. Products with Manufacturers")
+def _products_with_manufacturers(p, preview):
+    catalog = get_section("catalog", default=[])
+    return dict(products_with_manufacturers=catalog[:preview], products_with_manufacturers_total=len(catalog))
+
+
+@block(20, "20. Customers Who Spent More Than Average")
+def _above_average(p, preview):
+    per_customer = _per_customer()
+    above = []
+    if per_customer:
+        avg_spent = sum(c.total_spent for c in per_customer) / len(per_customer)
+        above = sorted(
+            ((c, c.total_spent) for c in per_customer if c.total_spent > avg_spent),
+            key=lambda pair: -pair[1],
+        )
+    return dict(customers_above_avg=above)
+
+
+def build_block(number, params):
+    preview = current_app.config.get("ANALYTICS_PREVIEW_ROWS", 20)
+    return dict(BLOCKS[number][1](params, preview), preview_rows=preview, **params._asdict())
+
+
+def _pool(app):
+    pool = app.extensions.get("analytics_pool")
+    if pool is None:
+        workers = app.config.get("ANALYTICS_WORKERS", ANALYTICS_WORKERS)
+        pool = app.extensions.setdefault(
+            "analytics_pool", ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analytics")
+        )
+    return pool
+
+
+def build_blocks(numbers, params):
+    """{number: context}; blocks run concurrently when ANALYTICS_WORKERS > 1."""
+    app = current_app._get_current_object()
+    if app.config.get("ANALYTICS_WORKERS", ANALYTICS_WORKERS) <= 1 or len(numbers) < 2:
+        return {n: build_block(n, params) for n in numbers}
+
+    stats = instrumentation.request_stats()
+
+    def run(number):
+        # own app context: own scoped session, connection back to the pool on
+        # exit; its SQL still counts towards the request's stats
+        with app.app_context(), instrumentation.recording_into(stats):
+            return build_block(number, params)
+
+    pool = _pool(app)
+    futures = {n: pool.submit(run, n) for n in numbers}
+    return {n: future.result() for n, future in futures.items()}
+
+
+def dashboard(params):
+    """Context for the whole page, every block at once."""
+    context = {}
+    for block_context in build_blocks(sorted(BLOCKS), params).values():
+        context.update(block_context)
+    return context
+
+
+# Template-facing views of the per-customer row, named like the old queries
+class _DiscountOnly:
+    def __init__(self, row):
+        self.Cust_ID = row.Cust_ID
+        self.Name = row.Name
+        self.Email = row.Email
+        self.total_orders = row.accepted_orders
+        self.min_discount = row.min_accepted_discount
+
+
+class _MostOrders:
+    def __init__(self, row):
+        self.Cust_ID = row.Cust_ID
+        self.Name = row.Name
+        self.Email = row.Email
+        self.order_count = row.total_orders
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from flask_login import login_user, logout_user, login_required, current_user
 from .models import Employee, Customer
 from . import db
+from . import analytics_engine, identity
 
 auth = Blueprint('auth', __name__)
 
@@ -76,6 +77,8 @@ def signup():
                 )
                 db.session.add(new_customer)
                 db.session.commit()
+                analytics_engine.invalidate("people")
+                identity.invalidate(new_customer.Cust_ID)
 
                 flash('Account created successfully!', 'success')
                 return redirect(url_for('auth.login'))
@@ -86,6 +89,7 @@ def signup():
 @auth.route('/logout')
 @login_required
 def logout():
+    identity.invalidate(current_user.get_id())
     logout_user()
     session.clear()
     return redirect(url_for('landing'))
\ No newline at end of file
@@ -0,0 +1,60 @@
+from sqlalchemy.orm import contains_eager
+from .models import Product, WarehouseItem
+
+
+# Cart pricing shared by /cart and /checkout, so the page and the order
+# always agree. All cart products (with stock and discount) come from ONE
+# IN query; line totals, discount and grand total are computed in one pass.
+
+class CartLine:
+    def __init__(self, product, qty):
+        self.product = product
+        self.qty = qty
+        self.product_id = product.Product_ID
+        self.stock = product.stock_qty
+
+        # same rounding as Product.discounted_price / discount_amount
+        self.discount_percent = int(product.Discount_Percent or 0)
+        self.unit_price = float(product.Price or 0)
+        self.unit_discounted = round(self.unit_price * (1 - self.discount_percent / 100), 2)
+        self.unit_discount = round(self.unit_price - self.unit_discounted, 2)
+
+        self.line_before_discount = self.unit_price * qty
+        self.line_discount = self.unit_discount * qty
+        self.line_total = self.unit_discounted * qty
+
+
+class CartQuote:
+    def __init__(self, lines):
+        self.lines = lines
+        self.total_before_discount = round(sum(l.line_before_discount for l in lines), 2)
+        self.discount = round(sum(l.line_discount for l in lines), 2)
+        self.total = round(self.total_before_discount - self.discount, 2)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+# cart: {product_id: qty}; unknown products and quantities < 1 are skipped
+def price_cart(cart):
+    wanted = {}
+    for product_id, qty in cart.items():
+        try:
+            qty = int(qty)
+        except (TypeError, ValueError):
+            continue
+        if qty >= 1:
+            wanted[int(product_id)] = qty
+
+    if not wanted:
+        return CartQuote([])
+
+    products = (
+        Product.query
+        .outerjoin(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .options(contains_eager(Product.warehouse_item))
+        .filter(Product.Product_ID.in_(list(wanted)))
+        .order_by(Product.Product_ID.asc())
+        .all()
+    )
+    return CartQuote([CartLine(p, wanted[p.Product_ID]) for p in products])
@@ -1,17 +1,16 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session
 from flask_login import login_required, current_user, logout_user
-from .models import Product, Orders, OrderItem, Employee, WarehouseItem
-from . import db
-from datetime import datetime
+from .models import Product
+from . import analytics_engine, fragments, cart_store, inventory
+from .checkout import place_order, CheckoutError
+from .cart_pricing import price_cart
 
 cart_bp = Blueprint('cart', __name__)
 
 
-# Helper: get cart from session
+# Helper: the session's cart, {product_id: qty} (stored server-side, see cart_store.py)
 def get_cart():
-    if 'cart' not in session or not isinstance(session['cart'], dict):
-        session['cart'] = {}
-    return session['cart']
+    return cart_store.lines()
 
 
 # Add to cart
@@ -31,24 +30,16 @@ def add_to_cart(product_id):
     if quantity < 1:
         quantity = 1
 
-    # Check stock
-    if quantity > product.stock_qty:
-        flash(f'Only {product.stock_qty} items available in stock.', 'error')
+    # Check stock (less what other carts are holding, with CART_RESERVE_STOCK)
+    available = max(product.stock_qty - cart_store.held_elsewhere(product_id), 0)
+    if quantity > available:
+        flash(f'Only {available} items available in stock.', 'error')
         return redirect(url_for('shop'))
 
-    cart = get_cart()
-    pid = str(product_id)
-
-    # Add/update
-    cart[pid] = cart.get(pid, 0) + quantity
-
-    # Don't exceed stock
-    if cart[pid] > product.stock_qty:
-        cart[pid] = product.stock_qty
-        flash(f'Maximum quantity is {product.stock_qty}', 'warning')
-
-    session['cart'] = cart
-    session.modified = True
+    # Add/update; never more than is available
+    _, capped = cart_store.add(product_id, quantity, limit=available)
+    if capped:
+        flash(f'Maximum quantity is {available}', 'warning')
 
     flash(f'{product.Name} added to cart!', 'success')
     return redirect(url_for('shop'))
@@ -62,34 +53,14 @@ def view_cart():
     if session.get("user_type") != "customer":
         return redirect(url_for('auth.login'))
 
-    cart = get_cart()
-
-    items = []
-    total_before_discount = 0.0
-    discount_total = 0.0
-
-    for product_id, qty in cart.items():
-        product = Product.query.get(int(product_id))
-        if not product:
-            continue
-
-        qty = int(qty)
-        items.append((product, qty))
-
-        price = float(product.Price or 0)
-        total_before_discount += price * qty
-        discount_total += float(product.discount_amount) * qty
-
-    total_before_discount = round(total_before_discount, 2)
-    discount_total = round(discount_total, 2)
-    total = round(total_before_discount - discount_total, 2)
+    quote = price_cart(get_cart())
 
     return render_template(
         'cart.html',
-        items=items,
-        total_before_discount=total_before_discount,
-        discount=discount_total,
-        total=total
+        items=quote.lines,
+        total_before_discount=quote.total_before_discount,
+        discount=quote.discount,
+        total=quote.total
     )
 
 
@@ -100,13 +71,7 @@ def remove_from_cart(product_id):
     if session.get("user_type") != "customer":
         return redirect(url_for('auth.login'))
 
-    cart = get_cart()
-    pid = str(product_id)
-
-    if pid in cart:
-        del cart[pid]
-        session['cart'] = cart
-        session.modified = True
+    if cart_store.remove(product_id):
         flash('Item removed from cart.', 'success')
 
     return redirect(url_for('cart.view_cart'))
@@ -131,66 +96,19 @@ def checkout():
         flash('Your cart is empty.', 'error')
         return redirect(url_for('cart.view_cart'))
 
-    total_before_discount = 0.0
-    discount_total = 0.0
-
-    products_in_cart = []  # store (product, qty)
-    for product_id, qty in cart.items():
-        product = Product.query.get(int(product_id))
-        if not product:
-            continue
-
-        qty = int(qty)
-        if qty < 1:
-            continue
-
-        # stock check
-        if qty > (product.stock_qty or 0):
-            flash(f'Not enough stock for {product.Name}. Available: {product.stock_qty}', 'error')
-            return redirect(url_for('cart.view_cart'))
-
-        products_in_cart.append((product, qty))
-
-        price = float(product.Price or 0)
-        total_before_discount += price * qty
-        discount_total += float(product.discount_amount) * qty
-
-    if not products_in_cart:
-        flash('Your cart is empty.', 'error')
+    try:
+        new_order, stock = place_order(current_user.Cust_ID, cart)
+    except CheckoutError as e:
+        flash(str(e), 'error')
         return redirect(url_for('cart.view_cart'))
 
-    total_before_discount = round(total_before_discount, 2)
-    discount_total = round(discount_total, 2)
-    final_price = round(total_before_discount - discount_total, 2)
-
-    #  Quantity field will be calculated from OrderItemm
-    new_order = Orders(
-        Cust_ID=current_user.Cust_ID,
-        #Emp_ID=default_emp_id,
-        Date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        Price=final_price,
-        Discount=discount_total
-    )
+    analytics_engine.invalidate("orders", "catalog")
+    # stock shown on the shop cards changed (ids from the cart: the
+    # products were expired by the commit and would reload one by one)
+    fragments.bump(cart)
+    inventory.record_quantities(stock)
 
-    db.session.add(new_order)
-    db.session.flush()
-
-    for product, qty in products_in_cart:
-        db.session.add(OrderItem(
-            Order_ID=new_order.Order_ID,
-            Product_ID=product.Product_ID,
-            Quantity=qty
-        ))
-        wi = WarehouseItem.query.filter_by(Product_ID=product.Product_ID).first()
-        if not wi or (wi.Quantity or 0) < qty:
-            flash(f"Not enough stock for {product.Name}", "error")
-            return redirect(url_for('cart.view_cart'))
-        wi.Quantity -= qty
-
-    db.session.commit()
-
-    session['cart'] = {}
-    session.modified = True
+    cart_store.clear()
 
     flash(f'Order placed successfully! Order ID: {new_order.Order_ID}', 'success')
     return redirect(url_for('shop'))
@@ -0,0 +1,207 @@
+import secrets
+from datetime import datetime, timedelta
+import click
+from flask import current_app, session
+from flask.cli import AppGroup
+from flask_login import current_user
+from sqlalchemy import select, update, insert, delete, func, case
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .models import Cart, CartItem
+
+# Server-side shopping carts.
+#
+# The session cookie only carries a random cart id (session["cart_id"]); the
+# lines live in the Cart / Cart_Item tables, so a request is the same size
+# however big the cart gets. Every line change is one conditional UPDATE
+# (Quantity = Quantity + n, capped) or INSERT, so two tabs adding at the
+# same time never lose an update.
+#
+# A cart not changed for CART_TTL_DAYS is abandoned: it reads as empty and
+# `flask carts purge` (cron) deletes it. With CART_RESERVE_STOCK on, each
+# line holds its units for CART_HOLD_MINUTES and other shoppers can only
+# add stock minus everyone else's live holds. The hold is soft: checkout
+# still goes by real stock, it only stops many carts promising the same
+# last units.
+#
+# CART_STORE swaps the backend for any object with SQLCartStore's methods
+# (e.g. Redis hashes: HINCRBY per line, EXPIRE for abandonment).
+
+CART_TTL_DAYS = 7
+CART_HOLD_MINUTES = 15
+
+
+class SQLCartStore:
+    def __init__(self, ttl, hold=None):
+        self.ttl = ttl
+        self.hold = hold        # None = no reservations
+
+    def _live(self, now):
+        return Cart.Updated >= now - self.ttl
+
+    def find(self, cust_id):
+        """Latest live cart of a customer (so a cart survives logging in again)."""
+        if cust_id is None:
+            return None
+        return db.session.execute(
+            select(Cart.Cart_ID)
+            .where(Cart.Cust_ID == cust_id, self._live(datetime.now()))
+            .order_by(Cart.Updated.desc())
+            .limit(1)
+        ).scalar()
+
+    def lines(self, cart_id):
+        rows = db.session.execute(
+            select(CartItem.Product_ID, CartItem.Quantity)
+            .join(Cart, Cart.Cart_ID == CartItem.Cart_ID)
+            .where(CartItem.Cart_ID == cart_id, self._live(datetime.now()))
+        )
+        return {pid: qty for pid, qty in rows}
+
+    def _touch(self, cart_id, cust_id, now):
+        touched = db.session.execute(
+            update(Cart)
+            .where(Cart.Cart_ID == cart_id, self._live(now))
+            .values(Updated=now)
+        )
+        if touched.rowcount:
+            return
+        # new, or abandoned and not purged yet: start it over
+        db.session.execute(delete(CartItem).where(CartItem.Cart_ID == cart_id))
+        db.session.execute(delete(Cart).where(Cart.Cart_ID == cart_id))
+        db.session.execute(insert(Cart).values(Cart_ID=cart_id, Cust_ID=cust_id, Updated=now))
+
+    def held(self, product_id, cart_id):
+        """Units of product_id held by live reservations of other carts."""
+        if self.hold is None:
+            return 0
+        return db.session.execute(
+            select(func.coalesce(func.sum(CartItem.Quantity), 0))
+            .where(
+                CartItem.Product_ID == product_id,
+                CartItem.Reserved_Until > datetime.now(),
+                CartItem.Cart_ID != cart_id,
+            )
+        ).scalar()
+
+    def add(self, cart_id, cust_id, product_id, qty, limit=None):
+        """Atomically add qty to a line, capped at limit.
+
+        Returns (new quantity, whether the cap cut it); the pair is read in the
+        same transaction, the line itself is only ever changed atomically.
+        """
+        now = datetime.now()
+        hold = now + self.hold if self.hold is not None else None
+        new_qty = CartItem.Quantity + qty
+        if limit is not None:
+            new_qty = case((new_qty > limit, limit), else_=new_qty)
+        this_line = (CartItem.Cart_ID == cart_id, CartItem.Product_ID == product_id)
+
+        try:
+            self._touch(cart_id, cust_id, now)
+            before = db.session.execute(select(CartItem.Quantity).where(*this_line)).scalar() or 0
+            changed = db.session.execute(
+                update(CartItem).where(*this_line).values(Quantity=new_qty, Reserved_Until=hold)
+            )
+            if not changed.rowcount:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(CartItem).values(
+                            Cart_ID=cart_id, Product_ID=product_id,
+                            Quantity=qty if limit is None else min(qty, limit), Reserved_Until=hold,
+                        ))
+                except IntegrityError:
+                    # the other tab inserted it first
+                    db.session.execute(
+                        update(CartItem).where(*this_line).values(Quantity=new_qty, Reserved_Until=hold)
+                    )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        wanted = before + qty
+        return (wanted, False) if limit is None or wanted <= limit else (limit, True)
+
+    def remove(self, cart_id, product_id):
+        removed = db.session.execute(
+            delete(CartItem).where(CartItem.Cart_ID == cart_id, CartItem.Product_ID == product_id)
+        ).rowcount
+        db.session.commit()
+        return bool(removed)
+
+    def clear(self, cart_id):
+        db.session.execute(delete(CartItem).where(CartItem.Cart_ID == cart_id))
+        db.session.commit()
+
+    def purge(self):
+        """Delete abandoned carts; returns how many."""
+        stale = select(Cart.Cart_ID).where(Cart.Updated < datetime.now() - self.ttl)
+        db.session.execute(delete(CartItem).where(CartItem.Cart_ID.in_(stale)))
+        count = db.session.execute(delete(Cart).where(Cart.Cart_ID.in_(stale))).rowcount
+        db.session.commit()
+        return count
+
+
+def _store():
+    store = current_app.extensions.get("carts")
+    if store is None:
+        config = current_app.config
+        hold = None
+        if config.get("CART_RESERVE_STOCK", False):
+            hold = timedelta(minutes=config.get("CART_HOLD_MINUTES", CART_HOLD_MINUTES))
+        store = current_app.extensions.setdefault("carts", config.get("CART_STORE") or SQLCartStore(
+            timedelta(days=config.get("CART_TTL_DAYS", CART_TTL_DAYS)), hold,
+        ))
+    return store
+
+
+def _customer():
+    return getattr(current_user, "Cust_ID", None)
+
+
+# ---------- the current session's cart ----------
+
+def cart_id():
+    cid = session.get("cart_id")
+    if cid is None:
+        cid = _store().find(_customer()) or secrets.token_hex(16)
+        session["cart_id"] = cid
+        # a cart from before server-side carts
+        legacy = session.pop("cart", None)
+        if isinstance(legacy, dict):
+            for pid, qty in legacy.items():
+                add(int(pid), int(qty))
+    return cid
+
+
+# {product_id: qty}
+def lines():
+    return _store().lines(cart_id())
+
+
+def add(product_id, qty, limit=None):
+    return _store().add(cart_id(), _customer(), product_id, qty, limit)
+
+
+def remove(product_id):
+    return _store().remove(cart_id(), product_id)
+
+
+def clear():
+    _store().clear(cart_id())
+
+
+# stock another cart is holding (0 unless CART_RESERVE_STOCK)
+def held_elsewhere(product_id):
+    return _store().held(product_id, cart_id())
+
+
+# ---------- CLI ----------
+
+carts_cli = AppGroup("carts", help="Server-side cart maintenance.")
+
+
+@carts_cli.command("purge")
+def purge_command():
+    """Delete carts abandoned for longer than CART_TTL_DAYS."""
+    click.echo(f"{_store().purge()} abandoned cart(s) deleted")
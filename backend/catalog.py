@@ -0,0 +1,224 @@
+import base64
+import json
+import math
+from bisect import bisect_left, bisect_right
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import contains_eager
+from .models import Product, WarehouseItem
+from . import inventory
+from .search import get_index, search_products
+from .images import product_image
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# sort key -> SQL expression (ties are always broken by Product_ID)
+SORT_KEYS = {
+    "id": Product.Product_ID,
+    "name": Product.Name,
+    "price": Product.Price,
+    "discounted_price": Product.Price * (100 - func.coalesce(Product.Discount_Percent, 0)) / 100.0,
+    "stock": WarehouseItem.Quantity,
+}
+
+
+# Catalog loading path for /shop and /products.
+# Products and their warehouse rows come back in ONE joined SELECT, so
+# Product.stock_qty is answered from memory instead of one query per read.
+def catalog_query(ids=None):
+    query = (
+        Product.query
+        .outerjoin(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .options(contains_eager(Product.warehouse_item))
+    )
+    if ids is not None:
+        query = query.filter(Product.Product_ID.in_(ids))
+    return query
+
+
+# what a cursor's sort value may be, per sort (None = NULL, where allowed)
+CURSOR_TYPES = {
+    "id": (int,),
+    "relevance": (int,),            # position in the ranking
+    "name": (str, type(None)),
+    "price": (int, float, type(None)),
+    "discounted_price": (int, float, type(None)),
+    "stock": (int, type(None)),
+}
+
+
+class CursorError(ValueError):
+    pass
+
+
+# Cursor = last row's (sort value, Product_ID), base64 encoded
+def encode_cursor(value, product_id):
+    raw = json.dumps([value, product_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort="id"):
+    """(sort value, Product_ID), or None if the cursor is malformed or its
+    value does not fit the sort column."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, product_id = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(product_id, int) or isinstance(product_id, bool):
+        return None
+    if isinstance(value, bool) or not isinstance(value, CURSOR_TYPES[sort]):
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value, product_id
+
+
+def _after(expr, value, last_id, descending):
+    # Keyset condition "comes after (value, last_id)" in ORDER BY expr, Product_ID.
+    # NULLs sort first ascending and last descending (MySQL and SQLite agree).
+    pid = Product.Product_ID
+    if not descending:
+        if value is None:
+            return or_(and_(expr.is_(None), pid > last_id), expr.isnot(None))
+        return or_(expr > value, and_(expr == value, pid > last_id))
+
+    if value is None:
+        return and_(expr.is_(None), pid < last_id)
+    return or_(expr < value, and_(expr == value, pid < last_id), expr.is_(None))
+
+
+class CatalogPage:
+    def __init__(self, items, next_cursor, sort, direction, limit):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.sort = sort
+        self.direction = direction
+        self.limit = limit
+
+
+# Keyset pagination: every page is "WHERE (key, id) > cursor ORDER BY key, id
+# LIMIT n", so page 500 costs the same as page 1 (no OFFSET scan).
+# With a search term the matching ids come from the in-process search index;
+# sort="relevance" (the default when searching) pages through its ranking, any
+# other sort is done in memory too (_search_page), so only one page of ids is
+# ever sent to the database. A cursor that does not decode, or whose value
+# does not fit the sort, raises CursorError (the routes answer 400).
+def paginate_catalog(q=None, sort=None, direction="asc", cursor=None, limit=None):
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+    if q and sort in (None, "", "relevance"):
+        sort = "relevance"
+    elif sort not in SORT_KEYS:
+        sort = "id"
+    after = None
+    if cursor:
+        after = decode_cursor(cursor, sort)
+        if after is None:
+            raise CursorError("invalid cursor")
+
+    ids = search_products(q) if q else None
+    if sort == "relevance":
+        return _relevance_page(ids, after, limit)
+
+    descending = direction == "desc"
+    if q:
+        return _search_page(ids, sort, descending, after, limit)
+
+    expr = SORT_KEYS[sort]
+    query = catalog_query()
+
+    if after:
+        value, last_id = after
+        if sort == "id":
+            query = query.filter(Product.Product_ID < last_id if descending else Product.Product_ID > last_id)
+        else:
+            query = query.filter(_after(expr, value, last_id, descending))
+
+    if sort == "id":
+        order = [Product.Product_ID.desc() if descending else Product.Product_ID.asc()]
+    elif descending:
+        order = [expr.desc(), Product.Product_ID.desc()]
+    else:
+        order = [expr.asc(), Product.Product_ID.asc()]
+
+    # the sort value is selected alongside the product so the cursor holds
+    # exactly what the database compares against
+    rows = query.add_columns(expr.label("sort_value")).order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, last_value = rows[-1]
+        next_cursor = encode_cursor(last_value, last.Product_ID)
+
+    items = [product for product, _ in rows]
+    return CatalogPage(items, next_cursor, sort, "desc" if descending else "asc", limit)
+
+
+def _relevance_page(ranked, after, limit):
+    # ranking lives in memory, so the cursor is just a position in it
+    start = max(0, after[0]) if after else 0
+
+    page_ids = ranked[start:start + limit]
+    next_cursor = None
+    if start + limit < len(ranked):
+        next_cursor = encode_cursor(start + limit, page_ids[-1])
+    return CatalogPage(_load_page(page_ids), next_cursor, "relevance", "asc", limit)
+
+
+def _search_page(ids, sort, descending, after, limit):
+    # Same order and cursors as the SQL keyset path, but over the search hits
+    # in memory: name / price / discounted price come from the search index,
+    # stock from the live stock index (inventory.py), where a product without
+    # a warehouse row counts as 0, as the page shows it.
+    if sort == "id":
+        values = {pid: pid for pid in ids}
+    elif sort == "stock":
+        values = inventory.quantities(ids)
+    else:
+        values = get_index().sort_values(ids, sort)
+
+    # (has value, value, id): NULLs first ascending, last descending, like SQL
+    def key(value, pid):
+        return (value is not None, 0 if value is None else value, pid)
+
+    ordered = sorted(key(values.get(pid), pid) for pid in ids)
+    if sort == "name" and after and after[0] is not None:
+        after = (after[0].casefold(), after[1])     # the index holds casefolded names
+    if descending:
+        end = bisect_left(ordered, key(*after)) if after else len(ordered)
+        page = ordered[max(0, end - limit - 1):end][::-1]
+    else:
+        start = bisect_right(ordered, key(*after)) if after else 0
+        page = ordered[start:start + limit + 1]
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        has_value, value, pid = page[-1]
+        next_cursor = encode_cursor(value if has_value else None, pid)
+
+    items = _load_page([pid for _, _, pid in page])
+    return CatalogPage(items, next_cursor, sort, "desc" if descending else "asc", limit)
+
+
+def _load_page(page_ids):
+    by_id = {p.Product_ID: p for p in catalog_query(page_ids).all()} if page_ids else {}
+    return [by_id[pid] for pid in page_ids if pid in by_id]
+
+
+def product_to_dict(p):
+    return {
+        "id": p.Product_ID,
+        "name": p.Name,
+        "price": p.Price,
+        "discount_percent": p.get_discount_percent(),
+        "discounted_price": p.discounted_price,
+        "barcode": p.Barcode,
+        "man_id": p.Man_ID,
+        "image": p.Image,
+        "image_url": product_image(p.Image),
+        "image_fallback_url": product_image(p.Image, fmt="jpeg"),
+        "stock": p.stock_qty,
+    }
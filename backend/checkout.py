@@ -0,0 +1,114 @@
+import logging
+from datetime import datetime
+from sqlalchemy import update, insert
+from . import db
+from . import aggregates, rollups
+from .cart_pricing import price_cart
+from .jobs import task, enqueue_many
+from .models import WarehouseItem, Orders, OrderItem, Customer
+
+log = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+# Checkout pipeline: cart priced by cart_pricing (one query for every line,
+# same numbers the /cart page showed), stock reserved with
+# atomic conditional UPDATEs, order items inserted in one batch, and the
+# whole thing committed or rolled back as one unit.
+#
+# Stock is taken with
+#     UPDATE WarehouseItem SET Quantity = Quantity - n
+#     WHERE Product_ID = :id AND Quantity >= n
+# one product at a time in Product_ID order, so concurrent checkouts never
+# oversell (a row that no longer has n left matches nothing) and always
+# lock rows in the same order (no deadlocks).
+#
+# Only the stock and the order rows are written inline; the summary-table
+# and sales-rollup bookkeeping and the receipt are queued as jobs in the same transaction
+# (see jobs.py), so the customer gets the redirect as soon as it commits.
+def place_order(cust_id, cart):
+    quote = price_cart(cart)
+    if not quote:
+        raise CheckoutError("Your cart is empty.")
+
+    # friendly early check; the conditional UPDATE below is what counts
+    for line in quote.lines:
+        if line.qty > line.stock:
+            raise CheckoutError(f"Not enough stock for {line.product.Name}. Available: {line.stock}")
+
+    # (product, qty) in Product_ID order
+    lines = [(line.product, line.qty) for line in quote.lines]
+
+    try:
+        for product, qty in lines:
+            reserved = db.session.execute(
+                update(WarehouseItem)
+                .where(WarehouseItem.Product_ID == product.Product_ID)
+                .where(WarehouseItem.Quantity >= qty)
+                .values(Quantity=WarehouseItem.Quantity - qty)
+                .execution_options(synchronize_session=False)
+            )
+            if reserved.rowcount != 1:
+                raise CheckoutError(f"Not enough stock for {product.Name}")
+
+        # what is left, for the stock index: our UPDATEs hold these rows
+        # until the commit, so this is exactly what gets committed
+        stock = dict(
+            db.session.query(WarehouseItem.Product_ID, WarehouseItem.Quantity)
+            .filter(WarehouseItem.Product_ID.in_([product.Product_ID for product, _ in lines]))
+            .all()
+        )
+
+        new_order = Orders(
+            Cust_ID=cust_id,
+            Date=datetime.now().replace(microsecond=0),
+            Price=quote.total,
+            Discount=quote.discount
+        )
+        db.session.add(new_order)
+        db.session.flush()
+
+        db.session.execute(insert(OrderItem), [
+            {"Order_ID": new_order.Order_ID, "Product_ID": product.Product_ID, "Quantity": qty}
+            for product, qty in lines
+        ])
+
+        order_id = new_order.Order_ID
+        enqueue_many([
+            ("order-placed", {
+                "cust_id": cust_id,
+                "price": quote.total,
+                "stock_value": sum(float(product.Price or 0) * qty for product, qty in lines),
+            }, f"order-placed:{order_id}"),
+            ("order-receipt", {"order_id": order_id}, f"order-receipt:{order_id}"),
+            rollups.job("placed", [order_id]),
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return new_order, stock
+
+
+# ---------- deferred work (jobs) ----------
+
+@task("order-placed", invalidates=("orders",))
+def order_placed(cust_id, price, stock_value):
+    aggregates.record_order_placed(cust_id, price, stock_value)
+
+
+# stub: where the e-mail receipt would be sent from
+@task("order-receipt")
+def order_receipt(order_id):
+    row = (
+        db.session.query(Orders.Price, Customer.Email)
+        .join(Customer, Customer.Cust_ID == Orders.Cust_ID)
+        .filter(Orders.Order_ID == order_id)
+        .first()
+    )
+    if row is not None:
+        log.info("Receipt for order %s (%.2f) to %s", order_id, row.Price or 0, row.Email)
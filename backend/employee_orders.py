@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, session
+from flask import Blueprint, render_template, redirect, url_for, flash, session, request, jsonify, abort
 from flask_login import login_required, current_user
 from .models import Orders, OrderItem, Product, Customer, WarehouseItem
+from sqlalchemy import select, update, insert, func, literal
+from sqlalchemy.orm.attributes import set_committed_value
 from . import db
+from . import analytics_engine, aggregates, fragments, inventory, rollups
+from .jobs import task, enqueue
 
 employee_orders_bp = Blueprint("employee_orders", __name__)
 
@@ -10,33 +14,229 @@ def employee_only():
     return session.get("user_type") == "employee" and hasattr(current_user, "Emp_ID")
 
 
+ORDERS_PAGE_SIZE = 25
+
+
+# Pending orders with their items and total quantity, loaded in two queries
+# (orders+customers, then every item of those orders at once).
+#   before: older page (Order_ID < before, newest first)
+#   since:  polling for new orders (Order_ID > since, oldest first)
+def load_pending_orders(before=None, since=None, limit=ORDERS_PAGE_SIZE):
+    query = (
+        db.session.query(Orders, Customer)
+        .join(Customer, Customer.Cust_ID == Orders.Cust_ID)
+        .filter(Orders.Status == "pending")
+    )
+    if since is not None:
+        query = query.filter(Orders.Order_ID > since).order_by(Orders.Order_ID.asc())
+    else:
+        if before is not None:
+            query = query.filter(Orders.Order_ID < before)
+        query = query.order_by(Orders.Order_ID.desc())
+
+    pending_orders = query.limit(limit + 1).all()
+    has_more = len(pending_orders) > limit
+    pending_orders = pending_orders[:limit]
+
+    items_by_order = {order.Order_ID: [] for order, _ in pending_orders}
+    if items_by_order:
+        rows = (
+            db.session.query(OrderItem, Product)
+            .join(Product, Product.Product_ID == OrderItem.Product_ID)
+            .filter(OrderItem.Order_ID.in_(list(items_by_order)))
+            .all()
+        )
+        for oi, p in rows:
+            items_by_order[oi.Order_ID].append((oi, p))
+
+    # build details: (order, customer, items, total quantity)
+    orders_details = []
+    for order, customer in pending_orders:
+        items = items_by_order[order.Order_ID]
+        total_qty = sum(oi.Quantity or 0 for oi, _ in items)
+        orders_details.append((order, customer, items, total_qty))
+
+    return orders_details, has_more
+
+
 @employee_orders_bp.route("/employee/orders")
 @login_required
 def employee_orders():
     if not employee_only():
         return redirect(url_for("shop"))
 
-    # pending orders + customer info
-    pending_orders = (
-        db.session.query(Orders, Customer)
-        .join(Customer, Customer.Cust_ID == Orders.Cust_ID)
-        .filter(Orders.Status == "pending")
-        .order_by(Orders.Order_ID.desc())
+    before = request.args.get("before", type=int)
+    orders_details, has_more = load_pending_orders(before=before)
+
+    # newest id on the page -> starting point for polling
+    latest_id = orders_details[0][0].Order_ID if orders_details and before is None else None
+    next_before = orders_details[-1][0].Order_ID if has_more else None
+
+    return render_template(
+        "employee_orders.html",
+        orders_details=orders_details,
+        next_before=next_before,
+        latest_id=latest_id,
+        before=before,
+    )
+
+
+# Poll for orders that arrived after `since`; returns rendered cards
+@employee_orders_bp.route("/employee/orders/new")
+@login_required
+def employee_orders_new():
+    if not employee_only():
+        return jsonify({"error": "employees only"}), 403
+
+    since = request.args.get("since", default=0, type=int)
+    orders_details, has_more = load_pending_orders(since=since)
+
+    html = "".join(
+        render_template("pending_order_card.html", order=o, customer=c, items=i, total_qty=q)
+        for o, c, i, q in orders_details
+    )
+    if orders_details:
+        since = orders_details[-1][0].Order_ID
+
+    return jsonify({"html": html, "count": len(orders_details), "since": since, "more": has_more})
+
+
+# ---------- accept / reject (single and bulk share the same code) ----------
+
+# Lock the requested orders (consistent Order_ID order to avoid deadlocks)
+# and split them into pending ones and per-order outcomes for the rest.
+def _lock_pending(order_ids):
+    orders = (
+        Orders.query
+        .filter(Orders.Order_ID.in_(order_ids))
+        .order_by(Orders.Order_ID.asc())
+        .with_for_update()
         .all()
     )
+    found = {o.Order_ID: o for o in orders}
+    outcomes = {}
+    pending = []
+    for oid in order_ids:
+        order = found.get(oid)
+        if order is None:
+            outcomes[oid] = "not found"
+        elif order.Status != "pending":
+            outcomes[oid] = "already handled"
+        else:
+            pending.append(order)
+    return pending, outcomes
 
-    # build details: (order, customer, items)
-    orders_details = []
-    for order, customer in pending_orders:
-        items = (
-            db.session.query(OrderItem, Product)
+
+def accept_orders(order_ids, emp_id):
+    pending, outcomes = _lock_pending(order_ids)
+    if pending:
+        ids = [o.Order_ID for o in pending]
+        db.session.execute(
+            update(Orders)
+            .where(Orders.Order_ID.in_(ids), Orders.Status == "pending")
+            .values(Status="accepted", Emp_ID=emp_id)
+            .execution_options(synchronize_session=False)
+        )
+        for o in pending:
+            # mirror the UPDATE on the loaded rows without dirtying them
+            set_committed_value(o, "Status", "accepted")
+            set_committed_value(o, "Emp_ID", emp_id)
+            outcomes[o.Order_ID] = "accepted"
+
+        # an order leaves "pending" once, so its first id names the batch
+        enqueue("orders-accepted", {"order_ids": ids}, key=f"orders-accepted:{ids[0]}")
+        enqueue(*rollups.job("accepted", ids))
+
+    db.session.commit()
+    if pending:
+        analytics_engine.invalidate("orders")
+    return outcomes
+
+
+def reject_orders(order_ids):
+    pending, outcomes = _lock_pending(order_ids)
+    restocked = {}     # product id -> units put back
+    if pending:
+        ids = [o.Order_ID for o in pending]
+        batch = select(OrderItem.Product_ID).where(OrderItem.Order_ID.in_(ids))
+
+        # products without a warehouse row get one (Quantity 0) first
+        missing = (
+            select(OrderItem.Product_ID, literal(0))
+            .where(OrderItem.Order_ID.in_(ids))
+            .where(OrderItem.Product_ID.notin_(select(WarehouseItem.Product_ID)))
+            .distinct()
+        )
+        db.session.execute(
+            insert(WarehouseItem).from_select(["Product_ID", "Quantity"], missing)
+        )
+
+        # warehouse value delta before the restock
+        lines = (
+            db.session.query(Product.Product_ID, Product.Price, func.sum(OrderItem.Quantity))
             .join(Product, Product.Product_ID == OrderItem.Product_ID)
-            .filter(OrderItem.Order_ID == order.Order_ID)
+            .filter(OrderItem.Order_ID.in_(ids))
+            .group_by(Product.Product_ID, Product.Price)
             .all()
         )
-        orders_details.append((order, customer, items))
+        enqueue("orders-rejected", {"restocked": [[price, qty] for _, price, qty in lines]},
+                key=f"orders-rejected:{ids[0]}")
+        enqueue(*rollups.job("rejected", ids))
+        restocked = {pid: int(qty or 0) for pid, _, qty in lines}
 
-    return render_template("employee_orders.html", orders_details=orders_details)
+        # ONE set-based restock for the whole batch:
+        # Quantity += (SUM of this batch's lines for the product)
+        batch_qty = (
+            select(func.sum(OrderItem.Quantity))
+            .where(OrderItem.Product_ID == WarehouseItem.Product_ID)
+            .where(OrderItem.Order_ID.in_(ids))
+            .scalar_subquery()
+        )
+        db.session.execute(
+            update(WarehouseItem)
+            .where(WarehouseItem.Product_ID.in_(batch))
+            .values(Quantity=func.coalesce(WarehouseItem.Quantity, 0) + func.coalesce(batch_qty, 0))
+            .execution_options(synchronize_session=False)
+        )
+        # restocked levels as they will commit (the rows stay locked until then)
+        stock = dict(
+            db.session.query(WarehouseItem.Product_ID, WarehouseItem.Quantity)
+            .filter(WarehouseItem.Product_ID.in_(list(restocked)))
+            .all()
+        )
+
+        db.session.execute(
+            update(Orders)
+            .where(Orders.Order_ID.in_(ids), Orders.Status == "pending")
+            .values(Status="rejected", Emp_ID=None)
+            .execution_options(synchronize_session=False)
+        )
+        for o in pending:
+            outcomes[o.Order_ID] = "rejected"
+
+    db.session.commit()
+    if pending:
+        # warehouse rows changed behind the ORM's back
+        db.session.expire_all()
+        analytics_engine.invalidate("orders", "catalog")
+        fragments.bump(restocked)
+        inventory.record_quantities(stock)
+    return outcomes
+
+
+# ---------- deferred bookkeeping (jobs) ----------
+
+@task("orders-accepted", invalidates=("orders",))
+def orders_accepted(order_ids):
+    orders = Orders.query.filter(Orders.Order_ID.in_(order_ids), Orders.Status == "accepted").all()
+    items = OrderItem.query.filter(OrderItem.Order_ID.in_([o.Order_ID for o in orders])).all()
+    aggregates.record_orders_accepted(orders, items)
+
+
+# restocked: [(price at rejection time, qty)]
+@task("orders-rejected", invalidates=("catalog",))
+def orders_rejected(restocked):
+    aggregates.record_restock(restocked)
 
 
 @employee_orders_bp.route("/employee/orders/accept/<int:order_id>", methods=["POST"])
@@ -45,17 +245,14 @@ def accept_order(order_id):
     if not employee_only():
         return redirect(url_for("shop"))
 
-    order = Orders.query.get_or_404(order_id)
-
-    if order.Status != "pending":
+    outcome = accept_orders([order_id], current_user.Emp_ID)[order_id]
+    if outcome == "not found":
+        abort(404)
+    if outcome == "already handled":
         flash("Order already handled.", "warning")
         return redirect(url_for("employee_orders.employee_orders"))
 
-    order.Status = "accepted"
-    order.Emp_ID = current_user.Emp_ID
-    db.session.commit()
-
-    flash(f"Order {order.Order_ID} accepted.", "success")
+    flash(f"Order {order_id} accepted.", "success")
     return redirect(url_for("employee_orders.employee_orders"))
 
 
@@ -65,28 +262,55 @@ def reject_order(order_id):
     if not employee_only():
         return redirect(url_for("shop"))
 
-    order = Orders.query.get_or_404(order_id)
-
-    if order.Status != "pending":
+    outcome = reject_orders([order_id])[order_id]
+    if outcome == "not found":
+        abort(404)
+    if outcome == "already handled":
         flash("Order already handled.", "warning")
         return redirect(url_for("employee_orders.employee_orders"))
 
-    # Restock warehouse items when rejected
-    items = OrderItem.query.filter_by(Order_ID=order.Order_ID).all()
+    flash(f"Order {order_id} rejected and stock restored.", "error")
+    return redirect(url_for("employee_orders.employee_orders"))
 
-    for it in items:
-        wi = WarehouseItem.query.filter_by(Product_ID=it.Product_ID).first()
 
-        if not wi:
-            wi = WarehouseItem(Product_ID=it.Product_ID, Quantity=0)
-            db.session.add(wi)
+# Accept or reject many orders in one transaction.
+# Form: order_ids=<id>&order_ids=<id>...&action=accept|reject
+# JSON: {"order_ids": [...], "action": "accept"|"reject"} -> per-order outcomes
+@employee_orders_bp.route("/employee/orders/bulk", methods=["POST"])
+@login_required
+def bulk_orders():
+    if not employee_only():
+        if request.is_json:
+            return jsonify({"error": "employees only"}), 403
+        return redirect(url_for("shop"))
 
-        wi.Quantity = (wi.Quantity or 0) + (it.Quantity or 0)
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is not None:
+        raw_ids, action = data.get("order_ids") or [], data.get("action")
+    else:
+        raw_ids, action = request.form.getlist("order_ids"), request.form.get("action")
 
-    order.Status = "rejected"
-    order.Emp_ID = None
+    try:
+        order_ids = sorted({int(x) for x in raw_ids})
+    except (TypeError, ValueError):
+        order_ids = None
 
-    db.session.commit()
+    if not order_ids or action not in ("accept", "reject"):
+        if data is not None:
+            return jsonify({"error": "order_ids and action=accept|reject required"}), 400
+        flash("Select at least one order.", "warning")
+        return redirect(url_for("employee_orders.employee_orders"))
+
+    if action == "accept":
+        outcomes = accept_orders(order_ids, current_user.Emp_ID)
+    else:
+        outcomes = reject_orders(order_ids)
+
+    if data is not None:
+        return jsonify({"action": action, "results": {str(k): v for k, v in outcomes.items()}})
 
-    flash(f"Order {order.Order_ID} rejected and stock restored.", "error")
+    done = sum(1 for v in outcomes.values() if v in ("accepted", "rejected"))
+    skipped = len(outcomes) - done
+    flash(f"{done} order(s) {action}ed." + (f" {skipped} skipped (already handled or missing)." if skipped else ""),
+          "success" if action == "accept" else "error")
     return redirect(url_for("employee_orders.employee_orders"))
@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
+from sqlalchemy import select, func
+from . import db
+from .models import Product, WarehouseItem, Manufacturer, Customer, Employee, Orders
+
+# Full analytics datasets as streamed CSV / JSONL downloads.
+#
+# The dashboard only shows the first rows of the big lists (1, 2, 3, 17,
+# 19); /analytics/export/<dataset>.<fmt> streams the whole set. Rows come from
+# a server-side cursor (yield_per -> stream_results) EXPORT_CHUNK_ROWS at a
+# time and are written out chunk by chunk, so memory stays flat no matter
+# how many rows there are.
+
+EXPORT_CHUNK_ROWS = 2000
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+class ExportError(ValueError):
+    pass
+
+
+# YYYY-MM-DD inputs -> [start 00:00, end + 1 day); None if either is unusable
+def date_range(start_date, end_date):
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    except (TypeError, ValueError):
+        return None
+    return start, end
+
+
+# ---------- datasets (query number -> select) ----------
+
+def products_statement():                                       # 1
+    return (
+        select(
+            Product.Product_ID, Product.Name, Product.Price, Product.Barcode,
+            func.coalesce(WarehouseItem.Quantity, 0).label("Quantity"),
+        )
+        .outerjoin(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .order_by(Product.Product_ID.asc())
+    )
+
+
+def customers_statement():                                      # 2
+    return (
+        select(Customer.Cust_ID, Customer.Name, Customer.Email, Customer.Phone_Num)
+        .order_by(Customer.Cust_ID.asc())
+    )
+
+
+def employees_statement():                                      # 3
+    return (
+        select(Employee.Emp_ID, Employee.Name, Employee.Email, Employee.Phone_Num, Employee.Address)
+        .order_by(Employee.Emp_ID.asc())
+    )
+
+
+def orders_in_range_statement(start_date, end_date):            # 17
+    bounds = date_range(start_date, end_date)
+    if bounds is None:
+        raise ExportError("start_date and end_date (YYYY-MM-DD) are required")
+    start, end = bounds
+    return (
+        select(
+            Orders.Order_ID, Orders.Date, Orders.Price, Orders.Status,
+            Customer.Name.label("customer_name"),
+        )
+        .join(Customer, Customer.Cust_ID == Orders.Cust_ID)
+        .where(Orders.Date >= start, Orders.Date < end)
+        .order_by(Orders.Date.desc(), Orders.Order_ID.desc())
+    )
+
+
+def products_with_manufacturers_statement():                   # 19
+    return (
+        select(
+            Product.Product_ID, Product.Name, Product.Price,
+            Manufacturer.Name.label("manufacturer_name"),
+        )
+        .outerjoin(Manufacturer, Manufacturer.Man_ID == Product.Man_ID)
+        .order_by(Product.Product_ID.asc())
+    )
+
+
+# dataset -> (statement builder, request args it takes)
+DATASETS = {
+    "products": (products_statement, ()),
+    "customers": (customers_statement, ()),
+    "employees": (employees_statement, ()),
+    "orders_in_range": (orders_in_range_statement, ("start_date", "end_date")),
+    "products_with_manufacturers": (products_with_manufacturers_statement, ()),
+}
+
+
+def dataset_statement(name, args):
+    if name not in DATASETS:
+        raise ExportError(f"unknown dataset: {name}")
+    build, params = DATASETS[name]
+    return build(*(args.get(p) for p in params))
+
+
+def count_rows(statement):
+    return db.session.execute(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    ).scalar() or 0
+
+
+# ---------- streaming ----------
+
+def _value(v):
+    return v.isoformat(sep=" ") if isinstance(v, datetime) else v
+
+
+def stream_rows(statement):
+    """Yield (columns, chunk of rows) straight from a server-side cursor."""
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+    try:
+        columns = list(result.keys())
+        for chunk in result.partitions():
+            yield columns, chunk
+    finally:
+        result.close()
+
+
+def _csv_chunks(statement):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # header first, so an empty export still has its column names
+    writer.writerow(statement.selected_columns.keys())
+    for _, chunk in stream_rows(statement):
+        writer.writerows([_value(v) for v in row] for row in chunk)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _jsonl_chunks(statement):
+    for columns, chunk in stream_rows(statement):
+        yield "".join(
+            json.dumps(dict(zip(columns, (_value(v) for v in row))), default=str) + "\n"
+            for row in chunk
+        )
+
+
+def export_response(name, fmt, args):
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format: {fmt}")
+    statement = dataset_statement(name, args)
+    chunks = _csv_chunks(statement) if fmt == "csv" else _jsonl_chunks(statement)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
@@ -0,0 +1,238 @@
+import logging
+import time
+from datetime import datetime, date, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, func, insert, delete, literal, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from . import db
+from . import analytics_engine
+from .jobs import task
+from .models import Product, WarehouseItem, Orders, OrderItem, ProductForecast
+
+try:
+    import numpy as np
+except ImportError:     # optional: without numpy forecasts can be read, not recomputed
+    np = None
+
+log = logging.getLogger(__name__)
+
+# Per-product demand forecasts for the warehouse team.
+#
+# refresh() streams the order history of the last FORECAST_HISTORY_DAYS
+# whole days (Order_Item x Orders.Date, rejected orders left out) into NumPy
+# arrays, FORECAST_CHUNK_ROWS rows at a time. The database does the day
+# bucketing (GROUP BY product, day number), so only one row per product and
+# day crosses the wire. Everything after that is computed for all products
+# at once on a products x days matrix:
+#   Avg_7 / Avg_28   moving averages of daily units
+#   Daily_Units      simple exponential smoothing (FORECAST_ALPHA), the forecast
+#   Days_Of_Cover    stock / Daily_Units
+#   Reorder_Qty      when cover < REORDER_LEAD_DAYS: enough for
+#                    REORDER_LEAD_DAYS + REORDER_COVER_DAYS, less the stock
+# The results replace the Product_Forecast table. /analytics (low stock and
+# reorder suggestions) reads it, falling back to plain sales velocity
+# before the first refresh.
+#
+#   flask forecast refresh          (cron, or queue the "forecast-refresh" job)
+#
+# NumPy is optional: without it the stored forecasts are still served.
+
+FORECAST_HISTORY_DAYS = 56
+FORECAST_ALPHA = 0.3
+FORECAST_CHUNK_ROWS = 50_000
+PERSIST_BATCH = 5000
+
+
+class day_number(FunctionElement):
+    """Whole days since a fixed epoch, worked out by the database."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(day_number)
+def _day_number_sqlite(element, compiler, **kw):
+    # julianday() starts days at noon; date() first pins it to midnight
+    return "CAST(julianday(date(%s)) AS INTEGER)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(day_number, "mysql")
+def _day_number_mysql(element, compiler, **kw):
+    return "TO_DAYS(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(day_number, "postgresql")
+def _day_number_postgresql(element, compiler, **kw):
+    return "(CAST(%s AS DATE) - DATE '1970-01-01')" % compiler.process(element.clauses, **kw)
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("demand forecasting needs numpy (pip install numpy)")
+
+
+# ---------- loading ----------
+
+def load_products():
+    """(sorted product ids, their warehouse stock) as arrays."""
+    rows = db.session.execute(
+        select(Product.Product_ID, func.coalesce(WarehouseItem.Quantity, 0))
+        .outerjoin(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .order_by(Product.Product_ID.asc())
+    ).all()
+    table = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return table[:, 0], table[:, 1]
+
+
+def load_history(start, end, chunk=None):
+    """(product id, day number, units) per product and day in [start, end), as an n x 3 array."""
+    chunk = chunk or FORECAST_CHUNK_ROWS
+    day = day_number(Orders.Date)
+    result = db.session.execute(
+        select(OrderItem.Product_ID, day, func.sum(OrderItem.Quantity))
+        .join(Orders, Orders.Order_ID == OrderItem.Order_ID)
+        .where(Orders.Date >= start, Orders.Date < end, Orders.Status != "rejected")
+        .group_by(OrderItem.Product_ID, day)
+        .execution_options(yield_per=chunk)
+    )
+    parts = []
+    try:
+        for part in result.partitions():
+            parts.append(np.array(part, dtype=np.int64).reshape(-1, 3))
+    finally:
+        result.close()
+    return np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int64)
+
+
+# ---------- the model ----------
+
+def compute(product_ids, stock, pids, days, units, n_days, alpha, lead_days, cover_days):
+    """All products at once.
+
+    product_ids: sorted ids, stock: their quantities. pids / days / units:
+    one entry per order line (or per product and day), days counted from
+    the first day of the window. Returns a dict of per-product arrays.
+    """
+    n = len(product_ids)
+    slot = np.searchsorted(product_ids, pids)
+    known = (slot < n) & (days >= 0) & (days < n_days)
+    known[known] &= product_ids[slot[known]] == pids[known]
+
+    # products x days matrix of units sold
+    demand = np.bincount(
+        slot[known] * n_days + days[known], weights=units[known], minlength=n * n_days
+    ).reshape(n, n_days)
+
+    avg_7 = demand[:, -7:].mean(axis=1)
+    avg_28 = demand[:, -28:].mean(axis=1)
+
+    # exponential smoothing, level_t = alpha x_t + (1 - alpha) level_t-1 seeded
+    # with the first day, unrolled into one weight per day: a single mat-vec
+    weights = alpha * (1 - alpha) ** np.arange(n_days - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (n_days - 1)
+    daily = demand @ weights
+
+    on_hand = np.maximum(stock, 0)
+    selling = daily > 1e-9
+    cover = np.full(n, np.nan)
+    cover[selling] = on_hand[selling] / daily[selling]
+    due = selling & (cover < lead_days)
+    reorder = np.zeros(n, dtype=np.int64)
+    reorder[due] = np.maximum(np.ceil(daily[due] * (lead_days + cover_days)) - on_hand[due], 0)
+
+    return {
+        "daily": daily, "avg_7": avg_7, "avg_28": avg_28,
+        "cover": cover, "reorder": reorder,
+    }
+
+
+# ---------- refresh ----------
+
+def persist(product_ids, stock, result, computed):
+    db.session.execute(delete(ProductForecast))
+    cover = [None if c != c else round(c, 2) for c in result["cover"].tolist()]    # NaN -> NULL
+    columns = zip(
+        product_ids.tolist(), result["daily"].round(4).tolist(), result["avg_7"].round(4).tolist(),
+        result["avg_28"].round(4).tolist(), stock.tolist(), cover, result["reorder"].tolist(),
+    )
+    batch = []
+    for pid, daily, a7, a28, qty, days, reorder in columns:
+        batch.append({
+            "Product_ID": pid, "Daily_Units": daily, "Avg_7": a7, "Avg_28": a28,
+            "Stock": qty, "Days_Of_Cover": days, "Reorder_Qty": reorder, "Computed": computed,
+        })
+        if len(batch) >= PERSIST_BATCH:
+            db.session.execute(insert(ProductForecast), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(ProductForecast), batch)
+
+
+def refresh(commit=True):
+    """Recompute and store every product's forecast; returns timing stats.
+
+    commit=False leaves the commit to the caller (the job runner, which
+    commits the rows together with the job's done mark).
+    """
+    require_numpy()
+    from .inventory import REORDER_LEAD_DAYS, REORDER_COVER_DAYS
+    config = current_app.config
+    n_days = config.get("FORECAST_HISTORY_DAYS", FORECAST_HISTORY_DAYS)
+    stats = {}
+
+    started = time.perf_counter()
+    end = datetime.combine(date.today(), datetime.min.time())     # whole days only
+    start = end - timedelta(days=n_days)
+    product_ids, stock = load_products()
+    first_day = db.session.execute(select(day_number(literal(start)))).scalar()
+    lines = load_history(start, end, config.get("FORECAST_CHUNK_ROWS"))
+    stats["rows"] = len(lines)
+    stats["load_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = compute(
+        product_ids, stock, lines[:, 0], lines[:, 1] - first_day, lines[:, 2], n_days,
+        config.get("FORECAST_ALPHA", FORECAST_ALPHA),
+        config.get("REORDER_LEAD_DAYS", REORDER_LEAD_DAYS),
+        config.get("REORDER_COVER_DAYS", REORDER_COVER_DAYS),
+    )
+    stats["compute_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    persist(product_ids, stock, result, datetime.now().replace(microsecond=0))
+    if commit:
+        db.session.commit()
+    stats["persist_s"] = time.perf_counter() - started
+
+    stats["products"] = len(product_ids)
+    stats["reorder"] = int((result["reorder"] > 0).sum())
+    if commit:
+        analytics_engine.invalidate("forecast")
+    return stats
+
+
+@task("forecast-refresh", invalidates=("forecast",))
+def refresh_job():
+    stats = refresh(commit=False)
+    log.info("Forecast refreshed: %s", stats)
+
+
+# ---------- CLI ----------
+
+forecast_cli = AppGroup("forecast", help="Demand forecasts.")
+
+
+@forecast_cli.command("refresh")
+def refresh_command():
+    """Recompute every product's demand forecast."""
+    try:
+        stats = refresh()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"{stats['products']} products from {stats['rows']} product-days: "
+        f"load {stats['load_s']:.2f} s, compute {stats['compute_s']:.2f} s, "
+        f"store {stats['persist_s']:.2f} s; {stats['reorder']} to reorder"
+    )
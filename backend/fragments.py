@@ -0,0 +1,170 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import current_app
+from markupsafe import Markup
+
+# Fragment cache for per-product HTML (shop cards, /products rows).
+#
+# A fragment is stored under  frag:<kind>:<variant>:<product id>:<version>:<generation>
+# where version is a random token kept in the same store under ver:<id>.
+# bump(ids) gives those products a new token, so their old fragments are
+# never read again (and age out of the LRU); bump_all() does the same for
+# everything through the generation token. Tokens rather than counters mean
+# an evicted version key can only cause a miss, never a stale hit.
+#
+# The store is pluggable: anything with get_many(keys) -> {key: value},
+# set_many({key: value}) and clear() works, e.g. an adapter over a shared
+# Redis/memcached so all workers see the same fragments and bumps. Set
+# FRAGMENT_STORE to such an object; the default is an in-process LRU of
+# FRAGMENT_CACHE_SIZE entries.
+#
+# With the in-process LRU a bump only reaches the process that made the
+# write, so its entries (version tokens included) expire after
+# FRAGMENT_CACHE_TTL seconds: other workers pick up a new price or stock
+# level within that time, like the search and stock indexes.
+
+GENERATION_KEY = "ver:*"
+FRAGMENT_CACHE_TTL = 60
+
+
+class LRUStore:
+    def __init__(self, size=5000, ttl=FRAGMENT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()    # key -> (expires_at, value)
+
+    def get_many(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires is not None and expires <= now:
+                    del self.entries[key]
+                    continue
+                self.entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, mapping):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            for key, value in mapping.items():
+                self.entries[key] = (expires, value)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FragmentCache:
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.hits = {}      # kind -> count
+        self.misses = {}
+
+    def _count(self, counter, kind, n):
+        if n:
+            with self.lock:
+                counter[kind] = counter.get(kind, 0) + n
+
+    def _versions(self, ids):
+        keys = [f"ver:{pid}" for pid in ids] + [GENERATION_KEY]
+        found = self.store.get_many(keys)
+        new = {k: uuid.uuid4().hex[:12] for k in keys if k not in found}
+        if new:
+            self.store.set_many(new)
+            found.update(new)
+        generation = found[GENERATION_KEY]
+        return {pid: f"{found[f'ver:{pid}']}:{generation}" for pid in ids}
+
+    def render_many(self, kind, variant, products, render):
+        """HTML for every product, in order; render(product) fills the misses."""
+        ids = [p.Product_ID for p in products]
+        versions = self._versions(ids)
+        keys = [f"frag:{kind}:{variant}:{pid}:{versions[pid]}" for pid in ids]
+        found = self.store.get_many(keys)
+
+        fresh = {}
+        out = []
+        for product, key in zip(products, keys):
+            html = found.get(key)
+            if html is None:
+                html = fresh[key] = str(render(product))
+            out.append(Markup(html))
+        if fresh:
+            self.store.set_many(fresh)
+
+        self._count(self.hits, kind, len(products) - len(fresh))
+        self._count(self.misses, kind, len(fresh))
+        return out
+
+    def bump(self, ids):
+        ids = {int(pid) for pid in ids}
+        if ids:
+            self.store.set_many({f"ver:{pid}": uuid.uuid4().hex[:12] for pid in ids})
+
+    def bump_all(self):
+        self.store.set_many({GENERATION_KEY: uuid.uuid4().hex[:12]})
+
+    def metrics(self):
+        with self.lock:
+            lines = [
+                "# HELP rosemary_fragment_cache_hits_total Product fragments served from cache.",
+                "# TYPE rosemary_fragment_cache_hits_total counter",
+            ]
+            lines += [f'rosemary_fragment_cache_hits_total{{kind="{k}"}} {n}' for k, n in sorted(self.hits.items())]
+            lines += [
+                "# HELP rosemary_fragment_cache_misses_total Product fragments rendered.",
+                "# TYPE rosemary_fragment_cache_misses_total counter",
+            ]
+            lines += [f'rosemary_fragment_cache_misses_total{{kind="{k}"}} {n}' for k, n in sorted(self.misses.items())]
+        return lines
+
+
+def _cache():
+    cache = current_app.extensions.get("fragments")
+    if cache is None:
+        store = current_app.config.get("FRAGMENT_STORE") or LRUStore(
+            current_app.config.get("FRAGMENT_CACHE_SIZE", 5000),
+            current_app.config.get("FRAGMENT_CACHE_TTL", FRAGMENT_CACHE_TTL),
+        )
+        cache = current_app.extensions.setdefault("fragments", FragmentCache(store))
+    return cache
+
+
+# kind "card": templates/product_card.html, "row": templates/product_row.html
+TEMPLATES = {"card": "product_card.html", "row": "product_row.html"}
+
+
+def render_products(kind, products, variant="", **context):
+    """Cached HTML fragments for products; context must be the same for every
+    request that shares a variant (e.g. logged in or not)."""
+    template = current_app.jinja_env.get_template(TEMPLATES[kind])
+    return _cache().render_many(kind, variant, products, lambda p: template.render(p=p, **context))
+
+
+# Product data behind a fragment changed (edit, delete, checkout, rejection)
+def bump(product_ids):
+    _cache().bump(product_ids)
+
+
+def bump_all():
+    _cache().bump_all()
+
+
+def init_app(app):
+    # hit/miss counters on /_metrics
+    metrics = app.extensions.get("metrics")
+    if metrics is not None:
+        metrics.add_collector(lambda: _cache().metrics())
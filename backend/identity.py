@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from flask_login import UserMixin
+from . import db
+from .models import Customer, Employee
+
+# Identity cache behind Flask-Login's user_loader.
+#
+# load_user runs on every authenticated request; with this cache a page view
+# costs no identity query once the user has been seen. Entries are keyed by
+# (user_type, id), bounded (IDENTITY_CACHE_SIZE, LRU) and expire after
+# IDENTITY_CACHE_TTL seconds so changes made by another worker process show
+# up eventually. What is cached is a detached principal holding the columns
+# the app reads from current_user (never the password), not a live ORM row.
+
+
+class CustomerPrincipal(UserMixin):
+    user_type = "customer"
+
+    def __init__(self, row):
+        self.Cust_ID = row.Cust_ID
+        self.Name = row.Name
+        self.Email = row.Email
+        self.Phone_Num = row.Phone_Num
+
+    def get_id(self):
+        return str(self.Cust_ID)
+
+
+class EmployeePrincipal(UserMixin):
+    user_type = "employee"
+
+    def __init__(self, row):
+        self.Emp_ID = row.Emp_ID
+        self.Name = row.Name
+        self.Email = row.Email
+        self.Phone_Num = row.Phone_Num
+        self.Address = row.Address
+
+    def get_id(self):
+        return str(self.Emp_ID)
+
+
+def _load_customer(user_id):
+    row = (
+        db.session.query(Customer.Cust_ID, Customer.Name, Customer.Email, Customer.Phone_Num)
+        .filter(Customer.Cust_ID == user_id)
+        .first()
+    )
+    return CustomerPrincipal(row) if row else None
+
+
+def _load_employee(user_id):
+    row = (
+        db.session.query(Employee.Emp_ID, Employee.Name, Employee.Email, Employee.Phone_Num, Employee.Address)
+        .filter(Employee.Emp_ID == user_id)
+        .first()
+    )
+    return EmployeePrincipal(row) if row else None
+
+
+class IdentityCache:
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # (user_type, id) -> (expires_at, principal)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, principal):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, principal)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, user_id):
+        # every key for this id, whatever user_type it was looked up with
+        with self.lock:
+            for key in [k for k in self.entries if k[1] == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _cache():
+    cache = current_app.extensions.get("identity_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault("identity_cache", IdentityCache(
+            current_app.config.get("IDENTITY_CACHE_SIZE", 1024),
+            current_app.config.get("IDENTITY_CACHE_TTL", 300),
+        ))
+    return cache
+
+
+# user_type is what login stored in the session; without it the id is
+# tried as a customer first, then as an employee (as before)
+def load_principal(user_type, user_id):
+    user_id = int(user_id)
+    if user_type not in ("customer", "employee"):
+        user_type = None
+    key = (user_type, user_id)
+
+    cache = _cache()
+    principal = cache.get(key)
+    if principal is not None:
+        return principal
+
+    if user_type == "employee":
+        principal = _load_employee(user_id)
+    elif user_type == "customer":
+        principal = _load_customer(user_id)
+    else:
+        principal = _load_customer(user_id) or _load_employee(user_id)
+
+    # misses are not cached, so a user created later is found right away
+    if principal is not None:
+        cache.set(key, principal)
+    return principal
+
+
+# Drop a user's cached identity (signup, logout, profile changes).
+# No id = drop every cached identity.
+def invalidate(user_id=None):
+    if user_id is None:
+        _cache().clear()
+    else:
+        _cache().discard(int(user_id))
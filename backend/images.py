@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import click
+from flask import Blueprint, current_app, url_for, send_from_directory, abort
+from flask.cli import AppGroup
+from werkzeug.utils import safe_join
+from . import db
+from .models import Product
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:     # optional: without Pillow originals are served as-is
+    Image = ImageOps = None
+
+log = logging.getLogger(__name__)
+
+# Product image pipeline.
+#
+# Originals live in static/Products (Product.Image is the file name). Each
+# one is resized into variants (VARIANTS, WebP plus a JPEG fallback) stored
+# in a content-addressed cache: <sha256 of the original>-<variant>.<ext>.
+# A changed original gets a new name, so the URLs can be cached forever:
+# /img/<name> is served with Cache-Control: immutable, an ETag and Range
+# support. Variants are made when a product's image is set (product routes,
+# `flask images warm`) or, failing that, on first use.
+#
+# Pillow is optional. Without it (or for a format it cannot decode) the
+# original bytes are served under their fingerprinted name, so they still
+# get the long-lived caching.
+
+images_bp = Blueprint("images", __name__)
+
+PLACEHOLDER = "placeholder.jpg"
+MAX_AGE = 365 * 24 * 3600
+
+# variant -> longest side in pixels (catalog cards are 200px high, x2 for hi-dpi)
+VARIANTS = {"thumb": 480, "large": 1200}
+ENCODERS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+MIMETYPES = {
+    "webp": "image/webp", "jpg": "image/jpeg", "png": "image/png",
+    "gif": "image/gif", "avif": "image/avif",
+}
+
+
+def _sniff(head):
+    # the shipped originals are named .jpg whatever they really are
+    if head.startswith(b"\x89PNG"):
+        return "png"
+    if head.startswith(b"\xff\xd8"):
+        return "jpg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "avif"
+    if head[:4] == b"GIF8":
+        return "gif"
+    return None
+
+
+class ImageStore:
+    def __init__(self, source_dirs, cache_dir):
+        self.source_dirs = source_dirs
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.digests = {}     # source path -> ((mtime, size), digest)
+        self.resolved = {}    # (source path, stat, variant, fmt) -> cache name
+        self.sources = {}     # cache name -> (source path, variant, fmt), for regeneration
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def source_path(self, filename):
+        for directory in self.source_dirs:
+            path = safe_join(directory, filename) if filename else None
+            if path and os.path.isfile(path):
+                return path
+        return None
+
+    def _digest(self, path, stat):
+        cached = self.digests.get(path)
+        if cached and cached[0] == stat:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                h.update(block)
+        digest = h.hexdigest()[:20]
+        self.digests[path] = (stat, digest)
+        return digest
+
+    def variant(self, filename, variant="thumb", fmt="webp"):
+        """Cache file name for filename's variant (created if needed), or None."""
+        path = self.source_path(filename) or self.source_path(PLACEHOLDER)
+        if path is None:
+            return None
+        st = os.stat(path)
+        stat = (st.st_mtime_ns, st.st_size)
+        key = (path, stat, variant, fmt)
+
+        name = self.resolved.get(key)
+        if name is not None:
+            return name
+
+        with self.lock:
+            name = self.resolved.get(key)
+            if name is None:
+                name = self._build(path, self._digest(path, stat), variant, fmt)
+                self.resolved[key] = name
+                self.sources[name] = (path, variant, fmt)
+        return name
+
+    def _build(self, path, digest, variant, fmt):
+        if Image is not None and variant in VARIANTS and fmt in ENCODERS:
+            pil_format, ext, options = ENCODERS[fmt]
+            name = f"{digest}-{variant}.{ext}"
+            target = os.path.join(self.cache_dir, name)
+            if os.path.exists(target):
+                return name
+            try:
+                with Image.open(path) as img:
+                    img = ImageOps.exif_transpose(img).convert("RGBA")
+                    if fmt == "jpeg":
+                        # no alpha in JPEG: flatten onto white
+                        flat = Image.new("RGB", img.size, "white")
+                        flat.paste(img, mask=img.getchannel("A"))
+                        img = flat
+                    size = VARIANTS[variant]
+                    img.thumbnail((size, size), Image.LANCZOS)
+                    self._write(target, lambda f: img.save(f, pil_format, **options))
+                return name
+            except Exception:
+                log.exception("Could not make %s/%s variant of %s, serving the original", variant, fmt, path)
+
+        # original bytes under a fingerprinted name
+        with open(path, "rb") as f:
+            ext = _sniff(f.read(16)) or os.path.splitext(path)[1].lstrip(".").lower() or "bin"
+        name = f"{digest}.{ext}"
+        target = os.path.join(self.cache_dir, name)
+        if not os.path.exists(target):
+            def copy(f):
+                with open(path, "rb") as src:
+                    shutil.copyfileobj(src, f)
+            self._write(target, copy)
+        return name
+
+    def _write(self, target, write):
+        # write to a temp file and rename, so a half-written file is never served
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                write(f)
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def regenerate(self, name):
+        # cache file gone (cache dir wiped); rebuild it if this process made it
+        source = self.sources.get(name)
+        if source is None:
+            return False
+        path, variant, fmt = source
+        with self.lock:
+            self.resolved = {k: v for k, v in self.resolved.items() if v != name}
+        return self.variant(os.path.basename(path), variant, fmt) == name
+
+
+def _store():
+    store = current_app.extensions.get("images")
+    if store is None:
+        static = current_app.static_folder
+        store = current_app.extensions.setdefault("images", ImageStore(
+            current_app.config.get("IMAGE_SOURCE_DIRS") or [
+                os.path.join(static, "Products"), os.path.join(static, "products"),
+            ],
+            current_app.config.get("IMAGE_CACHE_DIR") or os.path.join(current_app.instance_path, "image-cache"),
+        ))
+    return store
+
+
+# Template / JSON helper: fingerprinted URL of a product image variant
+def product_image(filename, variant="thumb", fmt="webp"):
+    name = _store().variant(filename or PLACEHOLDER, variant, fmt)
+    if name is None:
+        return url_for("static", filename="Products/" + PLACEHOLDER)
+    return url_for("images.serve", name=name)
+
+
+# Called when a product's Image is set; failures never block the save
+def prepare(filename):
+    if not filename:
+        return
+    try:
+        for variant in VARIANTS:
+            for fmt in ENCODERS:
+                _store().variant(filename, variant, fmt)
+    except Exception:
+        log.exception("Could not prepare image variants for %s", filename)
+
+
+@images_bp.route("/img/<name>")
+def serve(name):
+    store = _store()
+    if not os.path.isfile(os.path.join(store.cache_dir, name)) and not store.regenerate(name):
+        abort(404)
+
+    ext = name.rsplit(".", 1)[-1]
+    response = send_from_directory(
+        store.cache_dir, name,
+        mimetype=MIMETYPES.get(ext), max_age=MAX_AGE, conditional=True, etag=True,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    app.register_blueprint(images_bp)
+    app.jinja_env.globals["product_image"] = product_image
+    app.cli.add_command(images_cli)
+
+
+# ---------- CLI ----------
+
+images_cli = AppGroup("images", help="Product image variants.")
+
+
+@images_cli.command("warm")
+def warm_command():
+    """Generate every variant for every product image."""
+    names = {name for (name,) in db.session.query(Product.Image).distinct() if name}
+    names.add(PLACEHOLDER)
+    for name in sorted(names):
+        prepare(name)
+    click.echo(f"{len(names)} image(s) prepared in {_store().cache_dir}")
@@ -0,0 +1,337 @@
+import bisect
+import contextvars
+import heapq
+import hmac
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request, session, has_request_context, before_render_template, template_rendered, Response, abort
+from sqlalchemy import event
+from . import db
+
+log = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Counts the SQL statements sent through an engine."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+# Usage:
+#     with count_queries() as counter:
+#         client.get("/shop")
+#     print(counter.count)
+@contextmanager
+def count_queries(engine=None):
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+
+
+# ---------- per-request stats ----------
+#
+# Engine events time every statement and add it to g.request_stats; Flask's
+# template signals time render_template. At the end of the request the stats
+# are folded into the process-wide Metrics (served at /_metrics), summarized
+# in an X-DB-Stats header when INSTRUMENTATION_HEADER is on, and N+1 patterns
+# / slow statements are logged. Per statement this is two perf_counter()
+# calls and a dict update, cheap enough to leave on.
+#
+# Config:
+#   INSTRUMENTATION_ENABLED   default True
+#   INSTRUMENTATION_HEADER    default False, adds X-DB-Stats to responses
+#   SLOW_QUERY_MS             default 100, statements slower than this are logged
+#   N_PLUS_ONE_THRESHOLD      default 5, same statement with different params this often
+#   METRICS_TOKEN             optional, /_metrics then needs "Authorization: Bearer <token>";
+#                             without it only employees and direct local requests get in
+
+SLOWEST_PER_REQUEST = 5
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = {}    # sql -> [count, total seconds, {param hashes}]
+        self.slowest = []       # min-heap of (seconds, sql)
+        self._render_started = []
+        self.lock = threading.Lock()    # helper threads record into it too
+
+    def record(self, statement, parameters, elapsed):
+        try:
+            param_hash = hash(repr(parameters))
+        except Exception:
+            param_hash = None
+        with self.lock:
+            self.queries += 1
+            self.db_time += elapsed
+
+            entry = self.statements.get(statement)
+            if entry is None:
+                entry = self.statements[statement] = [0, 0.0, set()]
+            entry[0] += 1
+            entry[1] += elapsed
+            if param_hash is not None and len(entry[2]) < 64:
+                entry[2].add(param_hash)
+
+            if len(self.slowest) < SLOWEST_PER_REQUEST:
+                heapq.heappush(self.slowest, (elapsed, statement))
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed, statement))
+
+    def n_plus_one(self, threshold):
+        # statements run `threshold`+ times in one request with differing params
+        return [
+            (sql, count) for sql, (count, _, params) in self.statements.items()
+            if count >= threshold and len(params) > 1
+        ]
+
+    def slowest_statements(self):
+        return sorted(self.slowest, reverse=True)
+
+
+def _shorten(sql, width=160):
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= width else sql[:width - 3] + "..."
+
+
+# ---------- process-wide metrics ----------
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TOP_SLOW_STATEMENTS = 20
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}          # (endpoint, status) -> count
+        self.durations = {}         # endpoint -> [bucket counts..., +Inf, sum]
+        self.db_queries = {}        # endpoint -> total statements
+        self.db_seconds = {}        # endpoint -> total db seconds
+        self.template_seconds = {}  # endpoint -> total render seconds
+        self.n_plus_one = {}        # endpoint -> requests with an N+1 pattern
+        self.slow_queries = 0
+        self.slow_statements = {}   # sql -> max seconds (TOP_SLOW_STATEMENTS kept)
+        self.collectors = []        # callables returning extra exposition lines
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def observe(self, endpoint, status, duration, stats, n_plus_one, slow):
+        with self.lock:
+            key = (endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            hist = self.durations.get(endpoint)
+            if hist is None:
+                hist = self.durations[endpoint] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0]
+            hist[bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+            hist[-1] += duration
+
+            self.db_queries[endpoint] = self.db_queries.get(endpoint, 0) + stats.queries
+            self.db_seconds[endpoint] = self.db_seconds.get(endpoint, 0.0) + stats.db_time
+            self.template_seconds[endpoint] = self.template_seconds.get(endpoint, 0.0) + stats.template_time
+            if n_plus_one:
+                self.n_plus_one[endpoint] = self.n_plus_one.get(endpoint, 0) + 1
+
+            self.slow_queries += len(slow)
+            for elapsed, sql in slow:
+                sql = _shorten(sql)
+                if elapsed > self.slow_statements.get(sql, 0.0):
+                    self.slow_statements[sql] = elapsed
+            if len(self.slow_statements) > TOP_SLOW_STATEMENTS:
+                keep = heapq.nlargest(TOP_SLOW_STATEMENTS, self.slow_statements.items(), key=lambda kv: kv[1])
+                self.slow_statements = dict(keep)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        out = []
+
+        def metric(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            metric("rosemary_http_requests_total", "counter", "Requests handled.")
+            for (endpoint, status), n in sorted(self.requests.items()):
+                out.append(f'rosemary_http_requests_total{{endpoint="{_label(endpoint)}",status="{status}"}} {n}')
+
+            metric("rosemary_http_request_duration_seconds", "histogram", "Request latency.")
+            for endpoint, hist in sorted(self.durations.items()):
+                ep = _label(endpoint)
+                cumulative = 0
+                for bound, n in zip(DURATION_BUCKETS + ("+Inf",), hist[:-1]):
+                    cumulative += n
+                    out.append(f'rosemary_http_request_duration_seconds_bucket{{endpoint="{ep}",le="{bound}"}} {cumulative}')
+                out.append(f'rosemary_http_request_duration_seconds_sum{{endpoint="{ep}"}} {hist[-1]:.6f}')
+                out.append(f'rosemary_http_request_duration_seconds_count{{endpoint="{ep}"}} {cumulative}')
+
+            for name, values, help_text in (
+                ("rosemary_db_queries_total", self.db_queries, "SQL statements executed."),
+                ("rosemary_db_seconds_total", self.db_seconds, "Time spent in SQL statements."),
+                ("rosemary_template_seconds_total", self.template_seconds, "Time spent rendering templates."),
+                ("rosemary_n_plus_one_requests_total", self.n_plus_one, "Requests that repeated a statement N+1 style."),
+            ):
+                metric(name, "counter", help_text)
+                for endpoint, value in sorted(values.items()):
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    out.append(f'{name}{{endpoint="{_label(endpoint)}"}} {value}')
+
+            metric("rosemary_db_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS.")
+            out.append(f"rosemary_db_slow_queries_total {self.slow_queries}")
+
+            metric("rosemary_db_slow_statement_max_seconds", "gauge", "Slowest statements seen (top 20).")
+            for sql, seconds in sorted(self.slow_statements.items(), key=lambda kv: -kv[1]):
+                out.append(f'rosemary_db_slow_statement_max_seconds{{statement="{_label(sql)}"}} {seconds:.6f}')
+
+        for collector in self.collectors:
+            out.extend(collector())
+        return "\n".join(out) + "\n"
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+# ---------- wiring ----------
+
+# stats of the request a helper thread is working for (recording_into)
+_task_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def _current_stats():
+    stats = _task_stats.get()
+    if stats is None and has_request_context():
+        stats = g.get("request_stats")
+    return stats
+
+
+def request_stats():
+    """The current request's stats (None outside a request), to hand to helper threads."""
+    return _current_stats()
+
+
+# Usage, in a thread doing part of a request's work (analytics sections):
+#     with recording_into(stats):
+#         ...   # its SQL counts towards that request
+@contextmanager
+def recording_into(stats):
+    token = _task_stats.set(stats)
+    try:
+        yield
+    finally:
+        _task_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    pending = conn.info.get("query_started")
+    if not pending:
+        return
+    started = pending.pop()
+    stats = _current_stats()
+    if stats is not None:
+        stats.record(statement, parameters, time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute: drop its start
+    # time so it is not paired with the next statement on this connection
+    conn = context.connection
+    pending = conn.info.get("query_started") if conn is not None else None
+    if pending:
+        pending.pop()
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None:
+        stats._render_started.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None and stats._render_started:
+        stats.template_time += time.perf_counter() - stats._render_started.pop()
+
+
+def _metrics_allowed(token):
+    # SQL text and timings are not for the public
+    if token:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if session.get("user_type") == "employee":
+        return True
+    # a scraper on the same host, not a request relayed by a local proxy
+    return request.remote_addr in ("127.0.0.1", "::1") and "X-Forwarded-For" not in request.headers
+
+
+def init_app(app):
+    if not app.config.get("INSTRUMENTATION_ENABLED", True):
+        return
+
+    metrics = app.extensions.setdefault("metrics", Metrics())
+
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return response
+        duration = time.perf_counter() - stats.started
+        endpoint = request.endpoint or "unmatched"
+
+        n_plus_one = stats.n_plus_one(app.config.get("N_PLUS_ONE_THRESHOLD", 5))
+        for sql, count in n_plus_one:
+            log.warning("N+1 in %s: %d x %s", endpoint, count, _shorten(sql))
+
+        slow_s = app.config.get("SLOW_QUERY_MS", 100) / 1000
+        slow = [(t, sql) for t, sql in stats.slowest_statements() if t >= slow_s]
+        for t, sql in slow:
+            log.warning("Slow query in %s (%.1f ms): %s", endpoint, t * 1000, _shorten(sql))
+
+        if endpoint != "metrics":
+            metrics.observe(endpoint, response.status_code, duration, stats, n_plus_one, slow)
+
+        if app.config.get("INSTRUMENTATION_HEADER"):
+            response.headers["X-DB-Stats"] = (
+                f"queries={stats.queries}; db_ms={stats.db_time * 1000:.1f}; "
+                f"template_ms={stats.template_time * 1000:.1f}; "
+                f"total_ms={duration * 1000:.1f}; n_plus_one={len(n_plus_one)}"
+            )
+        return response
+
+    @app.route("/_metrics", endpoint="metrics")
+    def metrics_endpoint():
+        if not _metrics_allowed(app.config.get("METRICS_TOKEN")):
+            abort(403)
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
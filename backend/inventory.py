@@ -0,0 +1,231 @@
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+from . import db
+from .models import Product, WarehouseItem
+
+log = logging.getLogger(__name__)
+
+# Live low-stock index and reorder suggestions.
+#
+# StockIndex keeps every product's warehouse quantity (0 without a warehouse
+# row, like analytics query 12) in a list sorted by (quantity, product id),
+# so "everything below N" is one bisect plus the k rows returned:
+# O(log n + k), whatever the threshold. It is loaded with one query on first
+# use and then kept current by the stock writers (checkout, order rejection,
+# product add / update / delete) as they commit. They pass the quantities
+# their transaction committed, not deltas, so a reload that already saw the
+# write cannot count it twice. Each process has its own
+# copy and only sees its own writes, so it is also reloaded every
+# INVENTORY_REFRESH_SECONDS.
+#
+# Crossing below INVENTORY_LOW_STOCK (or hitting 0) is logged as a warning,
+# and the counts are on /_metrics.
+#
+# Reorder suggestions come from expected units per day: the stored demand
+# forecast (forecast.py), or before the first forecast refresh the sales
+# velocity of the last REORDER_VELOCITY_DAYS (analytics "sales_velocity"
+# pass). A product is due once its stock covers less than REORDER_LEAD_DAYS
+# of demand; the suggestion tops it up to REORDER_LEAD_DAYS +
+# REORDER_COVER_DAYS.
+
+INVENTORY_REFRESH_SECONDS = 300
+INVENTORY_LOW_STOCK = 10
+REORDER_VELOCITY_DAYS = 30
+REORDER_LEAD_DAYS = 7
+REORDER_COVER_DAYS = 30
+
+
+class StockIndex:
+    def __init__(self, low_stock):
+        self.low_stock = low_stock
+        self.lock = threading.Lock()
+        self.by_qty = []        # sorted [(quantity, product id)]
+        self.qty = {}           # product id -> quantity
+        self.loaded_at = None
+        self.writes = 0         # bumped by every change, to spot a racing reload
+
+    def load(self, rows):
+        """rows: (product id, quantity)"""
+        with self.lock:
+            self.qty = {pid: int(q or 0) for pid, q in rows}
+            self.by_qty = sorted((q, pid) for pid, q in self.qty.items())
+            self.loaded_at = time.monotonic()
+
+    def _place(self, pid, new):
+        old = self.qty.get(pid)
+        if old is not None:
+            del self.by_qty[bisect_left(self.by_qty, (old, pid))]
+        if new is None:
+            self.qty.pop(pid, None)
+        else:
+            self.qty[pid] = new
+            insort(self.by_qty, (new, pid))
+        self.writes += 1
+        return old
+
+    def set(self, changes):
+        """changes: {product id: new quantity, or None when the product is gone}."""
+        crossed = []
+        with self.lock:
+            for pid, new in changes.items():
+                new = None if new is None else int(new)
+                old = self._place(pid, new)
+                if new is not None and old is not None and new < old:
+                    crossed.append((pid, old, new))
+        self._warn(crossed)
+
+    def _warn(self, crossed):
+        for pid, old, new in crossed:
+            if new <= 0 < old:
+                log.warning("Product %s is out of stock", pid)
+            elif new < self.low_stock <= old:
+                log.warning("Product %s is low on stock: %s left", pid, new)
+
+    def below(self, threshold, limit=None):
+        """[(product id, quantity)] with quantity < threshold, lowest first."""
+        with self.lock:
+            end = bisect_left(self.by_qty, (threshold, -math.inf))
+            if limit is not None:
+                end = min(end, limit)
+            return [(pid, q) for q, pid in self.by_qty[:end]]
+
+    def count_below(self, threshold):
+        with self.lock:
+            return bisect_left(self.by_qty, (threshold, -math.inf))
+
+    def quantity(self, pid):
+        return self.qty.get(pid)
+
+
+def _rows():
+    return (
+        db.session.query(Product.Product_ID, func.coalesce(WarehouseItem.Quantity, 0))
+        .outerjoin(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .all()
+    )
+
+
+def _index(load=True):
+    index = current_app.extensions.get("stock_index")
+    if index is None:
+        index = current_app.extensions.setdefault(
+            "stock_index", StockIndex(current_app.config.get("INVENTORY_LOW_STOCK", INVENTORY_LOW_STOCK))
+        )
+    if not load:
+        return index if index.loaded_at is not None else None
+
+    refresh = current_app.config.get("INVENTORY_REFRESH_SECONDS", INVENTORY_REFRESH_SECONDS)
+    if index.loaded_at is None or time.monotonic() - index.loaded_at > refresh:
+        writes = index.writes
+        index.load(_rows())
+        if index.writes != writes:
+            # a stock write landed while we were reading: load again next time
+            index.loaded_at = 0
+    return index
+
+
+# ---------- write hooks (call after the commit) ----------
+
+def record_quantities(changes):
+    """{product id: new quantity, None if deleted}"""
+    index = _index(load=False)
+    if index is not None:
+        index.set(changes)
+
+
+def reset():
+    # many products changed at once (bulk import): reload on next use
+    index = _index(load=False)
+    if index is not None:
+        index.loaded_at = 0
+
+
+# ---------- reads ----------
+
+def low_stock(threshold, limit=None):
+    return _index().below(threshold, limit)
+
+
+def quantities(pids):
+    """{product id: quantity} for pids (0 for products it does not know)."""
+    index = _index()
+    with index.lock:
+        return {pid: index.qty.get(pid, 0) for pid in pids}
+
+
+def reorder_suggestions(velocity, lead_days=None, cover_days=None):
+    """velocity: {product id: units per day}. Returns dicts, least days of stock first."""
+    config = current_app.config
+    lead_days = lead_days or config.get("REORDER_LEAD_DAYS", REORDER_LEAD_DAYS)
+    cover_days = cover_days or config.get("REORDER_COVER_DAYS", REORDER_COVER_DAYS)
+    index = _index()
+
+    suggestions = []
+    for pid, per_day in velocity.items():
+        qty = index.quantity(pid)
+        if qty is None or per_day <= 0:
+            continue
+        days_left = max(qty, 0) / per_day
+        if days_left < lead_days:
+            suggestions.append({
+                "product_id": pid,
+                "quantity": qty,
+                "per_day": round(per_day, 2),
+                "days_left": round(days_left, 1),
+                "reorder": math.ceil(per_day * (lead_days + cover_days)) - max(qty, 0),
+            })
+    suggestions.sort(key=lambda s: (s["days_left"], -s["per_day"]))
+    return suggestions
+
+
+def metrics():
+    index = _index(load=False)
+    if index is None:
+        return []
+    return [
+        "# HELP rosemary_products_out_of_stock Products with no warehouse stock.",
+        "# TYPE rosemary_products_out_of_stock gauge",
+        f"rosemary_products_out_of_stock {index.count_below(1)}",
+        "# HELP rosemary_products_low_stock Products below INVENTORY_LOW_STOCK units.",
+        "# TYPE rosemary_products_low_stock gauge",
+        f"rosemary_products_low_stock {index.count_below(index.low_stock)}",
+    ]
+
+
+def init_app(app):
+    app.cli.add_command(inventory_cli)
+    registry = app.extensions.get("metrics")
+    if registry is not None:
+        registry.add_collector(metrics)
+
+
+# ---------- CLI ----------
+
+inventory_cli = AppGroup("inventory", help="Stock levels and reorder suggestions.")
+
+
+@inventory_cli.command("low")
+@click.option("--threshold", type=int, default=INVENTORY_LOW_STOCK, show_default=True)
+def low_command(threshold):
+    """Products below a warehouse quantity, lowest first."""
+    rows = low_stock(threshold)
+    for pid, qty in rows:
+        click.echo(f"{pid:>8} {qty:>6}")
+    click.echo(f"{len(rows)} product(s) below {threshold}")
+
+
+@inventory_cli.command("reorder")
+def reorder_command():
+    """Reorder suggestions from the demand forecast (or recent sales)."""
+    from .analytics_engine import demand_per_day
+    suggestions = reorder_suggestions(demand_per_day())
+    click.echo(f"{'product':>8} {'stock':>6} {'per day':>8} {'days left':>10} {'reorder':>8}")
+    for s in suggestions:
+        click.echo(f"{s['product_id']:>8} {s['quantity']:>6} {s['per_day']:>8} {s['days_left']:>10} {s['reorder']:>8}")
@@ -0,0 +1,412 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import Blueprint, current_app, jsonify, session, request
+from flask.cli import AppGroup
+from sqlalchemy import select, update, insert, func, or_, and_, event
+from sqlalchemy.exc import IntegrityError
+from . import db
+from . import analytics_engine
+from .models import Job
+
+log = logging.getLogger(__name__)
+
+# Background jobs: deferred work that should not hold up a request.
+#
+# enqueue() adds a Job row inside the caller's transaction, so a job exists
+# if and only if the order (or whatever caused it) committed. Workers claim
+# due jobs with a conditional UPDATE (queued -> running, plus a lease), run
+# the task and mark it done IN THE SAME TRANSACTION as the task's own
+# writes: a task that only touches the database takes effect exactly once,
+# however often it is retried. A failure is retried with exponential
+# backoff up to Max_Attempts, then left as "failed". A job whose worker
+# died is picked up again when its lease runs out.
+#
+# Idempotency keys (Idem_Key, unique) make enqueueing the same work twice a
+# no-op. Tasks register with @task(name); invalidates= lists the analytics
+# cache tags to drop once the job commits.
+#
+# JOBS_WORKER_THREADS (default 2) worker threads start in each serving
+# process: right after the fork under gunicorn (post_fork), otherwise on its
+# first request or enqueue, so jobs queued or scheduled for retry before a
+# restart are picked up without waiting for new ones. CLI commands never
+# start them. Set it to 0 and run `flask jobs work` as a separate process
+# instead; `flask jobs status` / GET /jobs show the queue.
+#
+# Done jobs are kept JOBS_RETENTION_DAYS (0 = forever), then deleted by the
+# workers about every JOBS_PURGE_SECONDS or by `flask jobs purge`. Their
+# idempotency keys go with them, so keys only dedupe within that window.
+# Failed jobs are kept for inspection.
+
+JOBS_WORKER_THREADS = 2
+JOBS_POLL_SECONDS = 1.0
+JOBS_LEASE_SECONDS = 300
+JOBS_RETRY_SECONDS = 5
+JOBS_RETENTION_DAYS = 7
+JOBS_PURGE_SECONDS = 3600
+PURGE_BATCH = 1000
+MAX_ATTEMPTS = 5
+
+TASKS = {}      # name -> (function, invalidates)
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+def task(name, invalidates=()):
+    def register(fn):
+        TASKS[name] = (fn, tuple(invalidates))
+        return fn
+    return register
+
+
+def _row(name, payload=None, key=None, delay=0, max_attempts=MAX_ATTEMPTS):
+    if name not in TASKS:
+        raise ValueError(f"unknown job: {name}")
+    now = datetime.now()
+    return {
+        "Name": name,
+        "Payload": json.dumps(payload or {}),
+        "Idem_Key": key,
+        "Status": "queued",
+        "Attempts": 0,
+        "Max_Attempts": max_attempts,
+        "Run_After": now + timedelta(seconds=delay),
+        "Created": now,
+    }
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=MAX_ATTEMPTS):
+    """Queue a job in the current transaction (the caller commits). Returns its id."""
+    values = _row(name, payload, key, delay, max_attempts)
+    try:
+        with db.session.begin_nested():
+            job_id = db.session.execute(insert(Job).values(**values)).inserted_primary_key[0]
+    except IntegrityError:
+        if key is None:
+            raise
+        # already queued (or done) under this key
+        return db.session.execute(select(Job.Job_ID).where(Job.Idem_Key == key)).scalar()
+    db.session.info["jobs_enqueued"] = True
+    return job_id
+
+
+def enqueue_many(jobs):
+    """enqueue() for [(name, payload, key)], in one INSERT when none is a duplicate."""
+    rows = [_row(name, payload, key) for name, payload, key in jobs]
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Job), rows)
+    except IntegrityError:
+        for name, payload, key in jobs:
+            enqueue(name, payload, key)
+    db.session.info["jobs_enqueued"] = True
+
+
+# Jobs of these tasks that are still to run (queued, or running under a lease)
+ACTIVE = ("queued", "running")
+
+
+def pending(names):
+    """How many jobs of these tasks have not finished yet."""
+    return db.session.execute(
+        select(func.count()).select_from(Job).where(Job.Name.in_(names), Job.Status.in_(ACTIVE))
+    ).scalar()
+
+
+def supersede(names, reason):
+    """Retire the unfinished jobs of these tasks in the current transaction,
+    for a caller that redoes their work from the raw data. A worker still
+    running one then finds it no longer its own and drops its writes.
+    Returns how many were retired."""
+    return db.session.execute(
+        update(Job)
+        .where(Job.Name.in_(names), Job.Status.in_(ACTIVE))
+        .values(Status="done", Finished=datetime.now(), Locked_Until=None, Last_Error=reason)
+    ).rowcount
+
+
+# ---------- running jobs ----------
+
+def _due(now):
+    return or_(
+        and_(Job.Status == "queued", Job.Run_After <= now),
+        and_(Job.Status == "running", Job.Locked_Until < now),     # worker died
+    )
+
+
+def _claim():
+    """Take the next due job; returns (id, name, payload, attempts, max) or None."""
+    while True:
+        now = datetime.now()
+        row = db.session.execute(
+            select(Job.Job_ID, Job.Name, Job.Payload, Job.Attempts, Job.Max_Attempts)
+            .where(_due(now))
+            .order_by(Job.Run_After.asc(), Job.Job_ID.asc())
+            .limit(1)
+        ).first()
+        if row is None:
+            db.session.rollback()
+            return None
+        lease = current_app.config.get("JOBS_LEASE_SECONDS", JOBS_LEASE_SECONDS)
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.Job_ID == row.Job_ID, _due(now))
+            .values(Status="running", Attempts=Job.Attempts + 1, Locked_Until=now + timedelta(seconds=lease))
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return row.Job_ID, row.Name, row.Payload, row.Attempts + 1, row.Max_Attempts
+        # another worker got it first; look again
+
+
+def _run(job_id, name, payload, attempt, max_attempts):
+    mine = and_(Job.Job_ID == job_id, Job.Status == "running", Job.Attempts == attempt)
+    try:
+        fn, invalidates = TASKS[name]
+        fn(**json.loads(payload))
+        done = db.session.execute(
+            update(Job).where(mine).values(Status="done", Finished=datetime.now(), Locked_Until=None, Last_Error=None)
+        ).rowcount
+        if not done:
+            # lease ran out and another worker took the job over: drop our writes
+            db.session.rollback()
+            return
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.exception("Job %s (%s) failed, attempt %s/%s", job_id, name, attempt, max_attempts)
+        error = f"{e.__class__.__name__}: {e}"
+        if attempt >= max_attempts:
+            values = {"Status": "failed", "Finished": datetime.now()}
+        else:
+            backoff = current_app.config.get("JOBS_RETRY_SECONDS", JOBS_RETRY_SECONDS) * 2 ** (attempt - 1)
+            values = {"Status": "queued", "Run_After": datetime.now() + timedelta(seconds=backoff)}
+        db.session.execute(update(Job).where(mine).values(Locked_Until=None, Last_Error=error, **values))
+        db.session.commit()
+        return
+    if invalidates:
+        analytics_engine.invalidate(*invalidates)
+
+
+def run_one():
+    """Claim and run one due job in the current app context; False if none was due."""
+    claimed = _claim()
+    if claimed is None:
+        return False
+    _run(*claimed)
+    return True
+
+
+def run_pending(limit=None):
+    """Run due jobs until the queue is empty (or limit); returns how many ran."""
+    ran = 0
+    while (limit is None or ran < limit) and run_one():
+        ran += 1
+    return ran
+
+
+def purge(days=None):
+    """Delete done jobs finished more than days (JOBS_RETENTION_DAYS) ago; returns how many."""
+    if days is None:
+        days = current_app.config.get("JOBS_RETENTION_DAYS", JOBS_RETENTION_DAYS)
+    if not days:
+        return 0
+    cutoff = datetime.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        # small batches: short transactions next to the live queue
+        ids = db.session.execute(
+            select(Job.Job_ID).where(Job.Status == "done", Job.Finished < cutoff).limit(PURGE_BATCH)
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return deleted
+        deleted += db.session.execute(
+            Job.__table__.delete().where(Job.Job_ID.in_(ids), Job.Status == "done")
+        ).rowcount
+        db.session.commit()
+
+
+class Worker:
+    def __init__(self, app, threads, poll):
+        self.app = app
+        self.threads = threads
+        self.poll = poll
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.pid = os.getpid()
+        self.purge_lock = threading.Lock()
+        self.purged_at = 0.0
+
+    def start(self):
+        for i in range(self.threads):
+            threading.Thread(target=self._loop, name=f"jobs-worker-{i}", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            try:
+                with self.app.app_context():
+                    ran = run_one()
+            except Exception:
+                log.exception("Job worker error")
+                ran = False
+            if not ran:
+                self._purge()
+                self.wake.wait(self.poll)
+                self.wake.clear()
+
+    def _purge(self):
+        # when idle, one thread now and then drops old done jobs
+        every = self.app.config.get("JOBS_PURGE_SECONDS", JOBS_PURGE_SECONDS)
+        with self.purge_lock:
+            if time.monotonic() - self.purged_at < every:
+                return
+            self.purged_at = time.monotonic()
+        try:
+            with self.app.app_context():
+                deleted = purge()
+            if deleted:
+                log.info("Purged %s done job(s)", deleted)
+        except Exception:
+            log.exception("Job purge failed")
+
+
+_worker_lock = threading.Lock()
+
+
+def _worker(app):
+    # one per process; a forked child (gunicorn) starts its own
+    worker = app.extensions.get("jobs_worker")
+    if worker is not None and worker.pid == os.getpid():
+        return worker
+    with _worker_lock:
+        worker = app.extensions.get("jobs_worker")
+        if worker is not None and worker.pid == os.getpid():
+            return worker
+        threads = app.config.get("JOBS_WORKER_THREADS", JOBS_WORKER_THREADS)
+        if threads <= 0:
+            return None
+        worker = Worker(app, threads, app.config.get("JOBS_POLL_SECONDS", JOBS_POLL_SECONDS))
+        app.extensions["jobs_worker"] = worker
+        worker.start()
+    return worker
+
+
+def start_worker(app):
+    """This process's worker (started if needed); None with JOBS_WORKER_THREADS = 0."""
+    return _worker(app)
+
+
+# wake the worker as soon as newly queued jobs are visible
+def _after_commit(sess):
+    if sess.info.pop("jobs_enqueued", False):
+        worker = _worker(current_app._get_current_object())
+        if worker is not None:
+            worker.wake.set()
+
+
+# ---------- status ----------
+
+def job_to_dict(job):
+    return {
+        "id": job.Job_ID,
+        "name": job.Name,
+        "key": job.Idem_Key,
+        "status": job.Status,
+        "attempts": job.Attempts,
+        "max_attempts": job.Max_Attempts,
+        "created": job.Created.isoformat(sep=" "),
+        "run_after": job.Run_After.isoformat(sep=" "),
+        "finished": job.Finished.isoformat(sep=" ") if job.Finished else None,
+        "error": job.Last_Error,
+    }
+
+
+def queue_stats():
+    counts = {}
+    for name, status, n in db.session.query(Job.Name, Job.Status, func.count()).group_by(Job.Name, Job.Status):
+        counts.setdefault(name, {})[status] = n
+    oldest = db.session.query(func.min(Job.Created)).filter(Job.Status == "queued").scalar()
+    return {
+        "counts": counts,
+        "oldest_queued_seconds": round((datetime.now() - oldest).total_seconds(), 1) if oldest else None,
+    }
+
+
+# GET /jobs (queue summary), /jobs?key=<idempotency key>, /jobs/<id>; employees only
+@jobs_bp.route("/jobs")
+@jobs_bp.route("/jobs/<int:job_id>")
+def job_status(job_id=None):
+    if session.get("user_type") != "employee":
+        return jsonify({"error": "employees only"}), 403
+    if job_id is None and request.args.get("key") is None:
+        return jsonify(queue_stats())
+    query = Job.query.filter(Job.Job_ID == job_id) if job_id is not None else \
+        Job.query.filter(Job.Idem_Key == request.args["key"])
+    job = query.first()
+    if job is None:
+        return jsonify({"error": "no such job"}), 404
+    return jsonify(job_to_dict(job))
+
+
+def init_app(app):
+    app.register_blueprint(jobs_bp)
+    app.cli.add_command(jobs_cli)
+
+    @app.before_request
+    def start_jobs_worker():
+        _worker(app)
+    # session events are per Session class, i.e. shared by every app
+    if not event.contains(db.session, "after_commit", _after_commit):
+        event.listen(db.session, "after_commit", _after_commit)
+
+
+# ---------- CLI ----------
+
+jobs_cli = AppGroup("jobs", help="Background job queue.")
+
+
+@jobs_cli.command("work")
+@click.option("--once", is_flag=True, help="Run the jobs due now, then exit.")
+def work_command(once):
+    """Run queued jobs in this process (for JOBS_WORKER_THREADS = 0)."""
+    poll = current_app.config.get("JOBS_POLL_SECONDS", JOBS_POLL_SECONDS)
+    every = current_app.config.get("JOBS_PURGE_SECONDS", JOBS_PURGE_SECONDS)
+    purged_at = 0.0
+    while True:
+        ran = run_pending()
+        if ran:
+            click.echo(f"{ran} job(s) run")
+        if once:
+            return
+        if time.monotonic() - purged_at >= every:
+            purged_at = time.monotonic()
+            deleted = purge()
+            if deleted:
+                click.echo(f"{deleted} done job(s) purged")
+        time.sleep(poll)
+
+
+@jobs_cli.command("status")
+def status_command():
+    """Job counts by name and status."""
+    stats = queue_stats()
+    for name, counts in sorted(stats["counts"].items()):
+        click.echo(f"{name:<20} " + "  ".join(f"{s}={n}" for s, n in sorted(counts.items())))
+    if stats["oldest_queued_seconds"] is not None:
+        click.echo(f"oldest queued job: {stats['oldest_queued_seconds']} s")
+
+
+@jobs_cli.command("purge")
+@click.option("--days", type=int, default=None, help="Keep done jobs this many days (default JOBS_RETENTION_DAYS).")
+def purge_command(days):
+    """Delete done jobs older than the retention period."""
+    click.echo(f"{purge(days)} done job(s) purged.")
@@ -0,0 +1,184 @@
+import re
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text, table, column, select, update, bindparam, DateTime
+from . import db
+
+# Schema migrations for databases created before a model change.
+#
+# db.create_all() only creates missing tables, so a column type change or a
+# new index on an existing table has to be applied here. Every migration
+# checks the live schema itself (pending() -> bool), which makes
+# `flask schema upgrade` safe to run any number of times.
+#
+#   flask schema status
+#   flask schema upgrade
+
+BACKFILL_BATCH = 1000
+
+MIGRATIONS = []
+
+
+def migration(name, description):
+    def register(cls):
+        cls.name = name
+        cls.description = description
+        MIGRATIONS.append(cls())
+        return cls
+    return register
+
+
+def _columns(table_name):
+    return {c["name"]: c for c in inspect(db.engine).get_columns(table_name)}
+
+
+def _quote(name):
+    return db.engine.dialect.identifier_preparer.quote(name)
+
+
+# ---------- Orders.Date: VARCHAR -> DATETIME ----------
+
+# formats the old String(50) column has been written in
+DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y",
+)
+
+
+def parse_order_date(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    value = re.sub(r"\s+", " ", str(value).strip())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+@migration("orders-date-datetime", "Orders.Date String(50) -> indexed DATETIME (backfilled)")
+class OrdersDateToDatetime:
+    TMP = "Date_New"
+
+    def pending(self):
+        col = _columns("Orders").get("Date")
+        return col is not None and not isinstance(col["type"], DateTime)
+
+    def apply(self, echo=print):
+        orders = _quote("Orders")
+        old, new = _quote("Date"), _quote(self.TMP)
+
+        # 1. new column next to the old one (kept if a previous run was interrupted)
+        if self.TMP not in _columns("Orders"):
+            ddl_type = DateTime().compile(dialect=db.engine.dialect)
+            db.session.execute(text(f"ALTER TABLE {orders} ADD COLUMN {new} {ddl_type} NULL"))
+            db.session.commit()
+
+        # 2. backfill in Order_ID batches, one commit per batch
+        t = table("Orders", column("Order_ID"), column("Date"), column(self.TMP, DateTime))
+        stmt = (
+            update(t)
+            .where(t.c.Order_ID == bindparam("oid"))
+            .values({self.TMP: bindparam("parsed")})
+        )
+        last, done, unparsed = 0, 0, []
+        while True:
+            rows = db.session.execute(
+                select(t.c.Order_ID, t.c.Date)
+                .where(t.c.Order_ID > last)
+                .order_by(t.c.Order_ID)
+                .limit(BACKFILL_BATCH)
+            ).all()
+            if not rows:
+                break
+            params = []
+            for oid, raw in rows:
+                parsed = parse_order_date(raw)
+                if parsed is None and raw not in (None, ""):
+                    unparsed.append((oid, raw))
+                params.append({"oid": oid, "parsed": parsed})
+            db.session.execute(stmt, params)
+            db.session.commit()
+            last = rows[-1][0]
+            done += len(rows)
+            echo(f"  backfilled {done} order(s)")
+
+        for oid, raw in unparsed:
+            echo(f"  order {oid}: could not parse date {raw!r}, left empty")
+
+        # 3. swap the columns
+        db.session.execute(text(f"ALTER TABLE {orders} DROP COLUMN {old}"))
+        db.session.execute(text(f"ALTER TABLE {orders} RENAME COLUMN {new} TO {old}"))
+        db.session.commit()
+
+
+# ---------- indexes declared on the models ----------
+
+@migration("model-indexes", "Create indexes declared on the models but missing in the database")
+class ModelIndexes:
+    def _missing(self):
+        inspector = inspect(db.engine)
+        existing_tables = set(inspector.get_table_names())
+        missing = []
+        for tbl in db.metadata.sorted_tables:
+            if tbl.name not in existing_tables:
+                continue
+            names = {ix["name"] for ix in inspector.get_indexes(tbl.name)}
+            missing.extend(ix for ix in tbl.indexes if ix.name not in names)
+        return missing
+
+    def pending(self):
+        return bool(self._missing())
+
+    def apply(self, echo=print):
+        for index in self._missing():
+            echo(f"  creating {index.name} on {index.table.name}")
+            index.create(db.engine)
+
+
+# ---------- running ----------
+
+def pending_migrations():
+    return [m for m in MIGRATIONS if m.pending()]
+
+
+def upgrade(echo=print):
+    applied = []
+    for m in MIGRATIONS:
+        if not m.pending():
+            continue
+        echo(f"Applying {m.name}: {m.description}")
+        try:
+            m.apply(echo=echo)
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append(m.name)
+    return applied
+
+
+# ---------- CLI ----------
+
+schema_cli = AppGroup("schema", help="Schema migrations for existing databases.")
+
+
+@schema_cli.command("status")
+def status_command():
+    """List migrations and whether they still need to run."""
+    for m in MIGRATIONS:
+        state = "pending" if m.pending() else "up to date"
+        click.echo(f"{m.name:<24} {state:<11} {m.description}")
+
+
+@schema_cli.command("upgrade")
+def upgrade_command():
+    """Apply every pending migration."""
+    applied = upgrade(echo=click.echo)
+    click.echo(f"{len(applied)} migration(s) applied.")
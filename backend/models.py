@@ -23,6 +23,11 @@ class Manufacturer(db.Model):
 # Product Table
 class Product(db.Model):
     __tablename__ = 'Product'
+    __table_args__ = (
+        # keyset pagination: ORDER BY <key>, Product_ID
+        db.Index('ix_product_name_id', 'Name', 'Product_ID'),
+        db.Index('ix_product_price_id', 'Price', 'Product_ID'),
+    )
 
     def get_discount_percent(self) -> int:
         return int(self.Discount_Percent or 0)
@@ -47,12 +52,14 @@ class Product(db.Model):
 
     Name = db.Column(db.String(120))
     Price = db.Column(db.Float)
-    Barcode = db.Column(db.String(120))
+    Barcode = db.Column(db.String(120), index=True)
 
     # Get quantity from warehouse item
+    # (reads the warehouse_item relationship, so it costs no query when the
+    # product was loaded through catalog.catalog_query)
     @property
     def stock_qty(self):
-        wi = WarehouseItem.query.filter_by(Product_ID=self.Product_ID).first()
+        wi = self.warehouse_item
         return wi.Quantity if wi and wi.Quantity is not None else 0
 
     Image = db.Column(db.String(255), nullable=True)
@@ -73,6 +80,9 @@ class Product(db.Model):
 # WarehouseItem Table (1–1 with Product)
 class WarehouseItem(db.Model):
     __tablename__ = 'WarehouseItem'
+    __table_args__ = (
+        db.Index('ix_warehouse_qty_product', 'Quantity', 'Product_ID'),
+    )
 
     WI_ID = db.Column(db.Integer, primary_key=True, autoincrement=True, nullable=False)
     Product_ID = db.Column(
@@ -133,6 +143,13 @@ class Employee(db.Model, UserMixin):
 # Orders Table
 class Orders(db.Model):
     __tablename__ = 'Orders'
+    __table_args__ = (
+        # pending queue (Status = 'pending' ORDER BY Order_ID)
+        db.Index('ix_orders_status_id', 'Status', 'Order_ID'),
+        # a customer's orders by date / an employee's accepted orders
+        db.Index('ix_orders_cust_date', 'Cust_ID', 'Date'),
+        db.Index('ix_orders_emp_status', 'Emp_ID', 'Status'),
+    )
 
     Order_ID = db.Column(db.Integer, primary_key=True, autoincrement=True, nullable=False)
 
@@ -147,7 +164,7 @@ class Orders(db.Model):
         nullable=True
     )
 
-    Date = db.Column(db.String(50))
+    Date = db.Column(db.DateTime, index=True)
     Price = db.Column(db.Float)
     Discount = db.Column(db.Float)
     Status = db.Column(db.String(20), default="pending")  # pending / accepted / rejected
@@ -184,4 +201,149 @@ class OrderItem(db.Model):
         primary_key=True
     )
 
-    Quantity = db.Column(db.Integer, nullable=False)
\ No newline at end of file
+    Quantity = db.Column(db.Integer, nullable=False)
+
+# ---------- Summary tables (kept current on write, see aggregates.py) ----------
+
+# Per-customer spend / order counts (all orders, like analytics queries 6, 14, 15, 20)
+class CustomerSales(db.Model):
+    __tablename__ = 'Customer_Sales'
+
+    Cust_ID = db.Column(
+        db.Integer,
+        db.ForeignKey('Customer.Cust_ID', ondelete='CASCADE'),
+        primary_key=True
+    )
+    Total_Spent = db.Column(db.Float, nullable=False, default=0)
+    Order_Count = db.Column(db.Integer, nullable=False, default=0)
+    Accepted_Count = db.Column(db.Integer, nullable=False, default=0)
+    Min_Accepted_Discount = db.Column(db.Float, nullable=True)  # query 10
+
+
+# Units sold per employee (accepted orders, query 18)
+class EmployeeSales(db.Model):
+    __tablename__ = 'Employee_Sales'
+
+    Emp_ID = db.Column(
+        db.Integer,
+        db.ForeignKey('Employee.Emp_ID', ondelete='CASCADE'),
+        primary_key=True
+    )
+    Units_Sold = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Units sold per product (accepted orders)
+class ProductSales(db.Model):
+    __tablename__ = 'Product_Sales'
+
+    Product_ID = db.Column(
+        db.Integer,
+        db.ForeignKey('Product.Product_ID', ondelete='CASCADE'),
+        primary_key=True
+    )
+    Units_Sold = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Running SUM(Price * Quantity) over the warehouse (query 7); single row, ID = 1
+class WarehouseValue(db.Model):
+    __tablename__ = 'Warehouse_Value'
+
+    ID = db.Column(db.Integer, primary_key=True)
+    Total_Value = db.Column(db.Float, nullable=False, default=0)
+
+
+# ---------- Server-side carts (see cart_store.py) ----------
+
+class Cart(db.Model):
+    __tablename__ = 'Cart'
+
+    Cart_ID = db.Column(db.String(32), primary_key=True)   # random, the only thing in the cookie
+    Cust_ID = db.Column(
+        db.Integer,
+        db.ForeignKey('Customer.Cust_ID', ondelete='CASCADE'),
+        nullable=True,
+        index=True
+    )
+    Updated = db.Column(db.DateTime, nullable=False, index=True)   # expiry
+
+
+class CartItem(db.Model):
+    __tablename__ = 'Cart_Item'
+    __table_args__ = (
+        # units held by live carts for a product (soft reservations)
+        db.Index('ix_cart_item_product_hold', 'Product_ID', 'Reserved_Until'),
+    )
+
+    Cart_ID = db.Column(
+        db.String(32),
+        db.ForeignKey('Cart.Cart_ID', ondelete='CASCADE'),
+        primary_key=True
+    )
+    Product_ID = db.Column(
+        db.Integer,
+        db.ForeignKey('Product.Product_ID', ondelete='CASCADE'),
+        primary_key=True
+    )
+    Quantity = db.Column(db.Integer, nullable=False)
+    Reserved_Until = db.Column(db.DateTime, nullable=True)
+
+
+# ---------- Background jobs (see jobs.py) ----------
+
+class Job(db.Model):
+    __tablename__ = 'Job'
+    __table_args__ = (
+        # the worker's "next due job" lookup
+        db.Index('ix_job_status_run_after', 'Status', 'Run_After'),
+    )
+
+    Job_ID = db.Column(db.Integer, primary_key=True, autoincrement=True, nullable=False)
+    Name = db.Column(db.String(60), nullable=False)
+    Payload = db.Column(db.Text, nullable=False, default="{}")   # JSON kwargs
+    Idem_Key = db.Column(db.String(120), unique=True, nullable=True)
+    Status = db.Column(db.String(20), nullable=False, default="queued")  # queued / running / done / failed
+    Attempts = db.Column(db.Integer, nullable=False, default=0)
+    Max_Attempts = db.Column(db.Integer, nullable=False, default=5)
+    Run_After = db.Column(db.DateTime, nullable=False)
+    Locked_Until = db.Column(db.DateTime, nullable=True)          # lease of the worker running it
+    Created = db.Column(db.DateTime, nullable=False)
+    Finished = db.Column(db.DateTime, nullable=True)
+    Last_Error = db.Column(db.Text, nullable=True)
+
+
+# Per-product demand forecast, rewritten by `flask forecast refresh` (forecast.py)
+class ProductForecast(db.Model):
+    __tablename__ = 'Product_Forecast'
+
+    Product_ID = db.Column(
+        db.Integer,
+        db.ForeignKey('Product.Product_ID', ondelete='CASCADE'),
+        primary_key=True
+    )
+    Daily_Units = db.Column(db.Float, nullable=False, default=0)   # smoothed forecast
+    Avg_7 = db.Column(db.Float, nullable=False, default=0)
+    Avg_28 = db.Column(db.Float, nullable=False, default=0)
+    Stock = db.Column(db.Integer, nullable=False, default=0)
+    Days_Of_Cover = db.Column(db.Float, nullable=True)             # NULL: no demand
+    Reorder_Qty = db.Column(db.Integer, nullable=False, default=0)
+    Computed = db.Column(db.DateTime, nullable=False)
+
+
+# Time-bucketed sales totals for trend charts (see rollups.py). One row per
+# grain (hour / day / month), bucket start and dimension: Dim "all" (Dim_ID 0),
+# "employee" (Emp_ID) or "manufacturer" (Man_ID). Orders count in the bucket
+# of the date they were placed.
+class SalesRollup(db.Model):
+    __tablename__ = 'Sales_Rollup'
+
+    Grain = db.Column(db.String(8), primary_key=True)
+    Dim = db.Column(db.String(16), primary_key=True)
+    Dim_ID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    Bucket = db.Column(db.DateTime, primary_key=True)
+
+    Revenue = db.Column(db.Float, nullable=False, default=0)
+    Discount = db.Column(db.Float, nullable=False, default=0)
+    Orders = db.Column(db.Integer, nullable=False, default=0)
+    Units = db.Column(db.Integer, nullable=False, default=0)
+    Accepted = db.Column(db.Integer, nullable=False, default=0)
+    Rejected = db.Column(db.Integer, nullable=False, default=0)
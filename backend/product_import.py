@@ -0,0 +1,337 @@
+import csv
+import io
+import json
+import os
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import update, insert
+from . import db
+from . import analytics_engine, aggregates, fragments, images, inventory
+from .jobs import task, enqueue
+from .models import Product, WarehouseItem, Manufacturer
+from .search import reset_index
+
+# Bulk product import (supplier catalogs) from CSV or JSONL.
+#
+# The file is read one record at a time and written in batches of
+# IMPORT_BATCH_SIZE rows, so memory stays flat whatever the file size.
+# Products are upserted by Barcode. Each batch costs one lookup query, one
+# executemany per table and one commit. A bad row is reported with its line
+# number and skipped. If the database rejects a whole batch, that batch is
+# retried row by row so only the offending rows are lost. Image variants for
+# the batch's image names are made by a job queued with it.
+#
+#   flask products import catalog.csv
+#   POST /product/import  (file upload, employees only)
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 200
+
+# accepted column names -> model attribute
+COLUMNS = {
+    "name": "Name",
+    "price": "Price",
+    "barcode": "Barcode",
+    "quantity": "Quantity",
+    "qty": "Quantity",
+    "discount_percent": "Discount_Percent",
+    "discount": "Discount_Percent",
+    "man_id": "Man_ID",
+    "manufacturer_id": "Man_ID",
+    "image": "Image",
+}
+PRODUCT_FIELDS = ("Name", "Price", "Discount_Percent", "Man_ID", "Image")
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []    # (line, barcode, message), first MAX_REPORTED_ERRORS
+
+    def error(self, line, barcode, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, barcode, message))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.rows} rows: {self.inserted} added, {self.updated} updated, "
+                f"{self.failed} failed ({self.elapsed:.1f} s, {self.rate:.0f} rows/s)")
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rate, 1),
+            "errors": [{"line": line, "barcode": bc, "error": msg} for line, bc, msg in self.errors],
+        }
+
+
+def detect_format(filename, default="csv"):
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    return default
+
+
+# yields (line number, record dict or None, error message or None)
+def iter_records(text_stream, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(text_stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "expected a JSON object"
+                continue
+            yield line_no, record, None
+    else:
+        raise ValueError(f"unknown import format: {fmt}")
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def parse_record(record, manufacturers):
+    """Map one raw record to {attribute: value}; only filled-in columns are kept."""
+    values = {}
+    for key, raw in record.items():
+        attr = COLUMNS.get(str(key or "").strip().lower())
+        if attr is None or _blank(raw):
+            continue
+        raw = raw.strip() if isinstance(raw, str) else raw
+        try:
+            if attr == "Price":
+                value = float(raw)
+                if value < 0:
+                    raise RowError("price must not be negative")
+            elif attr in ("Quantity", "Discount_Percent", "Man_ID"):
+                value = int(float(raw))
+            else:
+                value = str(raw)
+        except (TypeError, ValueError):
+            raise RowError(f"bad {key}: {raw!r}")
+        values[attr] = value
+
+    if not values.get("Barcode"):
+        raise RowError("barcode is required")
+    if values.get("Quantity", 0) < 0:
+        raise RowError("quantity must not be negative")
+    if not 0 <= values.get("Discount_Percent", 0) <= 100:
+        raise RowError("discount_percent must be between 0 and 100")
+    if "Man_ID" in values and values["Man_ID"] not in manufacturers:
+        raise RowError(f"unknown manufacturer {values['Man_ID']}")
+    return values
+
+
+def _bulk_update(model, rows):
+    # ORM bulk UPDATE by primary key, one executemany per column set
+    groups = {}
+    for row in rows:
+        groups.setdefault(frozenset(row), []).append(row)
+    for group in groups.values():
+        db.session.execute(update(model), group)
+
+
+def _write_batch(batch):
+    """batch: {barcode: (line, values)}. Returns (inserted, updated); raises on DB errors."""
+    existing = {}
+    rows = (
+        db.session.query(Product.Product_ID, Product.Barcode, Product.Price,
+                         WarehouseItem.WI_ID, WarehouseItem.Quantity)
+        .outerjoin(WarehouseItem, WarehouseItem.Product_ID == Product.Product_ID)
+        .filter(Product.Barcode.in_(list(batch)))
+        .order_by(Product.Product_ID.asc())
+        .all()
+    )
+    for pid, barcode, price, wi_id, qty in rows:
+        existing.setdefault(barcode, (pid, price, wi_id, qty))
+
+    product_updates, stock_updates, stock_inserts, new_products, changes = [], [], [], [], []
+    for barcode, (line, values) in batch.items():
+        fields = {k: values[k] for k in PRODUCT_FIELDS if k in values}
+        if barcode in existing:
+            pid, old_price, wi_id, old_qty = existing[barcode]
+            if fields:
+                product_updates.append({"Product_ID": pid, **fields})
+            new_qty = values.get("Quantity", old_qty)
+            if "Quantity" in values:
+                if wi_id is not None:
+                    stock_updates.append({"WI_ID": wi_id, "Quantity": new_qty})
+                else:
+                    stock_inserts.append({"Product_ID": pid, "Quantity": new_qty})
+            changes.append((old_price, old_qty or 0, fields.get("Price", old_price), new_qty or 0))
+        else:
+            new_products.append({"Barcode": barcode, "Discount_Percent": 0, "Man_ID": None, "Image": None, **fields})
+            changes.append((0, 0, fields["Price"], values.get("Quantity", 0)))
+
+    if product_updates:
+        _bulk_update(Product, product_updates)
+    if stock_updates:
+        _bulk_update(WarehouseItem, stock_updates)
+
+    if new_products:
+        db.session.execute(insert(Product), new_products)
+        # ids of the rows just inserted (RETURNING is not available on MySQL)
+        new_ids = dict(
+            db.session.query(Product.Barcode, Product.Product_ID)
+            .filter(Product.Barcode.in_([p["Barcode"] for p in new_products]))
+            .all()
+        )
+        stock_inserts.extend(
+            {"Product_ID": new_ids[p["Barcode"]], "Quantity": batch[p["Barcode"]][1].get("Quantity", 0)}
+            for p in new_products
+        )
+    if stock_inserts:
+        db.session.execute(insert(WarehouseItem), stock_inserts)
+
+    aggregates.record_stock_changes(changes)
+    image_names = sorted({values["Image"] for _, values in batch.values() if values.get("Image")})
+    if image_names:
+        enqueue("import-images", {"names": image_names})
+    db.session.commit()
+    return len(new_products), len(batch) - len(new_products)
+
+
+# like images.prepare() in the product routes, but off the upload request
+@task("import-images")
+def prepare_images(names):
+    for name in names:
+        images.prepare(name)
+
+
+def _flush(batch, report):
+    if not batch:
+        return
+    try:
+        inserted, updated = _write_batch(batch)
+    except Exception as e:
+        db.session.rollback()
+        if len(batch) == 1:
+            (barcode, (line, _)), = batch.items()
+            report.error(line, barcode, f"database error: {e.__class__.__name__}: {e}".splitlines()[0])
+            return
+        # isolate the bad row(s)
+        for barcode, entry in batch.items():
+            _flush({barcode: entry}, report)
+        return
+    report.inserted += inserted
+    report.updated += updated
+
+
+def import_products(text_stream, fmt="csv", batch_size=None, progress=None):
+    """Stream records from text_stream into the catalog; returns an ImportReport."""
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    report = ImportReport()
+    manufacturers = {m for (m,) in db.session.query(Manufacturer.Man_ID).all()}
+
+    batch = {}
+    for line, record, error in iter_records(text_stream, fmt):
+        report.rows += 1
+        if error:
+            report.error(line, None, error)
+            continue
+        try:
+            values = parse_record(record, manufacturers)
+        except RowError as e:
+            report.error(line, record.get("barcode") or record.get("Barcode"), str(e))
+            continue
+
+        barcode = values["Barcode"]
+        if barcode in batch:
+            # same barcode twice in one batch: merge, later columns win
+            values = {**batch[barcode][1], **values}
+        batch[barcode] = (line, values)
+
+        if len(batch) >= batch_size:
+            _flush(_checked(batch, report), report)
+            batch = {}
+            if progress:
+                progress(report)
+
+    _flush(_checked(batch, report), report)
+    if progress:
+        progress(report)
+
+    if report.inserted or report.updated:
+        reset_index()
+        analytics_engine.invalidate("catalog")
+        fragments.bump_all()
+        inventory.reset()
+    return report
+
+
+def _checked(batch, report):
+    # new products need a name and a price; existing ones only what changes
+    if not batch:
+        return batch
+    missing = [bc for bc, (_, v) in batch.items() if "Name" not in v or "Price" not in v]
+    if not missing:
+        return batch
+    found = {
+        bc for (bc,) in db.session.query(Product.Barcode).filter(Product.Barcode.in_(missing)).all()
+    }
+    for bc in missing:
+        if bc not in found:
+            line, values = batch.pop(bc)
+            report.error(line, bc, "new product needs name and price")
+    return batch
+
+
+def text_stream(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+
+
+# ---------- CLI ----------
+
+products_cli = AppGroup("products", help="Product catalog maintenance.")
+
+
+@products_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Default: from the file extension.")
+@click.option("--batch-size", type=int, default=IMPORT_BATCH_SIZE, show_default=True)
+def import_command(path, fmt, batch_size):
+    """Upsert products (by Barcode) from a CSV or JSONL file."""
+    fmt = fmt or detect_format(path)
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        report = import_products(
+            f, fmt, batch_size,
+            progress=lambda r: click.echo(f"  {r.summary()}", err=True),
+        )
+    for line, barcode, message in report.errors:
+        click.echo(f"line {line} ({barcode or '-'}): {message}")
+    click.echo(report.summary())
+    if report.failed:
+        raise SystemExit(1)
@@ -1,9 +1,12 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify
 from flask_login import login_required
-from .models import Product, WarehouseItem, OrderItem
+from .models import Product, WarehouseItem, OrderItem, CartItem
+from .search import index_product, unindex_product
+from .product_import import import_products, detect_format, text_stream
 from sqlalchemy.exc import IntegrityError
 
 from . import db
+from . import analytics_engine, aggregates, images, fragments, inventory
 
 product_bp = Blueprint('product', __name__)
 
@@ -42,8 +45,13 @@ def add_product():
         # Create WarehouseItem (Quantity lives here)
         wi = WarehouseItem(Product_ID=new_product.Product_ID, Quantity=quantity)
         db.session.add(wi)
+        aggregates.record_stock_change(0, 0, new_product.Price, quantity)
 
         db.session.commit()
+        index_product(new_product)
+        images.prepare(new_product.Image)
+        analytics_engine.invalidate("catalog")
+        inventory.record_quantities({new_product.Product_ID: quantity})
 
         flash('Product added successfully!', 'success')
         return redirect(url_for('products'))
@@ -51,6 +59,33 @@ def add_product():
     return render_template('add_product.html')
 
 
+@product_bp.route('/product/import', methods=['GET', 'POST'])
+@login_required
+def import_products_view():
+    if session.get("user_type") != "employee":
+        flash('Access denied. Employees only.', 'error')
+        return redirect(url_for('shop'))
+
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSONL file to import.', 'error')
+            return redirect(url_for('product.import_products_view'))
+
+        fmt = request.form.get('format') or detect_format(upload.filename)
+        try:
+            report = import_products(text_stream(upload.stream), fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(f"Import failed: {e}", "error")
+            return redirect(url_for('product.import_products_view'))
+
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(report.to_dict())
+
+    return render_template('import_products.html', report=report)
+
+
 @product_bp.route('/product/update/<int:product_id>', methods=['POST'])
 @login_required
 def update_product(product_id):
@@ -59,6 +94,7 @@ def update_product(product_id):
         return redirect(url_for('shop'))
 
     product = Product.query.get_or_404(product_id)
+    old_price, old_qty = product.Price, product.stock_qty
 
     product.Name = request.form.get('name')
     product.Price = float(request.form.get('price') or 0)
@@ -80,9 +116,15 @@ def update_product(product_id):
         wi = WarehouseItem(Product_ID=product.Product_ID, Quantity=0)
         db.session.add(wi)
     wi.Quantity = qty
+    aggregates.record_stock_change(old_price, old_qty, product.Price, qty)
 
     try:
         db.session.commit()
+        index_product(product)
+        images.prepare(product.Image)
+        analytics_engine.invalidate("catalog")
+        fragments.bump([product.Product_ID])
+        inventory.record_quantities({product.Product_ID: qty})
         flash('Product updated successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -99,17 +141,26 @@ def delete_product(product_id):
         return redirect(url_for('shop'))
 
     try:
+        product = Product.query.get_or_404(product_id)
+        aggregates.record_product_deleted(product)
+
         # from OrderItem
         OrderItem.query.filter_by(Product_ID=product_id).delete(synchronize_session=False)
 
+        # and from carts
+        CartItem.query.filter_by(Product_ID=product_id).delete(synchronize_session=False)
+
         # deletee warehouse row
         WarehouseItem.query.filter_by(Product_ID=product_id).delete(synchronize_session=False)
 
         #  delete the product
-        product = Product.query.get_or_404(product_id)
         db.session.delete(product)
 
         db.session.commit()
+        unindex_product(product_id)
+        analytics_engine.invalidate("catalog", "orders")
+        fragments.bump([product_id])
+        inventory.record_quantities({product_id: None})
         flash("Product deleted successfully.", "success")
 
     except IntegrityError as e:
@@ -0,0 +1,382 @@
+import time
+from datetime import datetime, timedelta
+import click
+from flask import Blueprint, jsonify, request, session
+from flask.cli import AppGroup
+from sqlalchemy import update, insert, func, case, and_, String
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from . import db
+from .jobs import task, pending, supersede
+from .models import Orders, OrderItem, Product, SalesRollup
+
+# Hourly / daily / monthly sales buckets for trend charts.
+#
+# Sales_Rollup holds, per bucket: revenue, discount given, orders, units,
+# accepted and rejected orders, for the whole store (Dim "all"), per
+# employee and per manufacturer. Every order counts in the buckets of the
+# date it was PLACED:
+#   placed     all: orders, revenue, discount, units
+#              manufacturer: orders containing its products, their units
+#   accepted   all / manufacturer: accepted + 1
+#              employee (who accepted it): orders, revenue, discount, units, accepted
+#   rejected   all / manufacturer: rejected + 1
+# Order lines carry no price, so manufacturer rows have no revenue.
+#
+# Checkout and order accept / reject queue a "rollup-orders" job (see
+# jobs.py) in their own transaction, so the buckets move exactly once per
+# order event. `flask rollups backfill` rebuilds everything from the raw
+# tables with a few grouped queries (hour buckets in SQL, days and months
+# summed from those); `flask rollups verify` reports drift. The backfill
+# already counts orders whose job is still queued, so it retires those jobs
+# in the same transaction.
+#
+# GET /analytics/trends?grain=day&start=2024-01-01&end=2024-03-31
+#                      [&dim=employee|manufacturer&id=N]
+# answers any range from the rollups alone, with empty buckets filled in.
+
+GRAINS = ("hour", "day", "month")
+DIMS = ("all", "employee", "manufacturer")
+MEASURES = ("Revenue", "Discount", "Orders", "Units", "Accepted", "Rejected")
+MAX_BUCKETS = 5000
+
+rollups_bp = Blueprint("rollups", __name__)
+
+
+def bucket_start(grain, when):
+    if grain == "hour":
+        return when.replace(minute=0, second=0, microsecond=0)
+    if grain == "day":
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_bucket(grain, bucket):
+    if grain == "hour":
+        return bucket + timedelta(hours=1)
+    if grain == "day":
+        return bucket + timedelta(days=1)
+    return bucket.replace(year=bucket.year + bucket.month // 12, month=bucket.month % 12 + 1)
+
+
+class hour_start(FunctionElement):
+    """The start of the hour a DATETIME falls in, worked out by the database."""
+    type = String()
+    inherit_cache = True
+
+
+@compiles(hour_start)
+def _hour_start_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m-%%d %%H:00:00', %s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(hour_start, "mysql")
+def _hour_start_mysql(element, compiler, **kw):
+    # doubled %: the driver's paramstyle is "format"
+    return "DATE_FORMAT(%s, '%%%%Y-%%%%m-%%%%d %%%%H:00:00')" % compiler.process(element.clauses, **kw)
+
+
+@compiles(hour_start, "postgresql")
+def _hour_start_postgresql(element, compiler, **kw):
+    return "date_trunc('hour', %s)" % compiler.process(element.clauses, **kw)
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+# ---------- incremental updates ----------
+
+class Deltas(dict):
+    """(grain, dim, dim id, bucket) -> {measure: delta}"""
+
+    def add(self, dim, dim_id, when, **measures):
+        for grain in GRAINS:
+            row = self.setdefault((grain, dim, dim_id, bucket_start(grain, when)), {})
+            for name, value in measures.items():
+                row[name] = row.get(name, 0) + value
+
+
+def _bump(grain, dim, dim_id, bucket, deltas):
+    # UPDATE ... SET col = col + delta; insert the row the first time (like aggregates._bump)
+    key = and_(SalesRollup.Grain == grain, SalesRollup.Dim == dim,
+               SalesRollup.Dim_ID == dim_id, SalesRollup.Bucket == bucket)
+    values = {name: getattr(SalesRollup, name) + delta for name, delta in deltas.items()}
+    if db.session.execute(update(SalesRollup).where(key).values(**values)).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(SalesRollup).values(
+                Grain=grain, Dim=dim, Dim_ID=dim_id, Bucket=bucket,
+                **{name: deltas.get(name, 0) for name in MEASURES},
+            ))
+    except IntegrityError:
+        db.session.execute(update(SalesRollup).where(key).values(**values))
+
+
+def order_deltas(event, orders, lines):
+    """orders: Orders rows; lines: (order id, manufacturer id, quantity)."""
+    units, makers = {}, {}
+    for order_id, man_id, qty in lines:
+        units[order_id] = units.get(order_id, 0) + (qty or 0)
+        if man_id is not None:
+            per_maker = makers.setdefault(order_id, {})
+            per_maker[man_id] = per_maker.get(man_id, 0) + (qty or 0)
+
+    deltas = Deltas()
+    for o in orders:
+        if o.Date is None:
+            continue
+        money = {"Revenue": float(o.Price or 0), "Discount": float(o.Discount or 0)}
+        n_units = units.get(o.Order_ID, 0)
+        if event == "placed":
+            deltas.add("all", 0, o.Date, Orders=1, Units=n_units, **money)
+            for man_id, qty in makers.get(o.Order_ID, {}).items():
+                deltas.add("manufacturer", man_id, o.Date, Orders=1, Units=qty)
+        elif event == "accepted":
+            deltas.add("all", 0, o.Date, Accepted=1)
+            if o.Emp_ID is not None:
+                deltas.add("employee", o.Emp_ID, o.Date, Orders=1, Units=n_units, Accepted=1, **money)
+            for man_id in makers.get(o.Order_ID, {}):
+                deltas.add("manufacturer", man_id, o.Date, Accepted=1)
+        elif event == "rejected":
+            deltas.add("all", 0, o.Date, Rejected=1)
+            for man_id in makers.get(o.Order_ID, {}):
+                deltas.add("manufacturer", man_id, o.Date, Rejected=1)
+    return deltas
+
+
+def job(event, order_ids):
+    """(name, payload, key) for jobs.enqueue / enqueue_many, in the caller's transaction."""
+    return "rollup-orders", {"event": event, "order_ids": list(order_ids)}, f"rollup-{event}:{order_ids[0]}"
+
+
+@task("rollup-orders")
+def rollup_orders(event, order_ids):
+    query = Orders.query.filter(Orders.Order_ID.in_(order_ids))
+    if event != "placed":
+        query = query.filter(Orders.Status == event)
+    orders = query.all()
+    lines = (
+        db.session.query(OrderItem.Order_ID, Product.Man_ID, OrderItem.Quantity)
+        .join(Product, Product.Product_ID == OrderItem.Product_ID)
+        .filter(OrderItem.Order_ID.in_([o.Order_ID for o in orders]))
+        .all()
+    ) if orders else []
+    for key, deltas in order_deltas(event, orders, lines).items():
+        _bump(*key, deltas)
+
+
+# ---------- backfill / verify ----------
+
+def compute():
+    """Every rollup row from the raw tables: {(grain, dim, dim id, bucket): {measure: value}}."""
+    hour = hour_start(Orders.Date)
+    accepted = func.lower(Orders.Status) == "accepted"
+    rejected = func.lower(Orders.Status) == "rejected"
+    hours = {}
+
+    def put(dim, dim_id, bucket, **measures):
+        row = hours.setdefault((dim, dim_id, _as_datetime(bucket)), {})
+        for name, value in measures.items():
+            row[name] = row.get(name, 0) + (value or 0)
+
+    for bucket, n, revenue, discount, n_accepted, n_rejected in (
+        db.session.query(hour, func.count(Orders.Order_ID), func.sum(Orders.Price), func.sum(Orders.Discount),
+                         func.sum(case((accepted, 1), else_=0)), func.sum(case((rejected, 1), else_=0)))
+        .filter(Orders.Date.isnot(None))
+        .group_by(hour)
+    ):
+        put("all", 0, bucket, Orders=n, Revenue=revenue, Discount=discount, Accepted=n_accepted, Rejected=n_rejected)
+    for bucket, units in (
+        db.session.query(hour, func.sum(OrderItem.Quantity))
+        .join(OrderItem, OrderItem.Order_ID == Orders.Order_ID)
+        .filter(Orders.Date.isnot(None))
+        .group_by(hour)
+    ):
+        put("all", 0, bucket, Units=units)
+
+    for emp_id, bucket, n, revenue, discount in (
+        db.session.query(Orders.Emp_ID, hour, func.count(Orders.Order_ID), func.sum(Orders.Price),
+                         func.sum(Orders.Discount))
+        .filter(Orders.Date.isnot(None), accepted, Orders.Emp_ID.isnot(None))
+        .group_by(Orders.Emp_ID, hour)
+    ):
+        put("employee", emp_id, bucket, Orders=n, Accepted=n, Revenue=revenue, Discount=discount)
+    for emp_id, bucket, units in (
+        db.session.query(Orders.Emp_ID, hour, func.sum(OrderItem.Quantity))
+        .join(OrderItem, OrderItem.Order_ID == Orders.Order_ID)
+        .filter(Orders.Date.isnot(None), accepted, Orders.Emp_ID.isnot(None))
+        .group_by(Orders.Emp_ID, hour)
+    ):
+        put("employee", emp_id, bucket, Units=units)
+
+    for man_id, bucket, n, units, n_accepted, n_rejected in (
+        db.session.query(Product.Man_ID, hour, func.count(func.distinct(Orders.Order_ID)),
+                         func.sum(OrderItem.Quantity),
+                         func.count(func.distinct(case((accepted, Orders.Order_ID)))),
+                         func.count(func.distinct(case((rejected, Orders.Order_ID)))))
+        .join(OrderItem, OrderItem.Order_ID == Orders.Order_ID)
+        .join(Product, Product.Product_ID == OrderItem.Product_ID)
+        .filter(Orders.Date.isnot(None), Product.Man_ID.isnot(None))
+        .group_by(Product.Man_ID, hour)
+    ):
+        put("manufacturer", man_id, bucket, Orders=n, Units=units, Accepted=n_accepted, Rejected=n_rejected)
+
+    # days and months are sums of hours
+    rows = {}
+    for (dim, dim_id, bucket), measures in hours.items():
+        for grain in GRAINS:
+            row = rows.setdefault((grain, dim, dim_id, bucket_start(grain, bucket)), dict.fromkeys(MEASURES, 0))
+            for name, value in measures.items():
+                row[name] += value
+    return rows
+
+
+def backfill(batch=5000):
+    # compute() counts orders whose rollup-orders job is still queued
+    supersede(("rollup-orders",), "superseded by rollup backfill")
+    rows = compute()
+    SalesRollup.query.delete(synchronize_session=False)
+    values = [
+        {"Grain": grain, "Dim": dim, "Dim_ID": dim_id, "Bucket": bucket, **measures}
+        for (grain, dim, dim_id, bucket), measures in rows.items()
+    ]
+    for i in range(0, len(values), batch):
+        db.session.execute(insert(SalesRollup.__table__), values[i:i + batch])
+    db.session.commit()
+    return len(values)
+
+
+def verify():
+    """Drift lines between Sales_Rollup and the raw tables, or None while
+    rollup-orders jobs are still queued."""
+    if pending(("rollup-orders",)):
+        return None
+    expected = compute()
+    stored = {
+        (r.Grain, r.Dim, r.Dim_ID, r.Bucket): {name: getattr(r, name) for name in MEASURES}
+        for r in SalesRollup.query.all()
+    }
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        have, want = stored.get(key, {}), expected.get(key, {})
+        for name in MEASURES:
+            if abs(float(have.get(name, 0)) - float(want.get(name, 0))) > 0.01:
+                drift.append(f"{key[0]} {key[1]} {key[2]} {key[3]} {name}: "
+                             f"stored={have.get(name, 0)} expected={want.get(name, 0)}")
+    return drift
+
+
+# ---------- reads ----------
+
+def _parse_bound(value, end=False):
+    when = datetime.fromisoformat(value)
+    if end and len(value) <= 10:
+        when += timedelta(days=1)      # a plain end date includes that whole day
+    return when
+
+
+def trend(grain, start, end, dim="all", dim_id=0):
+    """Buckets of [start, end) at grain, zeros where nothing sold."""
+    first = bucket_start(grain, start)
+    found = {
+        bucket: values for bucket, *values in db.session.query(
+            SalesRollup.Bucket, *(getattr(SalesRollup, name) for name in MEASURES)
+        ).filter(
+            SalesRollup.Grain == grain, SalesRollup.Dim == dim, SalesRollup.Dim_ID == dim_id,
+            SalesRollup.Bucket >= first, SalesRollup.Bucket < end,
+        )
+    }
+    empty = [0] * len(MEASURES)
+    buckets, totals = [], dict.fromkeys(MEASURES, 0)
+    bucket = first
+    while bucket < end:
+        values = dict(zip(MEASURES, found.get(bucket, empty)))
+        for name in MEASURES:
+            totals[name] += values[name]
+        buckets.append({"bucket": bucket.isoformat(), **_as_json(values)})
+        bucket = next_bucket(grain, bucket)
+    return buckets, _as_json(totals)
+
+
+def _as_json(values):
+    decided = values["Accepted"] + values["Rejected"]
+    return {
+        "revenue": round(values["Revenue"], 2),
+        "discount": round(values["Discount"], 2),
+        "orders": values["Orders"],
+        "units": values["Units"],
+        "accepted": values["Accepted"],
+        "rejected": values["Rejected"],
+        "accept_ratio": round(values["Accepted"] / decided, 4) if decided else None,
+    }
+
+
+# GET /analytics/trends; employees only
+@rollups_bp.route("/analytics/trends")
+def trends():
+    if session.get("user_type") != "employee":
+        return jsonify({"error": "employees only"}), 403
+
+    grain = request.args.get("grain", "day")
+    dim = request.args.get("dim", "all")
+    dim_id = request.args.get("id", type=int) if dim != "all" else 0
+    if grain not in GRAINS or dim not in DIMS:
+        return jsonify({"error": f"grain must be one of {', '.join(GRAINS)}, dim one of {', '.join(DIMS)}"}), 400
+    if dim_id is None:
+        return jsonify({"error": f"id required for dim={dim}"}), 400
+    try:
+        start = _parse_bound(request.args["start"])
+        end = _parse_bound(request.args["end"], end=True)
+    except (KeyError, ValueError):
+        return jsonify({"error": "start and end required, as YYYY-MM-DD or ISO datetimes"}), 400
+
+    count, bucket = 0, bucket_start(grain, start)
+    while bucket < end:
+        count += 1
+        if count > MAX_BUCKETS:
+            return jsonify({"error": f"more than {MAX_BUCKETS} {grain} buckets; use a coarser grain"}), 400
+        bucket = next_bucket(grain, bucket)
+
+    started = time.perf_counter()
+    buckets, totals = trend(grain, start, end, dim, dim_id)
+    return jsonify({
+        "grain": grain, "dim": dim, "id": dim_id,
+        "start": start.isoformat(), "end": end.isoformat(),
+        "buckets": buckets, "totals": totals,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+
+
+def init_app(app):
+    app.register_blueprint(rollups_bp)
+    app.cli.add_command(rollups_cli)
+
+
+# ---------- CLI ----------
+
+rollups_cli = AppGroup("rollups", help="Time-bucketed sales rollups.")
+
+
+@rollups_cli.command("backfill")
+def backfill_command():
+    """Rebuild every rollup bucket from the order history."""
+    started = time.perf_counter()
+    n = backfill()
+    click.echo(f"{n} rollup rows written in {time.perf_counter() - started:.2f} s.")
+
+
+@rollups_cli.command("verify")
+def verify_command():
+    """Report drift between the rollups and the raw orders."""
+    drift = verify()
+    if drift is None:
+        click.echo("rollup-orders jobs still queued; run them (flask jobs work --once) and verify again.")
+        raise SystemExit(2)
+    for line in drift:
+        click.echo(line)
+    click.echo(f"{len(drift)} drifted value(s).")
+    if drift:
+        raise SystemExit(1)
@@ -0,0 +1,264 @@
+import re
+import threading
+import time
+from flask import current_app
+from . import db
+from .models import Product, Manufacturer
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# ranking weights
+BARCODE_SCORE = 100
+EXACT_TOKEN_SCORE = 10
+PREFIX_TOKEN_SCORE = 6
+INFIX_TOKEN_SCORE = 3
+NAME_PREFIX_BONUS = 5
+SUBSTRING_BONUS = 3
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def trigrams(text):
+    text = (text or "").lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ProductSearchIndex:
+    """In-process inverted index over Product.Name, Barcode and manufacturer name.
+
+    token -> product ids, trigram -> tokens (infix matches inside words, so
+    "hick" finds "chicken") and barcode -> product ids. Every hit of the old
+    Name.ilike('%q%') is still a hit here: each word of q is part of some
+    token of the name.
+
+    Name, Price and discounted price are kept per product as well, so the
+    catalog can sort and page a search result without sending every matching
+    id to the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.docs = {}              # pid -> (name_lower, barcode, tokens)
+        self.tokens = {}            # token -> {pid}
+        self.grams = {}             # trigram -> {token}
+        self.barcodes = {}          # barcode -> {pid}
+        self.manufacturers = {}     # Man_ID -> name
+        self.sort_keys = {}         # pid -> (casefolded name, price, discounted price)
+        self.built_at = 0.0
+
+    # ---------- building ----------
+
+    def build(self):
+        rows = (
+            db.session.query(
+                Product.Product_ID, Product.Name, Product.Barcode, Product.Man_ID,
+                Product.Price, Product.Discount_Percent,
+            )
+            .all()
+        )
+        manufacturers = dict(db.session.query(Manufacturer.Man_ID, Manufacturer.Name).all())
+
+        with self.lock:
+            self._reset()
+            self.manufacturers = manufacturers
+            for pid, name, barcode, man_id, price, discount in rows:
+                self._add(pid, name, barcode, man_id, price, discount)
+            self.built_at = time.time()
+        return self
+
+    def _add(self, pid, name, barcode, man_id, price=None, discount=None):
+        name_lower = (name or "").lower()
+        barcode = (barcode or "").strip()
+        words = frozenset(tokenize(name)) | frozenset(tokenize(self.manufacturers.get(man_id)))
+
+        self.docs[pid] = (name_lower, barcode, words)
+        for tok in words:
+            postings = self.tokens.get(tok)
+            if postings is None:
+                postings = self.tokens[tok] = set()
+                for gram in trigrams(tok):
+                    self.grams.setdefault(gram, set()).add(tok)
+            postings.add(pid)
+        if barcode:
+            self.barcodes.setdefault(barcode, set()).add(pid)
+        # same arithmetic as catalog.SORT_KEYS["discounted_price"]; names
+        # compare case-insensitively, like MySQL's default collation
+        discounted = None if price is None else price * (100 - (discount or 0)) / 100.0
+        self.sort_keys[pid] = (None if name is None else name.casefold(), price, discounted)
+
+    def _remove(self, pid):
+        self.sort_keys.pop(pid, None)
+        doc = self.docs.pop(pid, None)
+        if doc is None:
+            return
+        name_lower, barcode, words = doc
+        for tok in words:
+            postings = self.tokens.get(tok)
+            if postings is None:
+                continue
+            postings.discard(pid)
+            if not postings:
+                del self.tokens[tok]
+                for gram in trigrams(tok):
+                    toks = self.grams.get(gram)
+                    if toks is not None:
+                        toks.discard(tok)
+                        if not toks:
+                            del self.grams[gram]
+        if barcode:
+            postings = self.barcodes.get(barcode)
+            if postings is not None:
+                postings.discard(pid)
+                if not postings:
+                    del self.barcodes[barcode]
+
+    # ---------- incremental updates (product routes) ----------
+
+    def upsert(self, pid, name, barcode, man_id, man_name=None, price=None, discount=None):
+        with self.lock:
+            if man_id is not None and man_name is not None:
+                self.manufacturers[man_id] = man_name
+            self._remove(pid)
+            self._add(pid, name, barcode, man_id, price, discount)
+
+    def remove(self, pid):
+        with self.lock:
+            self._remove(pid)
+
+    # ---------- querying ----------
+
+    def _matching_tokens(self, word):
+        # tokens containing word; trigram postings narrow it down for words of
+        # 3+ chars, shorter words scan the vocabulary (not the products)
+        grams = trigrams(word)
+        if not grams:
+            return [tok for tok in self.tokens if word in tok]
+        postings = sorted((self.grams.get(g, ()) for g in grams), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p
+            if not candidates:
+                break
+        return [tok for tok in candidates if word in tok]
+
+    SORT_COLUMNS = {"name": 0, "price": 1, "discounted_price": 2}
+
+    def sort_values(self, pids, sort):
+        """{pid: value of the catalog sort key "name", "price" or "discounted_price"}."""
+        col = self.SORT_COLUMNS[sort]
+        with self.lock:
+            return {pid: self.sort_keys[pid][col] for pid in pids if pid in self.sort_keys}
+
+    def barcode_lookup(self, barcode):
+        with self.lock:
+            return sorted(self.barcodes.get((barcode or "").strip(), ()))
+
+    def search(self, q, limit=None):
+        """Return product ids for q, best match first."""
+        q = (q or "").strip()
+        if not q:
+            return []
+        q_lower = q.lower()
+
+        with self.lock:
+            scores = {}
+
+            # every word of q must match a token: exactly, as a prefix
+            # (typeahead) or inside it. Set unions/intersections keep the
+            # per-product work down to the final scoring pass.
+            levels = []
+            candidates = None
+            for word in tokenize(q):
+                exact, prefix, infix = set(), set(), set()
+                for tok in self._matching_tokens(word):
+                    if tok == word:
+                        exact |= self.tokens[tok]
+                    elif tok.startswith(word):
+                        prefix |= self.tokens[tok]
+                    else:
+                        infix |= self.tokens[tok]
+                levels.append((exact, prefix))
+                found = exact | prefix | infix
+                candidates = found if candidates is None else candidates & found
+                if not candidates:
+                    break
+
+            for pid in candidates or ():
+                score = 0
+                for exact, prefix in levels:
+                    if pid in exact:
+                        score += EXACT_TOKEN_SCORE
+                    elif pid in prefix:
+                        score += PREFIX_TOKEN_SCORE
+                    else:
+                        score += INFIX_TOKEN_SCORE
+                scores[pid] = score
+
+            # exact barcode
+            for pid in self.barcodes.get(q, ()):
+                scores[pid] = scores.get(pid, 0) + BARCODE_SCORE
+
+            for pid in scores:
+                name_lower = self.docs[pid][0]
+                if name_lower.startswith(q_lower):
+                    scores[pid] += NAME_PREFIX_BONUS
+                elif q_lower in name_lower:
+                    scores[pid] += SUBSTRING_BONUS
+
+            ranked = sorted(scores, key=lambda pid: (-scores[pid], len(self.docs[pid][0]), pid))
+
+        return ranked[:limit] if limit else ranked
+
+
+# ---------- app-wide index ----------
+
+_build_lock = threading.Lock()
+
+
+def get_index():
+    # built lazily on first search; rebuilt after SEARCH_INDEX_TTL seconds so
+    # other worker processes pick up changes made elsewhere
+    ttl = current_app.config.get("SEARCH_INDEX_TTL", 300)
+    index = current_app.extensions.get("product_search")
+    if index is not None and (not ttl or time.time() - index.built_at < ttl):
+        return index
+
+    with _build_lock:
+        index = current_app.extensions.get("product_search")
+        if index is None or (ttl and time.time() - index.built_at >= ttl):
+            index = ProductSearchIndex().build()
+            current_app.extensions["product_search"] = index
+    return index
+
+
+def search_products(q, limit=None):
+    return get_index().search(q, limit)
+
+
+# after bulk changes: drop the index, the next search rebuilds it
+def reset_index():
+    current_app.extensions.pop("product_search", None)
+
+
+def index_product(product):
+    index = current_app.extensions.get("product_search")
+    if index is None:
+        return
+    man_name = product.manufacturer.Name if product.Man_ID and product.manufacturer else None
+    index.upsert(
+        product.Product_ID, product.Name, product.Barcode, product.Man_ID, man_name,
+        product.Price, product.Discount_Percent,
+    )
+
+
+def unindex_product(product_id):
+    index = current_app.extensions.get("product_search")
+    if index is not None:
+        index.remove(product_id)
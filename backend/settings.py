@@ -0,0 +1,61 @@
+from sqlalchemy.engine import make_url
+
+# Configuration from the environment (production runs).
+#
+# Every ROSEMARY_<KEY> variable sets app.config[KEY]; values that parse as
+# JSON become numbers / booleans / lists (Flask's from_prefixed_env):
+#
+#   ROSEMARY_SECRET_KEY=...
+#   ROSEMARY_DATABASE_URL=mysql+pymysql://user:pw@db/rosemary_store
+#   ROSEMARY_JOBS_WORKER_THREADS=2
+#
+# The DB_* keys below are shortcuts for SQLAlchemy's engine options. Each
+# web process has its own pool: DB_POOL_SIZE should cover the threads
+# serving requests plus the job worker threads and the analytics threads
+# (ANALYTICS_WORKERS), and workers x (pool size + overflow) must stay under
+# the server's max_connections.
+
+DB_ENGINE_OPTIONS = {
+    "DB_POOL_SIZE": "pool_size",
+    "DB_MAX_OVERFLOW": "max_overflow",
+    "DB_POOL_TIMEOUT": "pool_timeout",        # seconds to wait for a free connection
+    "DB_POOL_RECYCLE": "pool_recycle",        # seconds; below MySQL's wait_timeout
+    "DB_POOL_PRE_PING": "pool_pre_ping",
+}
+
+# servers that drop idle connections: check them out healthy
+SERVER_DEFAULTS = {"pool_pre_ping": True, "pool_recycle": 1800}
+
+
+def _statement_timeout_args(url, ms):
+    # per-connection statement time limit (MySQL: SELECTs only); SQLite has none
+    backend = url.get_backend_name()
+    if backend == "mysql":
+        return {"init_command": f"SET SESSION max_execution_time={int(ms)}"}
+    if backend == "postgresql":
+        return {"options": f"-c statement_timeout={int(ms)}"}
+    return {}
+
+
+def load(config):
+    config.from_prefixed_env("ROSEMARY")
+    if config.get("DATABASE_URL"):
+        config["SQLALCHEMY_DATABASE_URI"] = config["DATABASE_URL"]
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS with the DB_* settings applied."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    options = dict(SERVER_DEFAULTS) if url.get_backend_name() != "sqlite" else {}
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    for key, option in DB_ENGINE_OPTIONS.items():
+        if config.get(key) is not None:
+            options[option] = config[key]
+
+    timeout = config.get("DB_STATEMENT_TIMEOUT_MS")
+    if timeout:
+        options["connect_args"] = {
+            **options.get("connect_args", {}),
+            **_statement_timeout_args(url, timeout),
+        }
+    return options
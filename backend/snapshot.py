@@ -0,0 +1,367 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import select, func
+from . import db
+from .exports import date_range
+from .models import Orders, OrderItem, Customer, Employee
+
+try:
+    import numpy as np
+except ImportError:     # optional: without numpy analytics stays on SQL
+    np = None
+
+log = logging.getLogger(__name__)
+
+# Columnar in-memory snapshot of the order history for /analytics.
+#
+# With ANALYTICS_SNAPSHOT on (and NumPy installed) each process keeps
+# Orders (with the units of its Order_Item lines folded in), Customer and
+# Employee as NumPy columns, strings dictionary-encoded (an int32 code per
+# row into a list of distinct values). The order lookups and per-customer /
+# per-employee totals behind dashboard queries 4-6, 10, 14, 15, 17, 18 and
+# 20 are then boolean masks, bincounts and argsorts over those columns
+# instead of a query with joins per filter value.
+#
+# Refreshes are incremental, on the next read once the snapshot is older
+# than ANALYTICS_SNAPSHOT_REFRESH_SECONDS or analytics_engine.invalidate()
+# dropped "orders":
+#   - orders above the Order_ID watermark are appended. The last
+#     OVERLAP_IDS ids are re-read so an order that committed after a higher
+#     id is not skipped;
+#   - orders still pending in the snapshot get their Status / Emp_ID
+#     re-read if the database no longer lists them as pending;
+#   - new customers are appended the same way; employees are re-read.
+# Every ANALYTICS_SNAPSHOT_RELOAD_SECONDS it is rebuilt from scratch, which
+# also picks up edits the watermark cannot see (renamed customers, order
+# lines removed with their product).
+#
+# A refresh builds a new Snapshot and swaps it in; readers keep the one
+# they started with.
+
+ANALYTICS_SNAPSHOT = False
+ANALYTICS_SNAPSHOT_REFRESH_SECONDS = 10
+ANALYTICS_SNAPSHOT_RELOAD_SECONDS = 3600
+OVERLAP_IDS = 1000
+CHUNK_ROWS = 50_000
+IN_BATCH = 500
+
+OrderRow = namedtuple("OrderRow", "Order_ID Date Price Discount Status total_quantity")
+RangeRow = namedtuple("RangeRow", "Order_ID Date Price Status customer_name")
+CustomerTotals = namedtuple(
+    "CustomerTotals",
+    "Cust_ID Name Email total_orders total_spent accepted_orders min_accepted_discount",
+)
+TopEmployee = namedtuple("TopEmployee", "Name Email total_sold")
+
+ORDER_COLUMNS = ("order_id", "cust", "emp", "date", "price", "discount", "status", "quantity")
+CUSTOMER_COLUMNS = ("cust_id", "name", "email")
+
+
+class Dictionary:
+    """Dictionary encoding of a string column; values only ever get appended."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, strings):
+        out = np.empty(len(strings), dtype=np.int32)
+        for i, s in enumerate(strings):
+            code = self.codes.get(s)
+            if code is None:
+                code = self.codes[s] = len(self.values)
+                self.values.append(s)
+            out[i] = code
+        return out
+
+    def matching(self, predicate):
+        return np.array([c for c, v in enumerate(self.values) if predicate(v)], dtype=np.int32)
+
+
+def _ids(values):
+    return np.array([-1 if v is None else v for v in values], dtype=np.int64)
+
+
+def _floats(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _none(x):
+    # NaN (a NULL when loaded) back to None for the templates
+    return None if x != x else x
+
+
+def _positions(sorted_ids, values):
+    """Index of each value in sorted_ids, -1 where it is missing."""
+    if not len(sorted_ids):
+        return np.full(len(values), -1)
+    pos = np.searchsorted(sorted_ids, values)
+    pos[pos >= len(sorted_ids)] = 0
+    return np.where(sorted_ids[pos] == values, pos, -1)
+
+
+def _concat(old, new, names):
+    return {name: np.concatenate([old[name], new[name]]) for name in names}
+
+
+# ---------- loading ----------
+
+def _load_orders(after_id, statuses):
+    result = db.session.execute(
+        select(
+            Orders.Order_ID, Orders.Cust_ID, Orders.Emp_ID, Orders.Date,
+            Orders.Price, Orders.Discount, Orders.Status,
+            func.coalesce(func.sum(OrderItem.Quantity), 0),
+        )
+        .outerjoin(OrderItem, OrderItem.Order_ID == Orders.Order_ID)
+        .where(Orders.Order_ID > after_id)
+        .group_by(Orders.Order_ID, Orders.Cust_ID, Orders.Emp_ID, Orders.Date,
+                  Orders.Price, Orders.Discount, Orders.Status)
+        .order_by(Orders.Order_ID)
+        .execution_options(yield_per=CHUNK_ROWS)
+    )
+    parts = []
+    for rows in result.partitions():
+        ids, cust, emp, dates, price, discount, status, quantity = zip(*rows)
+        parts.append({
+            "order_id": np.array(ids, dtype=np.int64),
+            "cust": _ids(cust),
+            "emp": _ids(emp),
+            "date": np.array(dates, dtype="datetime64[s]"),
+            "price": _floats(price),
+            "discount": _floats(discount),
+            "status": statuses.encode(status),
+            "quantity": np.array(quantity, dtype=np.int64),
+        })
+    if not parts:
+        return {
+            "order_id": np.empty(0, np.int64), "cust": np.empty(0, np.int64), "emp": np.empty(0, np.int64),
+            "date": np.empty(0, "datetime64[s]"), "price": np.empty(0), "discount": np.empty(0),
+            "status": np.empty(0, np.int32), "quantity": np.empty(0, np.int64),
+        }
+    return {name: np.concatenate([part[name] for part in parts]) for name in ORDER_COLUMNS}
+
+
+def _load_customers(after_id, names, emails):
+    rows = db.session.execute(
+        select(Customer.Cust_ID, Customer.Name, Customer.Email)
+        .where(Customer.Cust_ID > after_id)
+        .order_by(Customer.Cust_ID)
+    ).all()
+    ids, name, email = zip(*rows) if rows else ((), (), ())
+    return {
+        "cust_id": np.array(ids, dtype=np.int64),
+        "name": names.encode(name),
+        "email": emails.encode(email),
+    }
+
+
+def _load_employees():
+    rows = db.session.execute(select(Employee.Emp_ID, Employee.Name, Employee.Email).order_by(Employee.Emp_ID)).all()
+    return np.array([r[0] for r in rows], dtype=np.int64), [r[1] for r in rows], [r[2] for r in rows]
+
+
+def _fresh(new, existing_ids, key):
+    # rows of new whose id is not in the snapshot yet (the re-read overlap)
+    keep = ~np.isin(new[key], existing_ids)
+    return {name: column[keep] for name, column in new.items()}
+
+
+class Snapshot:
+    def __init__(self, orders, customers, employees, dictionaries):
+        self.orders = orders                # ORDER_COLUMNS -> array, one row per order
+        self.customers = customers          # CUSTOMER_COLUMNS -> array, sorted by cust_id
+        self.emp_ids, self.emp_names, self.emp_emails = employees
+        self.statuses, self.names, self.emails = dictionaries
+        self.watermark = int(orders["order_id"].max()) if len(orders["order_id"]) else 0
+        self.cust_watermark = int(customers["cust_id"].max()) if len(customers["cust_id"]) else 0
+        self.loaded_at = self.refreshed_at = time.monotonic()
+        self.stale = False
+        self._derive()
+
+    @classmethod
+    def load(cls):
+        dictionaries = Dictionary(), Dictionary(), Dictionary()
+        statuses, names, emails = dictionaries
+        return cls(_load_orders(0, statuses), _load_customers(0, names, emails), _load_employees(), dictionaries)
+
+    def refreshed(self):
+        """A new Snapshot with what changed since this one was loaded."""
+        o = self.orders
+        new = _fresh(_load_orders(max(self.watermark - OVERLAP_IDS, 0), self.statuses),
+                     o["order_id"][o["order_id"] > self.watermark - OVERLAP_IDS], "order_id")
+        orders = dict(o, status=o["status"].copy(), emp=o["emp"].copy())
+        self._recheck_pending(orders)
+        orders = _concat(orders, new, ORDER_COLUMNS)
+
+        c = self.customers
+        added = _fresh(_load_customers(max(self.cust_watermark - OVERLAP_IDS, 0), self.names, self.emails),
+                       c["cust_id"][c["cust_id"] > self.cust_watermark - OVERLAP_IDS], "cust_id")
+        customers = _concat(c, added, CUSTOMER_COLUMNS)
+        order = np.argsort(customers["cust_id"], kind="stable")
+        customers = {name: column[order] for name, column in customers.items()}
+
+        snap = Snapshot(orders, customers, _load_employees(), (self.statuses, self.names, self.emails))
+        snap.loaded_at = self.loaded_at
+        return snap
+
+    def _recheck_pending(self, orders):
+        pending_codes = self.statuses.matching(lambda v: v == "pending")
+        rows = np.flatnonzero(np.isin(orders["status"], pending_codes))
+        if not len(rows):
+            return
+        still = db.session.execute(
+            select(Orders.Order_ID).where(Orders.Status == "pending", Orders.Order_ID <= self.watermark)
+        ).scalars().all()
+        rows = rows[~np.isin(orders["order_id"][rows], np.array(still, dtype=np.int64))]
+        if not len(rows):
+            return
+        changed = orders["order_id"][rows].tolist()
+        current = {}
+        for i in range(0, len(changed), IN_BATCH):
+            current.update(
+                (oid, (status, emp)) for oid, status, emp in db.session.execute(
+                    select(Orders.Order_ID, Orders.Status, Orders.Emp_ID)
+                    .where(Orders.Order_ID.in_(changed[i:i + IN_BATCH]))
+                )
+            )
+        for row, oid in zip(rows.tolist(), changed):
+            if oid in current:      # gone: dropped at the next reload
+                status, emp = current[oid]
+                orders["status"][row] = self.statuses.encode([status])[0]
+                orders["emp"][row] = -1 if emp is None else emp
+
+    # ---------- helpers ----------
+
+    def _derive(self):
+        # per-order columns every question needs, worked out once per snapshot
+        o = self.orders
+        self.cust_row = _positions(self.customers["cust_id"], o["cust"])
+        self.emp_row = _positions(self.emp_ids, o["emp"])
+        accepted = self.statuses.matching(lambda v: (v or "").lower() == "accepted")
+        self.accepted = np.isin(o["status"], accepted)
+
+    def _order_rows(self, rows):
+        o, statuses = self.orders, self.statuses.values
+        return [
+            OrderRow(oid, date, _none(price), _none(discount), statuses[status], qty)
+            for oid, date, price, discount, status, qty in zip(
+                o["order_id"][rows].tolist(), o["date"][rows].tolist(), o["price"][rows].tolist(),
+                o["discount"][rows].tolist(), o["status"][rows].tolist(), o["quantity"][rows].tolist(),
+            )
+        ]
+
+    def nbytes(self):
+        return sum(c.nbytes for c in self.orders.values()) + sum(c.nbytes for c in self.customers.values())
+
+    # ---------- dashboard questions ----------
+
+    # 4 / 5: a customer's or an employee's orders, newest first
+    def orders_for(self, column, key):
+        o = self.orders
+        rows = np.flatnonzero(o[column] == key)
+        return self._order_rows(rows[np.argsort(-o["order_id"][rows], kind="stable")])
+
+    # 6, 10, 14, 15, 20: per-customer totals (what Customer_Sales holds)
+    def customer_totals(self):
+        o, c = self.orders, self.customers
+        n = len(c["cust_id"])
+        known = self.cust_row >= 0
+        idx = self.cust_row[known]
+        count = np.bincount(idx, minlength=n)
+        spent = np.bincount(idx, weights=np.nan_to_num(o["price"][known]), minlength=n)
+
+        accepted = self.accepted[known]
+        accepted_count = np.bincount(idx[accepted], minlength=n)
+        discount = o["discount"][known]
+        has_discount = accepted & ~np.isnan(discount)
+        min_discount = np.full(n, np.inf)
+        np.minimum.at(min_discount, idx[has_discount], discount[has_discount])
+        min_discount[np.isinf(min_discount)] = np.nan
+
+        rows = np.flatnonzero(count)
+        names, emails = self.names.values, self.emails.values
+        return [
+            CustomerTotals(cust_id, names[name], emails[email], n_orders, total, n_accepted, _none(lowest))
+            for cust_id, name, email, n_orders, total, n_accepted, lowest in zip(
+                c["cust_id"][rows].tolist(), c["name"][rows].tolist(), c["email"][rows].tolist(),
+                count[rows].tolist(), spent[rows].tolist(), accepted_count[rows].tolist(),
+                min_discount[rows].tolist(),
+            )
+        ]
+
+    # 17: orders of known customers in [start day, end day], newest first
+    def orders_in_range(self, start_date, end_date, limit):
+        bounds = date_range(start_date, end_date)
+        if bounds is None:
+            return [], 0
+        start, end = (np.datetime64(b, "s") for b in bounds)
+        o = self.orders
+        rows = np.flatnonzero((o["date"] >= start) & (o["date"] < end) & (self.cust_row >= 0))
+        total = len(rows)
+        rows = rows[np.lexsort((o["order_id"][rows], o["date"][rows]))[::-1][:limit]]
+        names, statuses = self.names.values, self.statuses.values
+        return [
+            RangeRow(oid, date, _none(price), statuses[status], names[name])
+            for oid, date, price, status, name in zip(
+                o["order_id"][rows].tolist(), o["date"][rows].tolist(), o["price"][rows].tolist(),
+                o["status"][rows].tolist(), self.customers["name"][self.cust_row[rows]].tolist(),
+            )
+        ], total
+
+    # 18: employee with the most units on accepted orders
+    def top_selling_employee(self):
+        if not len(self.emp_ids):
+            return None
+        mask = self.accepted & (self.emp_row >= 0)
+        units = np.bincount(self.emp_row[mask], weights=self.orders["quantity"][mask], minlength=len(self.emp_ids))
+        best = int(np.argmax(units))
+        if units[best] <= 0:
+            return None
+        return TopEmployee(self.emp_names[best], self.emp_emails[best], int(units[best]))
+
+
+# ---------- per-process instance ----------
+
+_lock = threading.Lock()
+
+
+def enabled():
+    return np is not None and current_app.config.get("ANALYTICS_SNAPSHOT", ANALYTICS_SNAPSHOT)
+
+
+def current():
+    """The process's snapshot, refreshed if due; None when switched off."""
+    if not enabled():
+        return None
+    config = current_app.config
+    snap = current_app.extensions.get("analytics_snapshot")
+    now = time.monotonic()
+    reload_after = config.get("ANALYTICS_SNAPSHOT_RELOAD_SECONDS", ANALYTICS_SNAPSHOT_RELOAD_SECONDS)
+    refresh_after = config.get("ANALYTICS_SNAPSHOT_REFRESH_SECONDS", ANALYTICS_SNAPSHOT_REFRESH_SECONDS)
+
+    if snap is None or now - snap.loaded_at > reload_after:
+        with _lock:
+            snap = current_app.extensions.get("analytics_snapshot")
+            if snap is None or now - snap.loaded_at > reload_after:
+                started = time.perf_counter()
+                snap = current_app.extensions["analytics_snapshot"] = Snapshot.load()
+                log.info("Analytics snapshot loaded: %d orders, %.1f MiB in %.2f s",
+                         len(snap.orders["order_id"]), snap.nbytes() / 2**20, time.perf_counter() - started)
+    elif snap.stale or now - snap.refreshed_at > refresh_after:
+        # one thread refreshes; the others carry on with the current snapshot
+        if _lock.acquire(blocking=False):
+            try:
+                snap = current_app.extensions["analytics_snapshot"] = snap.refreshed()
+            finally:
+                _lock.release()
+    return snap
+
+
+def mark_stale():
+    snap = current_app.extensions.get("analytics_snapshot")
+    if snap is not None:
+        snap.stale = True
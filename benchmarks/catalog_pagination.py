@@ -0,0 +1,60 @@
+# Keyset vs OFFSET: time to fetch the first and a deep page of /shop.
+#
+#   python -m benchmarks.catalog_pagination [n_products]
+import sys
+import time
+from sqlalchemy import insert
+from backend import db
+from backend.models import Product, WarehouseItem
+from backend.catalog import paginate_catalog, catalog_query
+from .common import make_app
+
+PAGE = 24
+
+
+def seed(n):
+    db.session.execute(insert(Product), [
+        {"Product_ID": i, "Name": f"Product {i:07d}", "Price": 1.0 + (i * 7919) % 500 / 10,
+         "Discount_Percent": i % 4 * 5, "Barcode": str(1000000 + i)}
+        for i in range(1, n + 1)
+    ])
+    db.session.execute(insert(WarehouseItem), [
+        {"Product_ID": i, "Quantity": (i * 31) % 200} for i in range(1, n + 1)
+    ])
+    db.session.commit()
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    app = make_app()
+    with app.app_context():
+        seed(n)
+        deep = n // PAGE - 1
+
+        for sort in ("id", "name", "price"):
+            # walk to the deep page once to get its cursor
+            page = paginate_catalog(sort=sort, limit=PAGE * 100)
+            for _ in range(deep // 100 - 1):
+                page = paginate_catalog(sort=sort, cursor=page.next_cursor, limit=PAGE * 100)
+            cursor = page.next_cursor
+
+            first = timed(lambda: paginate_catalog(sort=sort, limit=PAGE))
+            keyset = timed(lambda: paginate_catalog(sort=sort, cursor=cursor, limit=PAGE))
+
+            order = {"id": Product.Product_ID, "name": Product.Name, "price": Product.Price}[sort]
+            offset = timed(lambda: catalog_query().order_by(order, Product.Product_ID)
+                           .offset(deep * PAGE).limit(PAGE).all())
+
+            print(f"sort={sort:<6} page 1: {first:6.2f} ms | deep keyset: {keyset:6.2f} ms"
+                  f" | deep OFFSET: {offset:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
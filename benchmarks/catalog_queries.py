@@ -0,0 +1,42 @@
+# Shows that /shop and /products cost a constant number of queries
+# no matter how many products are in the catalog.
+#
+#   python -m benchmarks.catalog_queries
+from backend import db
+from backend.models import Product, WarehouseItem, Customer, Employee
+from backend.instrumentation import count_queries
+from .common import make_app, login_client, reset_db
+
+
+def seed(app, n_products):
+    with app.app_context():
+        db.session.add(Customer(Cust_ID=1, Name="Bench Customer", Email="c@bench", Password="x"))
+        db.session.add(Employee(Emp_ID=1, Name="Bench Employee", Email="e@rosemary.emp", Password="x"))
+        for i in range(1, n_products + 1):
+            db.session.add(Product(Product_ID=i, Name=f"Product {i}", Price=1.0 + i % 50,
+                                   Barcode=str(100000 + i), Discount_Percent=i % 3 * 5))
+            db.session.add(WarehouseItem(Product_ID=i, Quantity=i % 40))
+        db.session.commit()
+
+
+def main():
+    app = make_app()
+    results = {}
+    for n in (10, 2000):
+        reset_db(app)
+        seed(app, n)
+        customer = login_client(app, 1, "customer")
+        employee = login_client(app, 1, "employee")
+        with app.app_context():
+            with count_queries() as shop:
+                assert customer.get("/shop").status_code == 200
+            with count_queries() as products:
+                assert employee.get("/products").status_code == 200
+        results[n] = (shop.count, products.count)
+        print(f"{n:>5} products: /shop={shop.count} queries, /products={products.count} queries")
+
+    assert results[10] == results[2000], "query count grows with catalog size"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Concurrent checkout load test: many threads buy the same few products
+# through the real /cart/add + /checkout routes. Passes when nothing is
+# oversold: units sold + units left == initial stock, and no stock < 0.
+#
+#   python -m benchmarks.checkout_oversell [threads] [attempts_per_thread] [db_url]
+#
+# db_url defaults to a temporary SQLite file; pass a MySQL URL
+# (mysql+pymysql://user:pw@host/db) to run against a real server.
+import random
+import sys
+import threading
+import time
+from sqlalchemy import func
+from backend import db
+from backend.models import Product, WarehouseItem, Customer, OrderItem, Orders
+from .common import make_app, login_client, fill_cart, cart_lines
+
+PRODUCTS = {1: 40, 2: 25, 3: 10}
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    config = {"SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 30}}}
+    if len(sys.argv) > 3:
+        config = {"SQLALCHEMY_DATABASE_URI": sys.argv[3]}
+    app = make_app(**config)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for i in range(1, threads + 1):
+            db.session.add(Customer(Cust_ID=i, Name=f"Customer {i}", Email=f"c{i}@bench", Password="x"))
+        for pid, qty in PRODUCTS.items():
+            db.session.add(Product(Product_ID=pid, Name=f"Hot item {pid}", Price=10.0 * pid))
+            db.session.add(WarehouseItem(Product_ID=pid, Quantity=qty))
+        db.session.commit()
+
+    results = {"placed": 0, "refused": 0, "errors": 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(threads)
+
+    def shopper(cust_id):
+        client = login_client(app, cust_id, "customer")
+        rnd = random.Random(cust_id)
+        start_gate.wait()
+        for _ in range(attempts):
+            try:
+                # put lines straight into the cart; the add route would
+                # refuse most of them once stock runs low
+                cart_id = fill_cart(app, client, {pid: rnd.randint(1, 3) for pid in rnd.sample(list(PRODUCTS), 2)})
+                r = client.post("/checkout")
+                placed = not cart_lines(app, cart_id)
+                if r.status_code >= 500:
+                    key = "errors"
+                else:
+                    key = "placed" if placed else "refused"
+            except Exception:
+                key = "errors"
+            with lock:
+                results[key] += 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=shopper, args=(i,)) for i in range(1, threads + 1)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        sold = dict(
+            db.session.query(OrderItem.Product_ID, func.sum(OrderItem.Quantity))
+            .group_by(OrderItem.Product_ID).all()
+        )
+        left = dict(db.session.query(WarehouseItem.Product_ID, WarehouseItem.Quantity).all())
+        orders = db.session.query(func.count(Orders.Order_ID)).scalar()
+
+    total = threads * attempts
+    print(f"{total} checkouts in {elapsed:.2f}s ({total / elapsed:.0f}/s): {results}, {orders} orders stored")
+    ok = True
+    for pid, initial in PRODUCTS.items():
+        s, l = int(sold.get(pid) or 0), left[pid]
+        status = "ok" if s + l == initial and l >= 0 else "OVERSOLD"
+        ok = ok and status == "ok"
+        print(f"product {pid}: initial={initial} sold={s} left={l} -> {status}")
+    assert ok, "overselling detected"
+    assert orders == results["placed"], "half-built orders left behind"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import secrets
+import tempfile
+from backend import create_app, db, cart_store
+
+
+# Build the real app against a throwaway SQLite file instead of MySQL
+def make_app(db_path=None, **config):
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(suffix=".db", prefix="rosemary-bench-")
+        os.close(fd)
+    overrides = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "TESTING": True,
+        "IMAGE_CACHE_DIR": tempfile.mkdtemp(prefix="rosemary-images-"),
+        # no worker threads competing with the timed requests;
+        # jobs.run_pending() runs the queue when a benchmark needs it
+        "JOBS_WORKER_THREADS": 0,
+    }
+    overrides.update(config)
+    return create_app(overrides)
+
+
+# Log a test client in without going through the login form
+def login_client(app, user_id, user_type):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+        sess["user_type"] = user_type
+    return client
+
+
+def reset_db(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    # in-process caches describe the old data
+    for name in ("identity_cache", "analytics_cache", "product_search", "fragments", "stock_index"):
+        app.extensions.pop(name, None)
+
+
+# Give a logged-in client a server-side cart holding lines ({product_id: qty})
+def fill_cart(app, client, lines):
+    cart_id = secrets.token_hex(16)
+    with app.app_context():
+        store = cart_store._store()
+        for pid, qty in lines.items():
+            store.add(cart_id, None, pid, qty)
+    with client.session_transaction() as sess:
+        sess["cart_id"] = cart_id
+    return cart_id
+
+
+def cart_lines(app, cart_id):
+    with app.app_context():
+        return cart_store._store().lines(cart_id)
@@ -0,0 +1,65 @@
+# Diff two benchmarks.run result files.
+#
+#   python -m benchmarks.compare base.json new.json [--threshold 0.20]
+#
+# Exits 1 when a scenario's p95 got slower by more than the threshold
+# (relative) or it issues more queries per request than before.
+import argparse
+import json
+import sys
+
+FIELDS = ("p50_ms", "p95_ms", "p99_ms", "queries_per_request", "peak_memory_kib")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base, new, threshold):
+    rows, regressions = [], []
+    for name in sorted(set(base["scenarios"]) | set(new["scenarios"])):
+        old, cur = base["scenarios"].get(name), new["scenarios"].get(name)
+        if old is None or cur is None:
+            rows.append((name, "only in " + ("new" if old is None else "base"), "", "", ""))
+            continue
+        for field in FIELDS:
+            a, b = old[field], cur[field]
+            change = (b - a) / a if a else 0.0
+            rows.append((name, field, a, b, change))
+
+        if old["p95_ms"] and (cur["p95_ms"] - old["p95_ms"]) / old["p95_ms"] > threshold:
+            regressions.append(f"{name}: p95 {old['p95_ms']} -> {cur['p95_ms']} ms")
+        if cur["queries_per_request"] > old["queries_per_request"]:
+            regressions.append(
+                f"{name}: queries/request {old['queries_per_request']} -> {cur['queries_per_request']}"
+            )
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed relative p95 slowdown")
+    args = parser.parse_args(argv)
+
+    base, new = load(args.base), load(args.new)
+    print(f"base {base['meta'].get('revision')}  ->  new {new['meta'].get('revision')}\n")
+    rows, regressions = compare(base, new, args.threshold)
+    for name, field, a, b, change in rows:
+        if field.startswith("only in"):
+            print(f"{name:<16} {field}")
+        else:
+            print(f"{name:<16} {field:<20} {a:>10} {b:>10} {change:>+8.1%}")
+
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# Synthetic Rosemary store with realistic skew: a few big manufacturers,
+# a long tail of rarely bought products, a handful of heavy customers and
+# busy employees, most orders accepted and the newest ones still pending.
+#
+#   python -m benchmarks.datagen [scale] [db_path]
+#
+# Everything is derived from the seed, so the same scale + seed always
+# produces the same database.
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import insert
+from backend import db, aggregates
+from backend.models import (
+    Manufacturer, Product, WarehouseItem, Customer, Employee, Orders, OrderItem,
+)
+
+SCALES = {
+    "tiny":   dict(manufacturers=5,   products=200,     customers=50,     employees=3,   orders=500),
+    "small":  dict(manufacturers=20,  products=5_000,   customers=1_000,  employees=10,  orders=10_000),
+    "medium": dict(manufacturers=80,  products=50_000,  customers=10_000, employees=40,  orders=100_000),
+    "large":  dict(manufacturers=200, products=200_000, customers=50_000, employees=100, orders=500_000),
+}
+
+BATCH = 5000
+START = datetime(2023, 1, 1)
+DAYS = 2 * 365
+
+ADJECTIVES = ["Fresh", "Organic", "Classic", "Spicy", "Sweet", "Frozen", "Smoked", "Golden",
+              "Crispy", "Light", "Premium", "Family", "Mini", "Wild", "Roasted", "Natural"]
+FOODS = ["Rice", "Flour", "Pasta", "Olive Oil", "Sunflower Oil", "Tomato Sauce", "Chicken Breast",
+         "Fries", "Tuna", "Eggs", "Milk", "Cheese", "Yogurt", "Bread", "Coffee", "Tea", "Honey",
+         "Lentils", "Chickpeas", "Hummus", "Tahini", "Dates", "Almonds", "Cereal", "Juice",
+         "Chocolate", "Biscuits", "Salmon", "Beef", "Lamb", "Spinach", "Cucumbers", "Apples"]
+SIZES = ["250g", "500g", "1kg", "2kg", "5kg", "1L", "2L", "6pcs", "12pcs", "Pack"]
+FIRST = ["Lina", "Omar", "Sara", "Yousef", "Maya", "Adam", "Noor", "Khaled", "Rana", "Sami",
+         "Dana", "Tariq", "Hala", "Ziad", "Leen", "Fadi"]
+LAST = ["Haddad", "Khoury", "Nasser", "Saleh", "Aziz", "Mansour", "Barakat", "Hamdan"]
+
+
+def zipf_weights(n, s=1.1):
+    return list(accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def _insert(model, rows):
+    for i in range(0, len(rows), BATCH):
+        db.session.execute(insert(model), rows[i:i + BATCH])
+
+
+def generate(scale="small", seed=42, echo=print):
+    """Fill the (empty) app database; returns the row counts."""
+    sizes = SCALES[scale] if isinstance(scale, str) else dict(scale)
+    rnd = random.Random(seed)
+    started = time.perf_counter()
+
+    n_man = sizes["manufacturers"]
+    _insert(Manufacturer, [
+        {"Man_ID": m, "Name": f"{rnd.choice(LAST)} {rnd.choice(['Foods', 'Farms', 'Dairy', 'Imports'])} {m}",
+         "Address": f"{rnd.randint(1, 300)} Industrial Zone", "Email": f"sales{m}@man{m}.example"}
+        for m in range(1, n_man + 1)
+    ])
+
+    # manufacturer size follows a Zipf curve: a few own most of the catalog
+    n_prod = sizes["products"]
+    man_cum = zipf_weights(n_man)
+    products, stock = [], []
+    for pid in range(1, n_prod + 1):
+        price = round(rnd.lognormvariate(1.6, 0.7), 2)
+        products.append({
+            "Product_ID": pid,
+            "Man_ID": rnd.choices(range(1, n_man + 1), cum_weights=man_cum)[0],
+            "Name": f"{rnd.choice(ADJECTIVES)} {rnd.choice(FOODS)} {rnd.choice(SIZES)} #{pid}",
+            "Price": max(price, 0.5),
+            "Barcode": str(200000000 + pid),
+            "Discount_Percent": rnd.choices([0, 5, 10, 15, 25], weights=[70, 10, 10, 6, 4])[0],
+        })
+        # ~5% of products never made it into the warehouse, ~10% are nearly out
+        if rnd.random() >= 0.05:
+            qty = rnd.randint(0, 9) if rnd.random() < 0.10 else rnd.randint(10, 500)
+            stock.append({"Product_ID": pid, "Quantity": qty})
+    _insert(Product, products)
+    _insert(WarehouseItem, stock)
+    echo(f"  {n_prod} products, {len(stock)} warehouse rows")
+
+    n_cust = sizes["customers"]
+    _insert(Customer, [
+        {"Cust_ID": c, "Name": f"{rnd.choice(FIRST)} {rnd.choice(LAST)}",
+         "Email": f"customer{c}@mail.example", "Phone_Num": f"05{rnd.randint(10000000, 99999999)}",
+         "Password": "bench"}
+        for c in range(1, n_cust + 1)
+    ])
+    n_emp = sizes["employees"]
+    _insert(Employee, [
+        {"Emp_ID": e, "Name": f"{rnd.choice(FIRST)} {rnd.choice(LAST)}",
+         "Email": f"employee{e}@rosemary.emp", "Phone_Num": f"05{rnd.randint(10000000, 99999999)}",
+         "Address": f"Branch {e % 7 + 1}", "Password": "bench"}
+        for e in range(1, n_emp + 1)
+    ])
+
+    # popular products / heavy customers / busy employees: Zipf again
+    prod_cum = zipf_weights(n_prod, 1.05)
+    cust_cum = zipf_weights(n_cust, 0.9)
+    emp_cum = zipf_weights(n_emp, 0.8)
+    by_id = {p["Product_ID"]: p for p in products}
+
+    n_orders = sizes["orders"]
+    pending_from = int(n_orders * 0.97)
+    orders, items = [], []
+    for oid in range(1, n_orders + 1):
+        when = START + timedelta(seconds=int(DAYS * 86400 * oid / n_orders) + rnd.randint(0, 3600))
+        if oid > pending_from:
+            status, emp = "pending", None
+        else:
+            status = rnd.choices(["accepted", "rejected"], weights=[88, 12])[0]
+            emp = rnd.choices(range(1, n_emp + 1), cum_weights=emp_cum)[0] if status == "accepted" else None
+
+        lines = {}
+        for pid in rnd.choices(range(1, n_prod + 1), cum_weights=prod_cum, k=rnd.randint(1, 6)):
+            lines[pid] = lines.get(pid, 0) + rnd.randint(1, 3)
+        before = discount = 0.0
+        for pid, qty in lines.items():
+            p = by_id[pid]
+            before += p["Price"] * qty
+            discount += round(p["Price"] * p["Discount_Percent"] / 100, 2) * qty
+            items.append({"Order_ID": oid, "Product_ID": pid, "Quantity": qty})
+
+        orders.append({
+            "Order_ID": oid,
+            "Cust_ID": rnd.choices(range(1, n_cust + 1), cum_weights=cust_cum)[0],
+            "Emp_ID": emp,
+            "Date": when.replace(microsecond=0),
+            "Price": round(before - discount, 2),
+            "Discount": round(discount, 2),
+            "Status": status,
+        })
+        if len(orders) >= BATCH:
+            _insert(Orders, orders)
+            _insert(OrderItem, items)
+            orders, items = [], []
+    _insert(Orders, orders)
+    _insert(OrderItem, items)
+    db.session.commit()
+    echo(f"  {n_orders} orders")
+
+    aggregates.rebuild()
+    echo(f"  generated in {time.perf_counter() - started:.1f} s")
+    return {"scale": scale, "seed": seed, **sizes}
+
+
+def main():
+    from .common import make_app
+    scale = sys.argv[1] if len(sys.argv) > 1 else "small"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else None
+    app = make_app(db_path)
+    with app.app_context():
+        print(f"Generating {scale} dataset into {db.engine.url.database}")
+        generate(scale)
+
+
+if __name__ == "__main__":
+    main()
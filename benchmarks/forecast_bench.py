@@ -0,0 +1,140 @@
+# Demand forecast (backend/forecast.py) at order-history scale.
+#
+#   python -m benchmarks.forecast_bench [--lines 10000000] [--products 20000]
+#                                       [--db-lines 1000000]
+#
+# 1. the NumPy kernel on --lines synthetic order lines (one entry per line,
+#    no database), next to a plain-Python per-line loop on the first 1M;
+# 2. `flask forecast refresh` end to end on SQLite with --db-lines order
+#    lines spread over the history window: streamed load, compute, store.
+import argparse
+import random
+import time
+from datetime import datetime, date, timedelta
+from sqlalchemy import insert
+from backend import db, forecast
+from backend.models import Product, WarehouseItem, Orders, OrderItem, ProductForecast
+from .common import make_app
+
+import numpy as np
+
+DAYS = forecast.FORECAST_HISTORY_DAYS
+LEAD, COVER = 7, 30
+
+
+def synthetic_lines(n, products, seed=7):
+    rng = np.random.default_rng(seed)
+    # skewed popularity, like real catalogs
+    pids = (rng.zipf(1.3, n) % products + 1).astype(np.int64)
+    days = rng.integers(0, DAYS, n, dtype=np.int64)
+    units = rng.integers(1, 6, n, dtype=np.int64)
+    return pids, days, units
+
+
+def python_forecast(product_ids, stock, pids, days, units, alpha=forecast.FORECAST_ALPHA):
+    demand = {}
+    for pid, day, qty in zip(pids.tolist(), days.tolist(), units.tolist()):
+        row = demand.get(pid)
+        if row is None:
+            row = demand[pid] = [0.0] * DAYS
+        row[day] += qty
+    daily = {}
+    for pid, row in demand.items():
+        level = row[0]
+        for x in row[1:]:
+            level = alpha * x + (1 - alpha) * level
+        daily[pid] = level
+    return daily
+
+
+def bench_kernel(n, products):
+    product_ids = np.arange(1, products + 1, dtype=np.int64)
+    stock = np.random.default_rng(1).integers(0, 200, products)
+    started = time.perf_counter()
+    pids, days, units = synthetic_lines(n, products)
+    gen_s = time.perf_counter() - started
+    print(f"kernel: {n:,} order lines x {products:,} products x {DAYS} days (generated in {gen_s:.2f} s)")
+
+    forecast.compute(product_ids, stock, pids[:1000], days[:1000], units[:1000], DAYS, forecast.FORECAST_ALPHA, LEAD, COVER)
+    best = None
+    for _ in range(3):
+        started = time.perf_counter()
+        result = forecast.compute(product_ids, stock, pids, days, units, DAYS, forecast.FORECAST_ALPHA, LEAD, COVER)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  numpy          {best:8.3f} s   {n / best / 1e6:7.1f} M lines/s   "
+          f"{int((result['reorder'] > 0).sum())} to reorder")
+
+    sample = min(n, 1_000_000)
+    started = time.perf_counter()
+    daily = python_forecast(product_ids, stock, pids[:sample], days[:sample], units[:sample])
+    elapsed = time.perf_counter() - started
+    print(f"  python loop    {elapsed:8.3f} s   {sample / elapsed / 1e6:7.1f} M lines/s   (first {sample:,} lines)")
+
+    # same answer on the sample
+    check = forecast.compute(product_ids, stock, pids[:sample], days[:sample], units[:sample], DAYS, forecast.FORECAST_ALPHA, LEAD, COVER)
+    worst = max(abs(check["daily"][pid - 1] - v) for pid, v in daily.items())
+    print(f"  max difference vs python: {worst:.2e}")
+
+
+def seed_history(n_lines, products, lines_per_order=5):
+    rnd = random.Random(3)
+    weights = np.random.default_rng(3).zipf(1.3, 200_000) % products + 1
+    end = datetime.combine(date.today(), datetime.min.time())
+    start = end - timedelta(days=DAYS)
+    window = DAYS * 24 * 3600
+
+    db.session.execute(insert(Product), [
+        {"Product_ID": i, "Name": f"Product {i}", "Price": round(rnd.uniform(1, 50), 2)}
+        for i in range(1, products + 1)
+    ])
+    db.session.execute(insert(WarehouseItem), [
+        {"Product_ID": i, "Quantity": rnd.randint(0, 300)} for i in range(1, products + 1)
+    ])
+    n_orders = n_lines // lines_per_order
+    orders, items = [], []
+    for order_id in range(1, n_orders + 1):
+        when = start + timedelta(seconds=rnd.randrange(window))
+        orders.append({"Order_ID": order_id, "Date": when, "Price": 0, "Discount": 0,
+                       "Status": rnd.choice(("accepted", "accepted", "pending", "rejected"))})
+        for pid in {int(weights[rnd.randrange(len(weights))]) for _ in range(lines_per_order)}:
+            items.append({"Order_ID": order_id, "Product_ID": pid, "Quantity": rnd.randint(1, 5)})
+        if len(items) >= 100_000:
+            db.session.execute(insert(Orders), orders)
+            db.session.execute(insert(OrderItem), items)
+            orders, items = [], []
+    if orders:
+        db.session.execute(insert(Orders), orders)
+        db.session.execute(insert(OrderItem), items)
+    db.session.commit()
+    return db.session.query(OrderItem).count()
+
+
+def bench_refresh(n_lines, products):
+    app = make_app()
+    with app.app_context():
+        started = time.perf_counter()
+        lines = seed_history(n_lines, products)
+        print(f"\nrefresh on SQLite: {lines:,} order lines, {products:,} products "
+              f"(seeded in {time.perf_counter() - started:.1f} s)")
+        stats = forecast.refresh()
+        print(f"  load    {stats['load_s']:8.3f} s   ({stats['rows']:,} product-days streamed)")
+        print(f"  compute {stats['compute_s']:8.3f} s")
+        print(f"  store   {stats['persist_s']:8.3f} s   ({db.session.query(ProductForecast).count():,} rows)")
+        print(f"  {stats['reorder']} products to reorder")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rosemary demand forecast benchmark")
+    parser.add_argument("--lines", type=int, default=10_000_000, help="order lines for the kernel")
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--db-lines", type=int, default=1_000_000, help="order lines in SQLite (0 to skip)")
+    args = parser.parse_args(argv)
+
+    bench_kernel(args.lines, args.products)
+    if args.db_lines:
+        bench_refresh(args.db_lines, args.products)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# HTTP load test of the production profile (gunicorn.conf.py): serves a
+# generated store with 1, 2, 4 ... gunicorn workers and drives it with
+# concurrent keep-alive clients, reporting throughput and latency per
+# worker count.
+#
+#   python -m benchmarks.load_test [--workers 1 2 4] [--threads 4] [--clients 16]
+#                                  [--seconds 10] [--scale small] [--db-url URL]
+#
+# The store goes into a temporary SQLite file unless --db-url points at a
+# local MySQL (it is regenerated there). SQLite allows one writer at a time,
+# so the mix is read-only: shop pages, search and the catalog JSON.
+import argparse
+import http.client
+import importlib.util
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from flask.sessions import SecureCookieSessionInterface
+from . import datagen
+from .common import make_app
+from .run import percentile, SEARCH_TERMS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "load-test-secret"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def session_cookie(app, cust_id):
+    # a logged-in customer session, signed the way the server will check it
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    return serializer.dumps({"_user_id": str(cust_id), "_fresh": True, "user_type": "customer"})
+
+
+# 50% shop page, 30% search, 20% catalog JSON
+def pick_path(rnd):
+    r = rnd.random()
+    if r < 0.5:
+        return "/shop"
+    if r < 0.8:
+        return f"/shop?q={rnd.choice(SEARCH_TERMS).replace(' ', '+')}"
+    return f"/api/products?limit=24&sort=price&dir={rnd.choice(['asc', 'desc'])}"
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def drive(port, cookies, clients, seconds, seed):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def client(i):
+        rnd = random.Random(seed + i)
+        headers = {"Cookie": f"session={rnd.choice(cookies)}"}
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine, failed = [], 0
+        while time.perf_counter() < stop:
+            path = pick_path(rnd)
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            mine.append((time.perf_counter() - started) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def serve(db_url, workers, threads, port, log):
+    env = dict(
+        os.environ,
+        ROSEMARY_DATABASE_URL=db_url,
+        ROSEMARY_SECRET_KEY=SECRET,
+        ROSEMARY_WEB_WORKERS=str(workers),
+        ROSEMARY_WEB_THREADS=str(threads),
+        ROSEMARY_BIND=f"127.0.0.1:{port}",
+        ROSEMARY_ACCESS_LOG="",
+        ROSEMARY_INSTRUMENTATION_ENABLED="false",
+        ROSEMARY_JOBS_WORKER_THREADS="0",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rosemary HTTP load test (gunicorn)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent HTTP clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--scale", default="small", choices=sorted(datagen.SCALES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-url", help="default: a temporary SQLite file")
+    args = parser.parse_args(argv)
+
+    if importlib.util.find_spec("gunicorn") is None:
+        sys.exit("gunicorn is not installed (pip install gunicorn)")
+
+    if args.db_url:
+        db_url = args.db_url
+    else:
+        fd, path = tempfile.mkstemp(suffix=".db", prefix="rosemary-load-")
+        os.close(fd)
+        db_url = f"sqlite:///{path}"
+    app = make_app(SQLALCHEMY_DATABASE_URI=db_url, SECRET_KEY=SECRET)
+    with app.app_context():
+        print(f"Generating {args.scale} dataset (seed {args.seed}) in {db_url}")
+        sizes = datagen.generate(args.scale, args.seed)
+        cookies = [session_cookie(app, i) for i in range(1, min(sizes["customers"], 50) + 1)]
+
+    print(f"\n{args.clients} clients, {args.threads} threads/worker, {args.seconds:g} s per run, {os.cpu_count()} CPU(s)")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'scaling':>9}")
+    base = None
+    for workers in args.workers:
+        port = free_port()
+        log = tempfile.TemporaryFile()
+        server = serve(db_url, workers, args.threads, port, log)
+        try:
+            if not wait_ready(port):
+                server.kill()
+                log.seek(0)
+                sys.exit("server did not start:\n" + log.read().decode(errors="replace")[-2000:])
+            drive(port, cookies, args.clients, min(2.0, args.seconds), args.seed)    # warm up every worker
+            latencies, errors = drive(port, cookies, args.clients, args.seconds, args.seed)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+            log.close()
+
+        rate = len(latencies) / args.seconds
+        base = base or rate
+        print(f"{workers:>8}{rate:>10.1f}{percentile(latencies, 50):>9.1f}{percentile(latencies, 95):>9.1f}"
+              f"{percentile(latencies, 99):>9.1f}{errors:>8}{rate / base:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
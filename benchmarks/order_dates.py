@@ -0,0 +1,100 @@
+# Orders.Date as VARCHAR (no index) vs the migrated, indexed DATETIME:
+# query plans and timings of the order lookups used by /analytics and
+# /employee/orders, before and after `flask schema upgrade`.
+#
+#   python -m benchmarks.order_dates [n_orders]
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text, table, column, select, insert, DateTime, String, Integer
+from backend import db, migrations
+from .common import make_app
+
+QUERIES = {
+    "16 most recent order": lambda o, day: (
+        select(o.c.Order_ID).order_by(o.c.Date.desc()).limit(1)
+    ),
+    "17 orders in range": lambda o, day: (
+        select(o.c.Order_ID, o.c.Date)
+        .where(o.c.Date >= day(2024, 3, 1), o.c.Date < day(2024, 3, 8))
+        .order_by(o.c.Date.desc())
+    ),
+    "pending queue page": lambda o, day: (
+        select(o.c.Order_ID).where(o.c.Status == "pending").order_by(o.c.Order_ID.desc()).limit(26)
+    ),
+    "customer orders by date": lambda o, day: (
+        select(o.c.Order_ID).where(o.c.Cust_ID == 7).order_by(o.c.Date.desc())
+    ),
+    "employee accepted orders": lambda o, day: (
+        select(o.c.Order_ID).where(o.c.Emp_ID == 3, o.c.Status == "accepted")
+    ),
+}
+
+
+def orders_table(date_type):
+    return table(
+        "Orders",
+        column("Order_ID", Integer), column("Cust_ID", Integer), column("Emp_ID", Integer),
+        column("Date", date_type), column("Status", String),
+    )
+
+
+# the pre-migration shape: Date VARCHAR(50), none of the Orders indexes
+def make_legacy():
+    for ix in ("ix_Orders_Date", "ix_orders_status_id", "ix_orders_cust_date", "ix_orders_emp_status"):
+        db.session.execute(text(f'DROP INDEX IF EXISTS "{ix}"'))
+    db.session.execute(text('ALTER TABLE "Orders" DROP COLUMN "Date"'))
+    db.session.execute(text('ALTER TABLE "Orders" ADD COLUMN "Date" VARCHAR(50)'))
+    db.session.commit()
+
+
+def seed(n):
+    rnd = random.Random(10)
+    start = datetime(2023, 1, 1)
+    rows = []
+    for i in range(1, n + 1):
+        status = rnd.choice(("accepted", "accepted", "rejected", "pending"))
+        when = start + timedelta(minutes=rnd.randrange(2 * 365 * 24 * 60))
+        rows.append({
+            "Order_ID": i, "Cust_ID": rnd.randint(1, 500),
+            "Emp_ID": rnd.randint(1, 20) if status == "accepted" else None,
+            "Date": when.strftime("%Y-%m-%d %H:%M:%S"), "Status": status,
+        })
+    db.session.execute(insert(orders_table(String)), rows)
+    db.session.commit()
+
+
+def report(label, o, day):
+    print(f"\n== {label}")
+    for name, build in QUERIES.items():
+        stmt = build(o, day)
+        sql = str(stmt.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        plan = db.session.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+        started = time.perf_counter()
+        for _ in range(20):
+            db.session.execute(stmt).all()
+        ms = (time.perf_counter() - started) / 20 * 1000
+        print(f"  {name:<26} {ms:8.2f} ms")
+        for row in plan:
+            print(f"      {row[-1]}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    app = make_app()
+    with app.app_context():
+        make_legacy()
+        seed(n)
+        report(f"VARCHAR Date, no indexes ({n} orders)", orders_table(String),
+               lambda *ymd: datetime(*ymd).strftime("%Y-%m-%d"))
+
+        started = time.perf_counter()
+        migrations.upgrade(echo=lambda msg: None)
+        print(f"\nmigration: {time.perf_counter() - started:.1f} s")
+
+        report("DATETIME Date + indexes", orders_table(DateTime), lambda *ymd: datetime(*ymd))
+
+
+if __name__ == "__main__":
+    main()
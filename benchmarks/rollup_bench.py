@@ -0,0 +1,64 @@
+# Sales trends from Sales_Rollup (backend/rollups.py) vs grouping the raw
+# Orders table, on a generated store.
+#
+#   python -m benchmarks.rollup_bench [--scale medium]
+#
+# Times the backfill once, then each trend query both ways: the rollup
+# read behind /analytics/trends and the equivalent GROUP BY over Orders.
+import argparse
+import time
+from datetime import datetime
+from sqlalchemy import func
+from backend import db, rollups
+from backend.models import Orders
+from . import datagen
+from .common import make_app
+
+RANGES = [
+    ("month", datetime(2023, 1, 1), datetime(2025, 1, 1)),
+    ("day", datetime(2024, 1, 1), datetime(2025, 1, 1)),
+    ("day", datetime(2024, 3, 1), datetime(2024, 3, 8)),
+    ("hour", datetime(2024, 3, 1), datetime(2024, 3, 8)),
+]
+FORMATS = {"month": "%Y-%m-01", "day": "%Y-%m-%d", "hour": "%Y-%m-%d %H:00:00"}
+
+
+def raw_trend(grain, start, end):
+    bucket = func.strftime(FORMATS[grain], Orders.Date)
+    return (
+        db.session.query(bucket, func.count(Orders.Order_ID), func.sum(Orders.Price), func.sum(Orders.Discount))
+        .filter(Orders.Date >= start, Orders.Date < end)
+        .group_by(bucket)
+        .all()
+    )
+
+
+def timed(fn, repeat=10):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rosemary sales rollup benchmark")
+    parser.add_argument("--scale", default="medium", choices=sorted(datagen.SCALES))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    with app.app_context():
+        sizes = datagen.generate(args.scale, args.seed, echo=lambda *a: None)
+        started = time.perf_counter()
+        rows = rollups.backfill()
+        print(f"{sizes['orders']:,} orders: backfill {rows:,} rollup rows in {time.perf_counter() - started:.2f} s\n")
+
+        print(f"{'grain':<6} {'range':<24} {'buckets':>8} {'raw ms':>9} {'rollup ms':>10}")
+        for grain, start, end in RANGES:
+            raw_ms, _ = timed(lambda: raw_trend(grain, start, end))
+            rollup_ms, (buckets, _) = timed(lambda: rollups.trend(grain, start, end))
+            print(f"{grain:<6} {start:%Y-%m-%d} .. {end:%Y-%m-%d}{len(buckets):>10} {raw_ms:>9.2f} {rollup_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
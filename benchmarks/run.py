@@ -0,0 +1,183 @@
+# Benchmark suite: generates a synthetic store (benchmarks.datagen) and drives
+# the real routes through the Flask test client.
+#
+#   python -m benchmarks.run [--scale small] [--requests 200] [--out results.json]
+#   python -m benchmarks.compare old.json new.json
+#
+# Per scenario it reports p50/p95/p99 latency, queries per request and the
+# peak Python memory allocated while serving it (tracemalloc, measured in a
+# separate pass so it does not skew the timings). Results are written as
+# JSON so two commits can be compared automatically.
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from backend import db
+from backend.models import WarehouseItem
+from backend.instrumentation import count_queries
+from . import datagen
+from .common import make_app, login_client, fill_cart
+
+SEARCH_TERMS = ["rice", "oil", "fresh", "chick", "organic cof", "milk 1l", "tahini", "200000042"]
+
+
+def percentile(values, pct):
+    # nearest rank
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class Suite:
+    def __init__(self, app, sizes, seed):
+        self.app = app
+        self.sizes = sizes
+        self.rnd = random.Random(seed)
+        with app.app_context():
+            # products with plenty of stock, so checkout keeps succeeding
+            self.in_stock = [
+                pid for (pid,) in db.session.query(WarehouseItem.Product_ID)
+                .filter(WarehouseItem.Quantity >= 100).all()
+            ]
+
+    def customer(self):
+        # low ids are the heavy customers in datagen's Zipf curve
+        cust_id = min(self.rnd.randint(1, self.sizes["customers"]), self.rnd.randint(1, 50))
+        return login_client(self.app, cust_id, "customer")
+
+    def employee(self):
+        return login_client(self.app, self.rnd.randint(1, self.sizes["employees"]), "employee")
+
+    def with_cart(self, client, lines):
+        fill_cart(self.app, client, {pid: self.rnd.randint(1, 2) for pid in self.rnd.sample(self.in_stock, lines)})
+        return client
+
+    # ---------- scenarios: return (client, method, url) ----------
+
+    def shop(self):
+        return self.customer(), "get", "/shop"
+
+    def shop_search(self):
+        return self.customer(), "get", f"/shop?q={self.rnd.choice(SEARCH_TERMS)}"
+
+    def cart(self):
+        return self.with_cart(self.customer(), 10), "get", "/cart"
+
+    def checkout(self):
+        return self.with_cart(self.customer(), 3), "post", "/checkout"
+
+    def employee_orders(self):
+        return self.employee(), "get", "/employee/orders"
+
+    def analytics(self):
+        cust = self.rnd.randint(1, self.sizes["customers"])
+        month = self.rnd.randint(1, 12)
+        url = (f"/analytics?customer_id={cust}&start_date=2024-{month:02d}-01"
+               f"&end_date=2024-{month:02d}-14&inline=1")
+        return self.employee(), "get", url
+
+    SCENARIOS = ("shop", "shop_search", "cart", "checkout", "employee_orders", "analytics")
+
+    def run(self, name, requests, warmup, memory_samples):
+        scenario = getattr(self, name)
+        with self.app.app_context():
+            engine = db.engine
+
+        def call():
+            client, method, url = scenario()
+            with count_queries(engine) as counter:
+                started = time.perf_counter()
+                response = getattr(client, method)(url)
+                elapsed = time.perf_counter() - started
+            return elapsed, counter.count, response.status_code
+
+        for _ in range(warmup):
+            call()
+
+        timings, queries, statuses = [], [], {}
+        for _ in range(requests):
+            elapsed, count, status = call()
+            timings.append(elapsed * 1000)
+            queries.append(count)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        for _ in range(memory_samples):
+            call()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "requests": requests,
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(sum(timings) / len(timings), 3),
+            "queries_per_request": round(sum(queries) / len(queries), 2),
+            "max_queries": max(queries),
+            "peak_memory_kib": round(peak / 1024, 1),
+            "status": statuses,
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rosemary route benchmarks")
+    parser.add_argument("--scale", default="small", choices=sorted(datagen.SCALES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--memory-samples", type=int, default=10)
+    parser.add_argument("--only", nargs="*", choices=Suite.SCENARIOS, help="run a subset of scenarios")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    with app.app_context():
+        print(f"Generating {args.scale} dataset (seed {args.seed})")
+        sizes = datagen.generate(args.scale, args.seed)
+
+    suite = Suite(app, sizes, args.seed)
+    results = {}
+    print(f"\n{'scenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'peak KiB':>10}")
+    for name in args.only or Suite.SCENARIOS:
+        r = results[name] = suite.run(name, args.requests, args.warmup, args.memory_samples)
+        print(f"{name:<16}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['queries_per_request']:>9.1f}{r['peak_memory_kib']:>10.0f}")
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "requests": args.requests,
+            "dataset": sizes,
+        },
+        "scenarios": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nwrote {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
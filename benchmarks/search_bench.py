@@ -0,0 +1,72 @@
+# Search index vs the old Product.Name.ilike('%q%') scan on a synthetic catalog.
+#
+#   python -m benchmarks.search_bench [n_products]
+import random
+import sys
+import time
+import tracemalloc
+from sqlalchemy import insert
+from backend import db
+from backend.models import Product, Manufacturer
+from backend.search import ProductSearchIndex
+from .common import make_app
+
+WORDS = ["rice", "flour", "pasta", "olive", "oil", "sunflower", "tomato", "sauce", "chicken",
+         "breast", "frozen", "fries", "tuna", "can", "eggs", "sugar", "salt", "tea", "water",
+         "milk", "cheese", "butter", "bread", "coffee", "juice", "apple", "orange", "lemon",
+         "yogurt", "honey", "beans", "lentils", "chickpeas", "corn", "peas", "soap", "shampoo"]
+SIZES = ["100g", "250g", "500g", "1kg", "2kg", "5kg", "1l", "2l", "6pcs", "12pcs"]
+QUERIES = ["rice", "olive oil", "chick", "sauce 500g", "ive o", "200123", "zzz"]
+
+
+def seed(n):
+    rnd = random.Random(42)
+    db.session.execute(insert(Manufacturer), [
+        {"Man_ID": i, "Name": f"{rnd.choice(WORDS).title()} Foods {i}"} for i in range(1, 201)
+    ])
+    db.session.execute(insert(Product), [
+        {"Product_ID": i,
+         "Name": " ".join(rnd.sample(WORDS, rnd.randint(1, 3))).title() + " " + rnd.choice(SIZES),
+         "Price": round(rnd.uniform(0.5, 50), 2), "Barcode": str(200000 + i),
+         "Man_ID": rnd.randint(1, 200)}
+        for i in range(1, n + 1)
+    ])
+    db.session.commit()
+
+
+def timed(fn, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    app = make_app()
+    with app.app_context():
+        seed(n)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = ProductSearchIndex().build()
+        build_ms = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{n} products, index build {build_ms:.0f} ms, peak {peak / 2**20:.1f} MiB")
+
+        for q in QUERIES:
+            ilike_ms, rows = timed(lambda: db.session.query(Product.Product_ID)
+                                   .filter(Product.Name.ilike(f"%{q}%")).all())
+            index_ms, ids = timed(lambda: index.search(q))
+            print(f"q={q!r:<14} ilike: {ilike_ms:8.2f} ms ({len(rows):>6} rows) | "
+                  f"index: {index_ms:8.2f} ms ({len(ids):>6} hits)")
+
+        # every ilike hit must still be found by the index
+        for q in QUERIES:
+            old = {r[0] for r in db.session.query(Product.Product_ID).filter(Product.Name.ilike(f"%{q}%"))}
+            assert old <= set(index.search(q)), q
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Columnar analytics snapshot (backend/snapshot.py) vs the live SQL path,
+# question by question, on a generated store.
+#
+#   python -m benchmarks.snapshot_bench [--scale medium] [--repeat 20]
+#
+# Both paths call the analytics pass functions directly (no section cache),
+# and every answer is checked to be the same. Then times an incremental
+# refresh, idle and after a batch of orders is accepted.
+import argparse
+import random
+import time
+from backend import db, jobs, snapshot
+from backend.analytics_engine import SECTIONS
+from backend.employee_orders import accept_orders
+from backend.models import Orders
+from . import datagen
+from .common import make_app
+
+
+def questions(rnd, sizes):
+    cust = rnd.randint(1, sizes["customers"])
+    emp = rnd.randint(1, sizes["employees"])
+    month = rnd.randint(1, 12)
+    return [
+        ("4  orders by customer", "orders_by_customer", (cust,)),
+        ("5  orders by employee", "orders_by_employee", (emp,)),
+        ("6,10,14,15,20 per customer", "customer_orders", ()),
+        ("17 orders in range", "orders_in_range", (f"2024-{month:02d}-01", f"2024-{month:02d}-14", 20)),
+        ("18 top selling employee", "latest", ()),
+    ]
+
+
+def comparable(name, value):
+    if name == "latest":
+        return tuple(value[1]) if value[1] is not None else None
+    if name == "orders_in_range":
+        rows, total = value
+        return [tuple(r) for r in rows], total
+    rows = [tuple(round(v, 6) if isinstance(v, float) else v for v in r) for r in value]
+    return sorted(rows) if name == "customer_orders" else rows
+
+
+def answer(app, use_snapshot, name, params):
+    app.config["ANALYTICS_SNAPSHOT"] = use_snapshot
+    return SECTIONS[name][1](*params)
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rosemary analytics snapshot benchmark")
+    parser.add_argument("--scale", default="medium", choices=sorted(datagen.SCALES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    app = make_app(ANALYTICS_SNAPSHOT=True)
+    rnd = random.Random(args.seed)
+    with app.app_context():
+        sizes = datagen.generate(args.scale, args.seed, echo=lambda *a: None)
+        started = time.perf_counter()
+        snap = snapshot.current()
+        print(f"{sizes['orders']:,} orders: snapshot loaded in {time.perf_counter() - started:.2f} s, "
+              f"{snap.nbytes() / 2**20:.1f} MiB of columns\n")
+
+        print(f"{'question':<30}{'sql ms':>10}{'snapshot ms':>13}{'speedup':>9}  same")
+        for label, name, params in questions(rnd, sizes):
+            sql_ms, sql = timed(lambda: answer(app, False, name, params), args.repeat)
+            snap_ms, columnar = timed(lambda: answer(app, True, name, params), args.repeat)
+            same = comparable(name, sql) == comparable(name, columnar)
+            print(f"{label:<30}{sql_ms:>10.2f}{snap_ms:>13.2f}{sql_ms / snap_ms:>8.1f}x  {'yes' if same else 'NO'}")
+
+        app.config["ANALYTICS_SNAPSHOT"] = True
+        refresh_ms, _ = timed(lambda: snap.refreshed(), 5)
+        print(f"\nincremental refresh, nothing new: {refresh_ms:.1f} ms")
+
+        pending = [oid for (oid,) in db.session.query(Orders.Order_ID).filter(Orders.Status == "pending").limit(100)]
+        accept_orders(pending, 1)
+        jobs.run_pending()  # the SQL path reads the tables these jobs maintain
+        started = time.perf_counter()
+        snap = app.extensions["analytics_snapshot"] = snap.refreshed()
+        print(f"incremental refresh after accepting {len(pending)} orders: "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+        for label, name, params in questions(rnd, sizes):
+            same = comparable(name, answer(app, False, name, params)) == comparable(name, answer(app, True, name, params))
+            print(f"  {label:<28} {'same' if same else 'DIFFERS'}")
+
+
+if __name__ == "__main__":
+    main()
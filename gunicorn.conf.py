@@ -0,0 +1,41 @@
+# Production server profile:  gunicorn -c gunicorn.conf.py app:app
+#
+# ROSEMARY_WEB_WORKERS processes x ROSEMARY_WEB_THREADS threads each. The app
+# is loaded once in the master (preload) and forked; every worker then
+# throws away the pooled connections it inherited (post_fork) so no two
+# processes ever share a database socket, and starts its own job worker
+# threads.
+import multiprocessing
+import os
+
+bind = os.environ.get("ROSEMARY_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("ROSEMARY_WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("ROSEMARY_WEB_THREADS", 4))
+worker_class = "gthread"
+preload_app = True
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then (slow leaks, fragmentation)
+max_requests = int(os.environ.get("ROSEMARY_MAX_REQUESTS", 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get("ROSEMARY_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+# one pooled connection per request thread, job worker thread and analytics
+# section thread (defaults as in backend/jobs.py and analytics_engine.py)
+job_threads = int(os.environ.get("ROSEMARY_JOBS_WORKER_THREADS", 2))
+analytics_threads = int(os.environ.get("ROSEMARY_ANALYTICS_WORKERS", 4))
+os.environ.setdefault("ROSEMARY_DB_POOL_SIZE", str(threads + job_threads + analytics_threads))
+
+
+def post_fork(server, worker):
+    from backend import db, jobs
+    app = server.app.wsgi()
+    with app.app_context():
+        # close=False: leave the parent's sockets alone, just forget them
+        db.engine.dispose(close=False)
+    # job worker threads do not survive the fork: start this worker's own
+    jobs.start_worker(app)